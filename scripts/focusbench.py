@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Script to compare focused particle marking speed of focus_flags() backends
+# against the previous per-quantile mark_focused() implementation.
+#
+#   python scripts/focusbench.py -n 20 tests/testcruise_evt/*/*.gz
+# With raw uint16 data, also compare integer focus tests:
+#   python scripts/focusbench.py -n 20 -d uint16 tests/testcruise_evt/*/*.gz
+import time
+import click
+import numpy as np
+import seaflowpy as sfp
+
+
+def legacy_mark_focused(df, params):
+    """Per-quantile mark_focused() before focus_flags(), for reference."""
+    df = df.copy()
+    df["noise"] = sfp.particleops.mark_noise(df)
+    df["saturated"] = sfp.particleops.mark_saturated(df)
+    width = params.loc[0, "width"]
+    D1 = sfp.particleops._as_signed(df["D1"].values)
+    D2 = sfp.particleops._as_signed(df["D2"].values)
+    fsc_small = df["fsc_small"].values
+    aligned = ~df["noise"] & ~df["saturated"] & (D1 < (D2 + width)) & (D2 < (D1 + width))
+    for q in params["quantile"].sort_values():
+        p = params[params["quantile"] == q].iloc[0]
+        small_D1 = D1 <= (np.multiply(fsc_small, p["notch_small_D1"], dtype=np.float64) + p["offset_small_D1"])
+        small_D2 = D2 <= (np.multiply(fsc_small, p["notch_small_D2"], dtype=np.float64) + p["offset_small_D2"])
+        large_D1 = D1 <= (np.multiply(fsc_small, p["notch_large_D1"], dtype=np.float64) + p["offset_large_D1"])
+        large_D2 = D2 <= (np.multiply(fsc_small, p["notch_large_D2"], dtype=np.float64) + p["offset_large_D2"])
+        df[f"q{sfp.util.quantile_str(q)}"] = aligned & ((small_D1 & small_D2) | (large_D1 & large_D2))
+    return df
+
+
+def timeit(func, dfs, params, repeat):
+    for df in dfs:
+        func(df, params)  # warm up, e.g. compile numba kernel
+    nrows = 0
+    t0 = time.time()
+    for _ in range(repeat):
+        for df in dfs:
+            func(df, params)
+            nrows += len(df.index)
+    return nrows / (time.time() - t0)
+
+
+@click.command()
+@click.option("-n", "--repeat", type=int, default=10, show_default=True,
+    help="Number of times to process each file.")
+@click.option("-b", "--db", "dbpath", default="tests/testcruise_paramsonly.db", show_default=True,
+    type=click.Path(exists=True), help="Database with filtering parameters.")
+@click.option("-d", "--dtype", type=click.Choice(["uint16", "float32", "float64"]),
+    default="float64", show_default=True, help="Particle data type.")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def cmd(repeat, dbpath, dtype, files):
+    params = sfp.db.get_latest_filter(dbpath).reset_index(drop=True)
+    dfs = [sfp.fileio.read_evt_labview(f, dtype=getattr(np, dtype)) for f in files]
+    if sum(len(df.index) for df in dfs) == 0:
+        raise click.ClickException("no particles in input files")
+    print("implementation\tMrows/s")
+    rate = timeit(legacy_mark_focused, dfs, params, repeat)
+    print("{}\t{:.2f}".format("legacy", rate / 1e6))
+    # Integer tests are only possible for raw uint16 data
+    integers = [False, True] if dtype == "uint16" else [False]
+    for backend in sfp.particleops.FOCUS_BACKENDS:
+        for integer in integers:
+            func = lambda df, params: sfp.particleops.focus_flags(df, params, backend=backend, integer=integer)
+            rate = timeit(func, dfs, params, repeat)
+            name = backend + (" integer" if integer else "")
+            print("{}\t{:.2f}".format(name, rate / 1e6))
+
+
+if __name__ == "__main__":
+    cmd()
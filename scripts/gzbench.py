@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Script to compare gzip throughput of available codec backends.
+#
+# Decompression:
+#   python scripts/gzbench.py read tests/testcruise_evt/*/*.gz
+# Compression size and throughput by level, e.g. with 4 threads:
+#   python scripts/gzbench.py write -t 4 tests/testcruise_evt/*/*.gz
+import io
+import time
+import click
+import seaflowpy as sfp
+
+
+@click.group()
+def cmd():
+    pass
+
+
+@cmd.command("read")
+@click.option("-n", "--repeat", type=int, default=3, show_default=True,
+    help="Number of times to decompress each file.")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def read_cmd(repeat, files):
+    for codec in sfp.fileio.GZ_CODECS:
+        nbytes = 0
+        t0 = time.time()
+        for _ in range(repeat):
+            for f in files:
+                with open(f, "rb") as fh:
+                    reader = sfp.fileio.GzipStreamReader(fh, codec=codec)
+                    nbytes += len(reader.readall())
+        elapsed = time.time() - t0
+        print("{}\t{:.1f} MB/s".format(codec, nbytes / 2**20 / elapsed))
+
+
+@cmd.command("write")
+@click.option("-t", "--threads", type=int, default=1, show_default=True,
+    help="Number of compression threads.")
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def write_cmd(threads, files):
+    data = []
+    for f in files:
+        with sfp.fileio.file_open_r(f) as fh:
+            data.append(fh.read())
+    nbytes = sum(len(d) for d in data)
+    if nbytes == 0:
+        raise click.ClickException("no data in input files")
+    print("codec\tlevel\tratio\tMB/s")
+    for codec, info in sfp.fileio.GZ_CODECS.items():
+        for level in range(1, info["max_level"] + 1):
+            outbytes = 0
+            t0 = time.time()
+            for d in data:
+                out = io.BytesIO()
+                with sfp.fileio.ParallelGzipWriter(out, level=level, threads=threads, codec=codec) as w:
+                    w.write(d)
+                outbytes += len(out.getvalue())
+            elapsed = time.time() - t0
+            print("{}\t{}\t{:.3f}\t{:.1f}".format(codec, level, outbytes / nbytes, nbytes / 2**20 / elapsed))
+
+
+if __name__ == "__main__":
+    cmd()
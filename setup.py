@@ -25,6 +25,15 @@ setup(
         'pandas',
         'python-snappy'
     ],
+    extras_require={
+        'fastgzip': ['isal'],
+        'zlib-ng': ['zlib-ng'],
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+        'pyarrow': ['pyarrow'],
+        'numba': ['numba'],
+        'numexpr': ['numexpr']
+    },
     entry_points={
         'console_scripts': [
             'seaflowpy=seaflowpy.cli.cli:cli'
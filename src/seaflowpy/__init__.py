@@ -3,9 +3,11 @@ from . import clouds
 from . import conf
 from . import db
 from . import errors
+from . import evtcache
 from . import fileio
 from . import filterevt
 from . import geo
+from . import manifest
 from . import particleops
 from . import sample
 from . import sfl
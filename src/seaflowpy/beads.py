@@ -864,7 +864,7 @@ def aggregate_evt_files(files, dates=None):
     If no EVT files can be read an empty dataframe will be returned.
     """
     channels = ["fsc_small", "chl_small", "pe", "D1", "D2"]
-    dfs = []
+    file_ids, file_dates = [], []
     for f in files:
         try:
             sff = seaflowfile.SeaFlowFile(f)
@@ -881,23 +881,26 @@ def aggregate_evt_files(files, dates=None):
             date = sff.date
         else:
             date = None
-
         logging.debug("reading %s with date = %s and file_id = %s", f, date, file_id)
-        try:
-            df = fileio.read_evt_labview(f)[channels]
-        except errors.FileError as e:
-            logging.warning("error reading EVT file %s: %s", f, e)
-            continue
-        df["file_id"] = file_id
-        df["date"] = date
-        dfs.append(df)
-    # Use mergesort for a stable sort
-    if len(dfs) == 0:
+        file_ids.append(file_id)
+        file_dates.append(date)
+
+    # Read all files into one preallocated DataFrame rather than concatenating
+    # per-file DataFrames
+    results = fileio.read_evt_many(files, mmap=True, columns=channels, file_ids=file_ids)
+    for f, err in zip(files, results["errors"]):
+        if err:
+            logging.warning("error reading EVT file %s: %s", f, err)
+    counts = np.diff(results["offsets"])
+    if np.sum(counts > 0) == 0:
         return pd.DataFrame()
-    out_df = pd.concat(dfs, ignore_index=True).sort_values(
-        by=["date"], kind="mergesort"
-    )
-    out_df["file_id"] = out_df["file_id"].astype("category")
+    out_df = results["df"]
+    out_df["file_id"] = results["file_id"]
+    # Per-file dates repeated for each particle row
+    out_df["date"] = pd.Series(file_dates).repeat(counts).reset_index(drop=True)
+    # Use mergesort for a stable sort
+    if not out_df["date"].is_monotonic_increasing:
+        out_df = out_df.sort_values(by=["date"], kind="mergesort")
     return out_df
 
 
@@ -11,9 +11,12 @@ from seaflowpy import beads
 from seaflowpy import errors
 from seaflowpy import seaflowfile
 from seaflowpy import fileio
+from seaflowpy import manifest
+from seaflowpy import particleops
 from seaflowpy import sample
 from seaflowpy import sfl
 from seaflowpy import time
+from seaflowpy import util
 
 
 def validate_file_fraction(ctx, param, value):
@@ -22,6 +25,12 @@ def validate_file_fraction(ctx, param, value):
     return value
 
 
+def enable_manifest_dir(ctx, param, value):
+    if value:
+        manifest.enable(value)
+    return value
+
+
 def validate_positive(ctx, param, value):
     if value is not None and value <= 0:
         raise click.BadParameter('must be a number > 0.')
@@ -52,8 +61,12 @@ def evt_cmd():
 @evt_cmd.command('count')
 @click.option('-H', '--no-header', is_flag=True, default=False, show_default=True,
     help="Don't print column headers.")
+@click.option('-j', '--jobs', type=int, default=1, show_default=True, callback=validate_positive,
+    help='Number of files to examine concurrently.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save manifests of searched directories in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
 @click.argument('evt-files', nargs=-1, type=click.Path(exists=True))
-def count_evt_cmd(no_header, evt_files):
+def count_evt_cmd(no_header, jobs, evt_files):
     """
     Reports event counts in EVT/OPP files.
 
@@ -73,39 +86,107 @@ def count_evt_cmd(no_header, evt_files):
     if not evt_files:
         return
 
+    # Directory manifests record header row counts, so files found in
+    # directories don't need to be opened again
+    counts = {}
+    for d in evt_files:
+        if os.path.isdir(d):
+            for r in manifest.scan(d, events=True, jobs=jobs):
+                counts[r["path"]] = (r["path"], r["file_id"], r["type"], r["events"] or 0)
+
+    def count_one(filepath):
+        if filepath in counts:
+            return counts[filepath]
+        return count_evt_file(filepath)
+
     # dirs to file paths
     files = expand_file_list(evt_files)
 
     header_printed = False
 
-    for filepath in files:
-        # Default values
-        filetype = '-'
-        file_id = '-'
-        events = 0
-
-        # Try to parse filename as SeaFlow file
-        try:
-            sff = seaflowfile.SeaFlowFile(filepath)
-            file_id = sff.file_id
-            if sff.is_opp:
-                filetype = 'opp'
-            else:
-                filetype = 'evt'
-        except errors.FileError:
-            # Might have unusual name
-            pass
-        try:
-            events = fileio.read_labview_row_count(filepath)
-        except errors.FileError:
-            pass  # accept defaults, do nothing
-
+    for filepath, file_id, filetype, events in util.imap_ordered(count_one, files, jobs):
         if not header_printed and not no_header:
             print('\t'.join(['path', 'file_id', 'type', 'events']))
             header_printed = True
         print('\t'.join([filepath, file_id, filetype, str(events)]))
 
 
+def count_evt_file(filepath):
+    """
+    Get event count from the header of one EVT/OPP file.
+
+    Returns
+    -------
+    tuple of (path, file_id, type, events)
+    """
+    # Default values
+    filetype = '-'
+    file_id = '-'
+    events = 0
+
+    # Try to parse filename as SeaFlow file
+    try:
+        sff = seaflowfile.SeaFlowFile(filepath)
+        file_id = sff.file_id
+        if sff.is_opp:
+            filetype = 'opp'
+        else:
+            filetype = 'evt'
+    except errors.FileError:
+        # Might have unusual name
+        pass
+    try:
+        events = fileio.read_labview_row_count(filepath)
+    except errors.FileError:
+        pass  # accept defaults, do nothing
+    return (filepath, file_id, filetype, events)
+
+
+@evt_cmd.command('convert')
+@click.option('-o', '--out-dir', type=click.Path(), required=True,
+    help='EVT archive output directory.')
+@click.option('-S', '--sfl', 'sfl_path', type=click.Path(exists=True),
+    help="""SFL file used to associate dates with EVT files. Useful when
+            converting undated EVT files.""")
+@click.option('-v', '--verbose', is_flag=True, default=False,
+    help='Print results for every file, not just errors.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save manifests of searched directories in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
+@click.argument('files', nargs=-1, type=click.Path(exists=True))
+def convert_evt_cmd(out_dir, sfl_path, verbose, files):
+    """
+    Convert EVT files to a columnar EVT archive.
+
+    The list of EVT files can be file paths or directory paths which will be
+    searched for EVT files. Each day of year directory in OUT-DIR will hold one
+    Parquet file with uint16 particle data, file IDs, and file dates, with
+    one row group per EVT file. Directories of an EVT archive can be used in
+    place of EVT directories by "filter local --evt-dir", "evt sample", and
+    "evt beads", and files within are addressed as OUT-DIR/FILE_ID.
+
+    Outputs tab-delimited text to STDOUT.
+    """
+    if sfl_path:
+        sfl_df = sfl.read_file(sfl_path, convert_dates=True)
+        sfl_df = sfl.fix(sfl_df)  # ensure valid file_ids in file column
+        dates = dict(zip(sfl_df["file"].tolist(), sfl_df["date"].tolist()))
+    else:
+        dates = {}
+
+    files = seaflowfile.keep_evt_files(expand_file_list(files))
+    results = fileio.write_evt_archive(files, out_dir, dates=dates)
+
+    print('\t'.join(['path', 'file_id', 'events', 'status']))
+    for r in results:
+        if verbose or r["error"]:
+            print('\t'.join([r["path"], r["file_id"], str(r["events"]), r["error"] or 'OK']))
+    ok = [r for r in results if not r["error"]]
+    print(
+        "{}/{} files converted, {} events".format(len(ok), len(results), sum([r["events"] for r in ok])),
+        file=sys.stderr
+    )
+
+
 @evt_cmd.command('beads')
 @click.option('-c', '--cruise', type=str, required=True,
     help='Cruise name for summary plot title.')
@@ -141,6 +222,9 @@ def beads_evt_cmd(cruise, cytograms, event_limit, frac, iqr, min_date,
     particle_file):
     """
     Find bead location and generate filtering parameters.
+
+    PARTICLE-FILE is a Parquet file of EVT data with a date column, e.g. from
+    "evt sample", or an EVT archive directory from "evt convert".
     """
     if verbose == 0:
         loglevel = logging.WARNING
@@ -173,7 +257,13 @@ def beads_evt_cmd(cruise, cytograms, event_limit, frac, iqr, min_date,
     else:
         otherip = None
 
-    evt_df = pd.read_parquet(particle_file)
+    if os.path.isdir(particle_file):
+        try:
+            evt_df = fileio.read_evt_archive(particle_file)
+        except errors.FileError as e:
+            raise click.ClickException(str(e))
+    else:
+        evt_df = pd.read_parquet(particle_file)
     if len(evt_df) == 0:
         raise click.ClickException("no EVT data for bead finding")
     if "date" not in evt_df.columns:
@@ -287,6 +377,8 @@ def beads_evt_cmd(cruise, cytograms, event_limit, frac, iqr, min_date,
             sampling undated EVT files.""")
 @click.option('-v', '--verbose', count=True,
     help='Show more information. Specify more than once to show more information.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save manifests of searched directories in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
 @click.argument('files', nargs=-1, type=click.Path(exists=True))
 def sample_evt_cmd(outpath, count, file_fraction, min_chl, min_fsc, min_pe,
                    min_date, max_date, multi, noise_filter, process_count, seed,
@@ -407,8 +499,17 @@ def sample_evt_cmd(outpath, count, file_fraction, min_chl, min_fsc, min_pe,
 @evt_cmd.command('validate')
 @click.option('-a', '--all', 'report_all', is_flag=True,
     help='Show information for all files. If not specified then only files errors are printed.')
+@click.option('-f', '--fast', is_flag=True, default=False, show_default=True,
+    help="""Validate by comparing header event count to file size, or to the
+            uncompressed size recorded by gzip compressed files, without reading
+            particle data. zstd and lz4 files, and files which fail this check,
+            are fully parsed.""")
+@click.option('-j', '--jobs', type=int, default=1, show_default=True, callback=validate_positive,
+    help='Number of files to examine concurrently.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save manifests of searched directories in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
 @click.argument('files', nargs=-1, type=click.Path(exists=True))
-def validate_evt_cmd(report_all, files):
+def validate_evt_cmd(report_all, fast, jobs, files):
     """
     Examines EVT/OPP files.
 
@@ -428,85 +529,118 @@ def validate_evt_cmd(report_all, files):
     header_printed = False
     ok, bad = 0, 0
 
-    for filepath in files:
-        # Default values
-        type_from_filename = '-'
-        filetype = '-'
-        file_id = '-'
-        events = 0
+    def validate_one(filepath):
+        return validate_evt_file(filepath, fast=fast)
+
+    for filepath, file_id, filetype, status, events in util.imap_ordered(validate_one, files, jobs):
+        if status == 'OK':
+            ok += 1
+        else:
+            bad += 1
+        if not header_printed:
+            print('\t'.join(['path', 'file_id', 'type', 'status', 'events']))
+            header_printed = True
+        if (report_all and status == 'OK') or (status != 'OK'):
+            print('\t'.join([filepath, file_id, filetype, status, str(events)]))
+    print('%d/%d files passed validation' % (ok, bad + ok), file=sys.stderr)
 
-        # Try to parse filename as SeaFlow file
-        try:
-            sff = seaflowfile.SeaFlowFile(filepath)
-            file_id = sff.file_id
-            if sff.is_evt:
-                type_from_filename = 'evt'
-                filetype = 'evt'
-            elif sff.is_opp:
-                type_from_filename = 'opp'
-                filetype = 'opp'
-        except errors.FileError:
-            # unusual name, no file_id
-            pass
 
-        if type_from_filename == 'evt':
+def validate_evt_file(filepath, fast=False):
+    """
+    Validate one EVT/OPP file.
+
+    Returns
+    -------
+    tuple of (path, file_id, type, status, events)
+    """
+    # Default values
+    type_from_filename = '-'
+    filetype = '-'
+    file_id = '-'
+    events = 0
+
+    # Try to parse filename as SeaFlow file
+    try:
+        sff = seaflowfile.SeaFlowFile(filepath)
+        file_id = sff.file_id
+        if sff.is_evt:
+            type_from_filename = 'evt'
+            filetype = 'evt'
+        elif sff.is_opp:
+            type_from_filename = 'opp'
+            filetype = 'opp'
+    except errors.FileError:
+        # unusual name, no file_id
+        pass
+
+    if fast:
+        # Only accept fast validation results that pass. Anything else
+        # falls through to a full parse below for a definitive answer.
+        if type_from_filename == '-':
+            fast_types = ['evt', 'opp']
+        else:
+            fast_types = [type_from_filename]
+        for fast_type in fast_types:
+            if fast_type == 'evt':
+                fast_columns = particleops.COLUMNS
+            else:
+                fast_columns = particleops.COLUMNS + ['bitflags']
             try:
-                data = fileio.read_evt_labview(filepath)
-                status = 'OK'
-                ok += 1
-                events = len(data.index)
-            except errors.FileError as e:
-                status = str(e)
-                bad += 1
-                events = 0
-        elif type_from_filename == 'opp':
+                events = fileio.validate_labview_size(filepath, fast_columns)
+            except errors.FileError:
+                continue
+            return (filepath, file_id, fast_type, 'OK', events)
+
+    if type_from_filename == 'evt':
+        try:
+            data = fileio.read_evt_labview(filepath)
+            status = 'OK'
+            events = len(data.index)
+        except errors.FileError as e:
+            status = str(e)
+            events = 0
+    elif type_from_filename == 'opp':
+        try:
+            data = fileio.read_opp_labview(filepath)
+            status = 'OK'
+            events = len(data.index)
+        except errors.FileError as e:
+            status = str(e)
+            events = 0
+    else:
+        # Try to read as both EVT or OPP
+        try:
+            data = fileio.read_evt_labview(filepath)
+            filetype = 'evt'
+            status = 'OK'
+            events = len(data.index)
+        except errors.FileError:
             try:
                 data = fileio.read_opp_labview(filepath)
+                filetype = 'opp'
                 status = 'OK'
-                ok += 1
                 events = len(data.index)
             except errors.FileError as e:
                 status = str(e)
-                bad += 1
                 events = 0
-        elif type_from_filename == '-':
-            # Try to read as both EVT or OPP
-            try:
-                data = fileio.read_evt_labview(filepath)
-                filetype = 'evt'
-                status = 'OK'
-                ok += 1
-                events = len(data.index)
-            except errors.FileError:
-                try:
-                    data = fileio.read_opp_labview(filepath)
-                    filetype = 'opp'
-                    status = 'OK'
-                    ok += 1
-                    events = len(data.index)
-                except errors.FileError as e:
-                    status = str(e)
-                    bad += 1
-                    events = 0
-
-        if not header_printed:
-            print('\t'.join(['path', 'file_id', 'type', 'status', 'events']))
-            header_printed = True
-        if (report_all and status == 'OK') or (status != 'OK'):
-            print('\t'.join([filepath, file_id, filetype, status, str(events)]))
-    print('%d/%d files passed validation' % (ok, bad + ok), file=sys.stderr)
+    return (filepath, file_id, filetype, status, events)
 
 
 def expand_file_list(files_and_dirs):
-    """Convert directories in file list to EVT/OPP file paths."""
+    """Convert directories in file list to EVT/OPP and EVT archive file paths."""
     # Find files in directories
     dirs = [f for f in files_and_dirs if os.path.isdir(f)]
     files = [f for f in files_and_dirs if os.path.isfile(f)]
 
     dfiles = []
     for d in dirs:
-        evt_files = seaflowfile.find_evt_files(d)
-        opp_files = seaflowfile.find_evt_files(d, opp=True)
-        dfiles = dfiles + evt_files + opp_files
+        records = manifest.scan(d)
+        evt_files = [r["path"] for r in records if r["type"] == "evt"]
+        opp_files = [r["path"] for r in records if r["type"] == "opp"]
+        try:
+            archive_files = fileio.find_evt_archive_files(d)
+        except errors.FileError as e:
+            raise click.ClickException(str(e))
+        dfiles = dfiles + evt_files + opp_files + archive_files
 
     return files + dfiles
@@ -17,7 +17,9 @@ from seaflowpy import clouds
 from seaflowpy import conf
 from seaflowpy import db
 from seaflowpy import errors
+from seaflowpy import fileio
 from seaflowpy import filterevt
+from seaflowpy import manifest
 from seaflowpy import util
 from seaflowpy import seaflowfile
 
@@ -28,6 +30,12 @@ def filter_cmd():
     pass
 
 
+def enable_manifest_dir(ctx, param, value):
+    if value:
+        manifest.enable(value)
+    return value
+
+
 def validate_limit(ctx, param, value):
     if value is not None and value < 1:
         raise click.BadParameter('if limit is set, it must be >= 1')
@@ -36,7 +44,19 @@ def validate_limit(ctx, param, value):
 
 def validate_process_count(ctx, param, value):
     if value < 1:
-        raise click.BadParameter('process_count must be >= 1')
+        raise click.BadParameter('{} must be >= 1'.format(param.name))
+    return value
+
+
+def validate_prefetch(ctx, param, value):
+    if value < 0:
+        raise click.BadParameter('prefetch must be >= 0')
+    return value
+
+
+def validate_row_group_rows(ctx, param, value):
+    if value is not None and value < 1:
+        raise click.BadParameter('if row_group_rows is set, it must be >= 1')
     return value
 
 
@@ -48,21 +68,32 @@ def validate_resolution(ctx, param, value):
 
 @filter_cmd.command('local')
 @click.option('-e', '--evt-dir', metavar='DIR', type=click.Path(exists=True),
-    help='EVT directory path (required unless --s3)')
+    help='EVT directory or EVT archive directory path (required unless --s3)')
 @click.option('-s', '--s3', 's3_flag', is_flag=True,
     help='Read EVT files from s3://S3_BUCKET/CRUISE where CRUISE is detected in the sqlite db metadata table (required unless --evt_dir).')
 @click.option('-d', '--db', 'dbpath', required=True, metavar='FILE', type=click.Path(exists=True),
     help='Popcycle SQLite3 db file with filter parameters and cruise name.')
 @click.option('-l', '--limit', type=int, metavar='N', callback=validate_limit,
     help='Limit number of files to process.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save a manifest of --evt-dir in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
 @click.option('-o', '--opp-dir', metavar='DIR',
     help='Directory in which to save OPP files. Will be created if does not exist.')
 @click.option('-p', '--process-count', default=1, show_default=True, metavar="N", callback=validate_process_count,
     help='Number of processes to use in filtering.')
+@click.option('-P', '--prefetch', default=2, show_default=True, metavar="N", callback=validate_prefetch,
+    help='Number of EVT files each process reads ahead while filtering, across time windows. 0 to disable.')
+@click.option('--parquet-engine', type=click.Choice(fileio.OPP_PARQUET_ENGINES), default='fastparquet', show_default=True,
+    help='Library used to write OPP Parquet files.')
+@click.option('--row-group-rows', type=int, metavar='N', callback=validate_row_group_rows,
+    help='Minimum particles per OPP Parquet row group. Default is one row group per EVT file.')
 @click.option('-r', '--resolution', default=10.0, show_default=True, metavar='N', callback=validate_resolution,
     help='Progress update resolution by %%.')
+@click.option('-w', '--writer-count', default=1, show_default=True, metavar='N', callback=validate_process_count,
+    help='Number of processes to use to write OPP files.')
 @util.quiet_keyboardinterrupt
-def local_filter_evt_cmd(evt_dir, s3_flag, dbpath, limit, opp_dir, process_count, resolution):
+def local_filter_evt_cmd(evt_dir, s3_flag, dbpath, limit, opp_dir, process_count, prefetch,
+                         parquet_engine, row_group_rows, resolution, writer_count):
     """Filter EVT data locally."""
     # Validate args
     if not evt_dir and not s3_flag:
@@ -89,6 +120,10 @@ def local_filter_evt_cmd(evt_dir, s3_flag, dbpath, limit, opp_dir, process_count
         'db': dbpath,
         'opp_dir': opp_dir,
         'process_count': process_count,
+        'prefetch': prefetch,
+        'parquet_engine': parquet_engine,
+        'row_group_rows': row_group_rows,
+        'writer_count': writer_count,
         'resolution': resolution,
         'version': pkg_resources.get_distribution("seaflowpy").version,
         'cruise': cruise
@@ -105,7 +140,12 @@ def local_filter_evt_cmd(evt_dir, s3_flag, dbpath, limit, opp_dir, process_count
     # Find EVT files
     print('Getting lists of files to filter')
     if evt_dir:
-        evt_files = seaflowfile.sorted_files(seaflowfile.find_evt_files(evt_dir))
+        # Include files in an EVT archive created by "evt convert"
+        try:
+            archive_files = fileio.find_evt_archive_files(evt_dir)
+        except errors.FileError as e:
+            raise click.ClickException(str(e))
+        evt_files = seaflowfile.sorted_files(manifest.find_evt_files(evt_dir) + archive_files)
     elif s3_flag:
         # Make sure configuration for s3 is ready to go
         config = conf.get_aws_config(s3_only=True)
@@ -153,8 +193,14 @@ def local_filter_evt_cmd(evt_dir, s3_flag, dbpath, limit, opp_dir, process_count
             opp_dir,
             s3=s3_flag,
             worker_count=process_count,
-            every=resolution
+            every=resolution,
+            prefetch=prefetch,
+            parquet_engine=parquet_engine,
+            row_group_rows=row_group_rows,
+            writer_count=writer_count
         )
+    except ValueError as e:
+        raise click.ClickException(str(e))
     except errors.SeaFlowpyError as e:
         raise click.ClickException(str(e))
 
@@ -5,10 +5,17 @@ import click
 from seaflowpy import clouds
 from seaflowpy import db
 from seaflowpy import errors as sfperrors
+from seaflowpy import manifest
 from seaflowpy import seaflowfile
 from seaflowpy import sfl
 
 
+def enable_manifest_dir(ctx, param, value):
+    if value:
+        manifest.enable(value)
+    return value
+
+
 @click.group()
 def sfl_cmd():
     """SFL file operations subcommand."""
@@ -98,6 +105,8 @@ def sfl_fix_event_rate_cmd(sfl_file, events_file):
 @sfl_cmd.command('manifest')
 @click.option('-v', '--verbose', is_flag=True,
     help='Print a list of all file ids not in common between SFL and directory.')
+@click.option('--manifest-dir', metavar='DIR', type=click.Path(file_okay=False), callback=enable_manifest_dir, expose_value=False,
+    help='Save a manifest of EVT-DIR in DIR so later searches only re-list changed directories. Defaults to $SEAFLOWPY_MANIFEST_DIR if set, otherwise disabled.')
 @click.argument('sfl-file', nargs=1, type=click.File())
 @click.argument('evt-dir', nargs=1, type=str)
 def manifest_cmd(verbose, sfl_file, evt_dir):
@@ -129,12 +138,12 @@ def manifest_cmd(verbose, sfl_file, evt_dir):
             print('  $ aws configure', file=sys.stderr)
             raise click.Abort()
         found_evt_files = seaflowfile.sorted_files(seaflowfile.keep_evt_files(files))
+        found_evt_ids = [seaflowfile.SeaFlowFile(f).path_file_id for f in found_evt_files]
     else:
-        found_evt_files = seaflowfile.find_evt_files(evt_dir)
+        found_evt_ids = [r["path_file_id"] for r in manifest.scan(evt_dir) if r["type"] == "evt"]
 
     df = sfl.read_file(sfl_file)
     sfl_evt_ids = [seaflowfile.SeaFlowFile(f).file_id for f in df['file']]
-    found_evt_ids = [seaflowfile.SeaFlowFile(f).path_file_id for f in found_evt_files]
     sfl_set = set(sfl_evt_ids)
     found_set = set(found_evt_ids)
 
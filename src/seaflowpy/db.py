@@ -3,6 +3,7 @@ import datetime
 import pkgutil
 import sqlite3
 import uuid
+import numpy as np
 import pandas as pd
 from . import errors
 from . import particleops
@@ -101,9 +102,10 @@ def prep_opp(file, df, all_count, evt_count, filter_id):
         SeaFlow file ID.
         e.g. tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00 will become
         2014_185/2014-07-04T00-00-02+00-00.
-    df: pandas.DataFrame
-        SeaFlow particle data. Focused particle flag columns for each quantile
-        should be in columns "q<quantile>" e.g. q2.5 for the 2.5 quantile.
+    df: pandas.DataFrame or particleops.ParticleBatch
+        SeaFlow particle data with focused particles marked by
+        particleops.mark_focused() in a "bitflags" column, or in boolean columns
+        "q<quantile>" e.g. q2.5 for the 2.5 quantile.
     all_count: int
         Event count in raw file.
     evt_count: int
@@ -116,8 +118,8 @@ def prep_opp(file, df, all_count, evt_count, filter_id):
     Array of values for save_opp_to_db().
     """
     vals = []
-    for _q_col, q, _q_str, q_df in particleops.quantiles_in_df(df):
-        opp_count = len(q_df.index)
+    for _q_col, q, _q_str, mask in particleops.quantile_masks(df):
+        opp_count = int(np.count_nonzero(mask))
         try:
             opp_evt_ratio = opp_count / evt_count
         except ZeroDivisionError:
@@ -0,0 +1,347 @@
+"""
+Caches of decoded EVT particle data.
+
+Decoded particle data for a file is a uint16 array with one row per
+particleops.COLUMNS column, keyed by the source file's absolute path, size,
+and modification time. A modified file gets a new key, so stale entries are
+never returned and eventually get evicted. There are two cache tiers, each
+evicting least recently used entries when it grows beyond its size limit:
+
+- an in-process memory cache, for notebooks and scripts that read the same
+  files many times in one session
+- a persistent on-disk cache of uncompressed .npy files, shared between
+  processes and runs
+
+Both are disabled by default. Enable the memory cache with enable_memory()
+and the disk cache with enable(), or set the SEAFLOWPY_EVT_CACHE environment
+variable to a cache directory (and optionally SEAFLOWPY_EVT_CACHE_SIZE to a
+size limit in bytes) before importing seaflowpy.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import uuid
+import numpy as np
+from . import util
+
+
+# Default disk cache size limit in bytes
+MAX_BYTES = 10 * 2**30
+# Default memory cache size limit in bytes
+MEMORY_MAX_BYTES = 2**30
+# Environment variables used to enable the cache on import
+CACHE_DIR_ENV = "SEAFLOWPY_EVT_CACHE"
+CACHE_SIZE_ENV = "SEAFLOWPY_EVT_CACHE_SIZE"
+# File extension of cache entries
+ENTRY_EXT = ".npy"
+# Sweep the disk cache directory after this many puts even when this process's
+# running byte total is within the limit, to account for other processes
+# writing to the same cache.
+EVICT_EVERY = 100
+
+_cache_dir = None
+_max_bytes = MAX_BYTES
+_disk_bytes = 0  # running estimate of disk cache size, updated by put()
+_disk_puts = 0  # puts since the last full sweep
+_disk_lock = threading.Lock()
+
+_memory = None  # OrderedDict of key: array in least to most recently used order
+_memory_max_bytes = MEMORY_MAX_BYTES
+_memory_bytes = 0
+_memory_lock = threading.Lock()
+_counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def enable(cache_dir, max_bytes=MAX_BYTES):
+    """
+    Enable the on-disk EVT cache.
+
+    The cache directory is scanned once here to seed a running size total, and
+    entries beyond the size limit are evicted.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Cache directory. Will be created if it doesn't exist.
+    max_bytes: int, default MAX_BYTES
+        Cache size limit in bytes.
+    """
+    global _cache_dir, _max_bytes
+    if max_bytes <= 0:
+        raise ValueError("max_bytes must be > 0")
+    util.mkdir_p(cache_dir)
+    _cache_dir = cache_dir
+    _max_bytes = max_bytes
+    evict()
+
+
+def disable():
+    """Disable the on-disk EVT cache. Cached data on disk is kept."""
+    global _cache_dir
+    _cache_dir = None
+
+
+def enable_memory(max_bytes=MEMORY_MAX_BYTES):
+    """
+    Enable the in-process memory EVT cache.
+
+    Parameters
+    ----------
+    max_bytes: int, default MEMORY_MAX_BYTES
+        Cache size limit in bytes.
+    """
+    global _memory, _memory_max_bytes
+    if max_bytes <= 0:
+        raise ValueError("max_bytes must be > 0")
+    with _memory_lock:
+        if _memory is None:
+            _memory = OrderedDict()
+        _memory_max_bytes = max_bytes
+    _evict_memory()
+
+
+def disable_memory():
+    """Disable the in-process memory EVT cache and free its data."""
+    global _memory, _memory_bytes
+    with _memory_lock:
+        _memory = None
+        _memory_bytes = 0
+
+
+def enabled():
+    """Is either EVT cache tier enabled?"""
+    return _cache_dir is not None or _memory is not None
+
+
+def stats():
+    """
+    Return EVT cache statistics.
+
+    Returns
+    -------
+    dict
+        {
+            "memory_hits": lookups served from memory,
+            "disk_hits": lookups served from disk,
+            "misses": lookups not found in any enabled tier,
+            "memory_entries": files in the memory cache,
+            "memory_bytes": size of data in the memory cache
+        }
+    """
+    with _memory_lock:
+        result = dict(_counts)
+        result["memory_entries"] = len(_memory) if _memory is not None else 0
+        result["memory_bytes"] = _memory_bytes
+    return result
+
+
+def reset_stats():
+    """Reset EVT cache hit and miss counters."""
+    with _memory_lock:
+        for k in _counts:
+            _counts[k] = 0
+
+
+def _key(path):
+    """
+    Return the cache key for a source file.
+
+    Raises
+    ------
+    OSError if path can't be examined.
+    """
+    st = os.stat(path)
+    return "{}\0{}\0{}".format(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def entry_path(path):
+    """
+    Return the disk cache entry path for a source file.
+
+    Raises
+    ------
+    OSError if path can't be examined.
+    """
+    return _entry_path(_key(path))
+
+
+def _entry_path(key):
+    return os.path.join(_cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ENTRY_EXT)
+
+
+def get(path):
+    """
+    Get cached particle data for path.
+
+    The memory cache is checked first, then the disk cache. Data found on disk
+    is added to the memory cache.
+
+    Parameters
+    ----------
+    path: str
+        Source EVT file path.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Read-only 2d numpy.uint16 array with one row per particleops.COLUMNS
+        column, or None if caching is disabled or path is not cached. Arrays
+        from the disk cache are memory-mapped.
+    """
+    if not enabled():
+        return None
+    try:
+        key = _key(path)
+    except OSError:
+        return None
+    with _memory_lock:
+        if _memory is not None and key in _memory:
+            _memory.move_to_end(key)
+            _counts["memory_hits"] += 1
+            return _memory[key]
+    events = None
+    if _cache_dir is not None:
+        try:
+            entry = _entry_path(key)
+            events = np.load(entry, mmap_mode="r")
+            # Mark as recently used for LRU eviction
+            os.utime(entry)
+        except (IOError, OSError, ValueError):
+            events = None
+    with _memory_lock:
+        if events is None:
+            _counts["misses"] += 1
+        else:
+            _counts["disk_hits"] += 1
+    if events is not None:
+        _put_memory(key, events)
+    return events
+
+
+def _put_memory(key, events):
+    """Add a read-only array to the memory cache if it's enabled."""
+    global _memory_bytes
+    with _memory_lock:
+        if _memory is None or events.nbytes > _memory_max_bytes:
+            return
+        if key in _memory:
+            _memory_bytes -= _memory.pop(key).nbytes
+        _memory[key] = events
+        _memory_bytes += events.nbytes
+    _evict_memory()
+
+
+def _evict_memory():
+    """Remove least recently used memory entries until within the limit."""
+    global _memory_bytes
+    with _memory_lock:
+        while _memory and _memory_bytes > _memory_max_bytes:
+            _, events = _memory.popitem(last=False)
+            _memory_bytes -= events.nbytes
+
+
+def put(path, events):
+    """
+    Save particle data for path in the cache.
+
+    Data is saved to each enabled tier. Failures to write to the disk cache
+    are ignored, the cache is best-effort. The disk cache directory is only
+    swept for eviction when this process's running size total exceeds the
+    limit, or every EVICT_EVERY puts.
+
+    Parameters
+    ----------
+    path: str
+        Source EVT file path.
+    events: numpy.ndarray
+        2d numpy.uint16 array with one row per particleops.COLUMNS column.
+    """
+    global _disk_bytes, _disk_puts
+    if not enabled():
+        return
+    try:
+        key = _key(path)
+    except OSError:
+        return
+    events = np.array(events, dtype=np.uint16, order="C")
+    events.flags.writeable = False
+    _put_memory(key, events)
+    if _cache_dir is None:
+        return
+    try:
+        entry = _entry_path(key)
+        # Write then rename so readers never see a partial entry, including
+        # other processes sharing this cache.
+        tmp = "{}.{}.tmp".format(entry, uuid.uuid4().hex)
+        with open(tmp, "wb") as fh:
+            np.save(fh, events)
+            nbytes = fh.tell()
+        os.replace(tmp, entry)
+    except (IOError, OSError):
+        return
+    with _disk_lock:
+        _disk_bytes += nbytes
+        _disk_puts += 1
+        sweep = _disk_bytes > _max_bytes or _disk_puts >= EVICT_EVERY
+    if sweep:
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Remove least recently used disk entries until within the size limit.
+
+    This is a full sweep which stats every entry in the cache directory, and
+    resets the running size total used by put().
+
+    Parameters
+    ----------
+    max_bytes: int, optional
+        Size limit in bytes. Defaults to the limit set in enable().
+    """
+    global _disk_bytes, _disk_puts
+    if _cache_dir is None:
+        return
+    if max_bytes is None:
+        max_bytes = _max_bytes
+    entries = []
+    total = 0
+    with os.scandir(_cache_dir) as it:
+        for e in it:
+            if e.name.endswith(ENTRY_EXT):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, e.path))
+                total += st.st_size
+    if total > max_bytes:
+        for _mtime, size, entry in sorted(entries):
+            try:
+                os.remove(entry)
+            except OSError:
+                continue
+            total -= size
+            if total <= max_bytes:
+                break
+    with _disk_lock:
+        _disk_bytes = total
+        _disk_puts = 0
+
+
+def clear():
+    """Remove all entries from the memory and disk caches."""
+    global _memory_bytes
+    with _memory_lock:
+        if _memory is not None:
+            _memory.clear()
+            _memory_bytes = 0
+    evict(max_bytes=0)
+
+
+if os.environ.get(CACHE_DIR_ENV):
+    enable(
+        os.environ[CACHE_DIR_ENV],
+        int(os.environ.get(CACHE_SIZE_ENV, MAX_BYTES))
+    )
@@ -1,15 +1,394 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import functools
+import glob
 import gzip
+import inspect
 import io
 import os
+import shutil
 import zlib
+import fastparquet
 import numpy as np
 import pandas as pd
 from . import errors
+from . import evtcache
 from . import particleops
-from .seaflowfile import SeaFlowFile
+from .seaflowfile import SeaFlowFile, sorted_files, timestamp_from_filename
+from . import time
 from . import util
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Extensions of compressed files. Uncompressed files have none of these.
+COMPRESSED_EXTS = (".gz", ".zst", ".lz4")
+# Compression levels for zstd and lz4 output
+ZSTD_LEVEL = 10
+LZ4_LEVEL = 9
+
+# Bytes of compressed input read at a time when streaming gzip data
+GZ_READ_SIZE = 2**16
+# Default compression level for gzip output. Level 9 is several times slower
+# than 6 for EVT data with less than 1% smaller output.
+GZ_LEVEL = 6
+# Default number of threads used to compress gzip output
+GZ_THREADS = 1
+# Bytes of uncompressed data in each gzip member when compressing with
+# multiple threads
+GZ_BLOCK_SIZE = 2**20
+
+# Registry of gzip codec backends. Each entry has a zlib-compatible module
+# used for decompression, a gzip.open-compatible function used for
+# compression, and the maximum compression level accepted by that function.
+# Faster deflate implementations are registered when installed, but the
+# standard library zlib is used unless another codec is chosen with
+# set_gz_codec().
+GZ_CODECS = {}
+try:
+    from isal import igzip, isal_zlib
+except ImportError:
+    pass
+else:
+    GZ_CODECS["isal"] = {
+        "zlib": isal_zlib,
+        "open": igzip.open,
+        "max_level": isal_zlib.ISAL_BEST_COMPRESSION
+    }
+try:
+    from zlib_ng import gzip_ng, zlib_ng
+except ImportError:
+    pass
+else:
+    GZ_CODECS["zlib-ng"] = {
+        "zlib": zlib_ng,
+        "open": gzip_ng.open,
+        "max_level": 9
+    }
+# zlib is faster than gzip for decompression of EVT data on MacOS, and
+# comparable on Linux.
+GZ_CODECS["zlib"] = {
+    "zlib": zlib,
+    "open": gzip.open,
+    "max_level": 9
+}
+_gz_codec = "zlib"
+_gz_level = None  # GZ_LEVEL, or the codec's maximum level if lower
+_gz_threads = GZ_THREADS
+# Default particle rows per block yielded by read_labview_blocks() and written
+# at a time by write_labview()
+BLOCK_ROWS = 2**16
+
+# File name of the Parquet file in each day of year directory of an EVT
+# archive created by write_evt_archive()
+EVT_ARCHIVE_FILE = "evt.parquet"
+
+# Columns written to OPP Parquet files, in order
+OPP_PARQUET_COLUMNS = [
+    "date",
+    "file_id",
+    "D1",
+    "D2",
+    "fsc_small",
+    "pe",
+    "chl_small",
+    "q2.5",
+    "q50",
+    "q97.5",
+]
+# Libraries which can write OPP Parquet files
+OPP_PARQUET_ENGINES = ["fastparquet", "pyarrow"]
+# fastparquet.write() before version 0.7 writes statistics for every column
+# it can and has no "stats" option. Later versions only write statistics for
+# all columns, including strings and categoricals, with stats=True.
+_FASTPARQUET_STATS = "stats" in inspect.signature(fastparquet.write).parameters
+
+# VCT file columns. VCT files are space-separated with no header, one line
+# per particle, six float columns followed by a population label.
+VCT_COLUMNS = ["diam_lwr", "Qc_lwr", "diam_mid", "Qc_mid", "diam_upr", "Qc_upr", "pop"]
+VCT_DTYPES = {c: np.float64 for c in VCT_COLUMNS[:-1]}
+VCT_DTYPES["pop"] = object
+# CSV parsers available to read_vct_csv() in order of preference. pyarrow's
+# parser is multi-threaded.
+VCT_CSV_ENGINES = (["pyarrow"] if pyarrow is not None else []) + ["c"]
+_vct_csv_engine = VCT_CSV_ENGINES[0]
+
+
+def get_gz_codec():
+    """Return the name of the gzip codec backend in use."""
+    return _gz_codec
+
+
+def set_gz_codec(name):
+    """
+    Set the gzip codec backend used to read and write gzip files.
+
+    Parameters
+    ----------
+    name: str
+        Name of a codec in GZ_CODECS. Must support the level set with
+        set_gz_level(), if any.
+    """
+    global _gz_codec
+    if name not in GZ_CODECS:
+        raise ValueError("gzip codec must be one of {}".format(", ".join(GZ_CODECS)))
+    if _gz_level is not None:
+        _check_gz_level(_gz_level, name)
+    _gz_codec = name
+
+
+def set_gz_level(level):
+    """
+    Set the compression level of gzip output.
+
+    Parameters
+    ----------
+    level: int
+        Compression level from 0 (none) to the current codec's maximum level,
+        9 (smallest) for zlib.
+    """
+    global _gz_level
+    _check_gz_level(level, _gz_codec)
+    _gz_level = level
+
+
+def _check_gz_level(level, codec):
+    """Raise ValueError if level is not a valid compression level for codec."""
+    max_level = GZ_CODECS[codec]["max_level"]
+    if level not in range(max_level + 1):
+        raise ValueError(f"gzip level for codec {codec} must be an integer from 0 to {max_level}")
+
+
+def _gz_compresslevel(codec, level=None):
+    """
+    Return the gzip compression level to use with codec.
+
+    If level is None this is the level set by set_gz_level(), or GZ_LEVEL
+    lowered to the codec's maximum level if no level was set.
+    """
+    if level is None:
+        level = _gz_level
+    if level is None:
+        return min(GZ_LEVEL, GZ_CODECS[codec]["max_level"])
+    _check_gz_level(level, codec)
+    return level
+
+
+def set_gz_threads(threads):
+    """
+    Set the number of threads used to compress gzip output.
+
+    Parameters
+    ----------
+    threads: int
+        Number of threads. With more than one thread output is written by
+        ParallelGzipWriter.
+    """
+    global _gz_threads
+    if threads < 1:
+        raise ValueError("gzip threads must be >= 1")
+    _gz_threads = threads
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Raw writer which gzip compresses blocks of data on multiple threads.
+
+    Data written is split into block_size blocks, each compressed as a
+    separate gzip member by a pool of threads, and members are written to
+    fileobj in order. The result is multi-member gzip data, like the output
+    of "pigz --independent", which can be read by gzip, pigz, or
+    GzipStreamReader. At most two blocks per thread are held in memory at once.
+    Closing this writer does not close fileobj.
+    """
+    def __init__(self, fileobj, level=None, threads=None, codec=None, block_size=None):
+        super().__init__()
+        codec = codec or _gz_codec
+        self._fileobj = fileobj
+        self._zlib = GZ_CODECS[codec]["zlib"]
+        self._level = _gz_compresslevel(codec, level)
+        self._threads = threads or _gz_threads
+        self._block_size = block_size or GZ_BLOCK_SIZE
+        self._buf = bytearray()
+        self._pending = deque()
+        self._members = 0
+        self._pool = ThreadPoolExecutor(self._threads)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.closed:
+            raise ValueError("write to closed file")
+        data = memoryview(b).cast("B")
+        n = len(data)
+        if self._buf:
+            take = min(self._block_size - len(self._buf), n)
+            self._buf += data[:take]
+            data = data[take:]
+            if len(self._buf) == self._block_size:
+                self._submit(bytes(self._buf))
+                self._buf = bytearray()
+        while len(data) >= self._block_size:
+            # Copy because the caller may reuse b after write returns
+            self._submit(bytes(data[:self._block_size]))
+            data = data[self._block_size:]
+        self._buf += data
+        return n
+
+    def _compress(self, block):
+        # wbits 31 for a gzip header and trailer
+        return self._zlib.compress(block, self._level, 31)
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(self._compress, block))
+        self._members += 1
+        while len(self._pending) > 2 * self._threads:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        if not hasattr(self, "_pool"):
+            # __init__ raised before any data could be written
+            super().close()
+            return
+        try:
+            # Empty input still gets one empty member to be valid gzip
+            if self._buf or self._members == 0:
+                self._submit(bytes(self._buf))
+                self._buf = bytearray()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+        finally:
+            self._pool.shutdown()
+            super().close()
+
+
+class GzipStreamReader(io.RawIOBase):
+    """
+    Raw reader which incrementally decompresses gzip data from a file object.
+
+    Compressed input is read GZ_READ_SIZE bytes at a time and decompressed
+    directly into the caller's buffer, so neither the whole compressed file
+    nor a second whole decompressed copy is ever held in memory. Concatenated
+    multi-member gzip data is supported. Wrap in io.BufferedReader for a
+    normal file-like interface. Decompression errors are raised as IOError.
+    """
+    def __init__(self, fileobj, codec=None):
+        super().__init__()
+        self._fileobj = fileobj
+        self._zlib = GZ_CODECS[codec or _gz_codec]["zlib"]
+        self._zobj = self._zlib.decompressobj(wbits=self._zlib.MAX_WBITS|32)
+        self._input = b""
+        self._input_eof = False
+        self._started = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        try:
+            return self._readinto(b)
+        except self._zlib.error as e:
+            raise IOError(str(e))
+
+    def _readinto(self, b):
+        if len(b) == 0:
+            return 0
+        while True:
+            if self._zobj.eof:
+                # End of a gzip member. Continue with any following member.
+                # unused_data holds all input left over after the end of the
+                # member, which may also be reported in unconsumed_tail.
+                unused = self._zobj.unused_data
+                self._input = b""
+                if not unused:
+                    unused = self._fileobj.read(GZ_READ_SIZE)
+                    if not unused:
+                        return 0
+                self._zobj = self._zlib.decompressobj(wbits=self._zlib.MAX_WBITS|32)
+                self._input = unused
+            if not self._input and not self._input_eof:
+                self._input = self._fileobj.read(GZ_READ_SIZE)
+                if not self._input:
+                    self._input_eof = True
+            if self._input_eof and not self._input:
+                if not self._started:
+                    return 0  # empty input, treat as empty file
+                raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+            self._started = True
+            data = self._zobj.decompress(self._input, len(b))
+            self._input = self._zobj.unconsumed_tail
+            if data:
+                b[:len(data)] = data
+                return len(data)
+
+
+class DecompressionReader(io.RawIOBase):
+    """
+    Raw reader which reads from a decompressing file object.
+
+    Errors raised by the wrapped decompression library are raised as IOError.
+    Wrap in io.BufferedReader for a normal file-like interface.
+    """
+    def __init__(self, reader, errors):
+        super().__init__()
+        self._reader = reader
+        self._errors = errors
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        try:
+            return self._reader.readinto(b)
+        except self._errors as e:
+            raise IOError(str(e))
+
+
+def is_compressed(path):
+    """Does path have a compressed file extension?"""
+    return path.endswith(COMPRESSED_EXTS)
+
+
+def _require_codec(path):
+    """Raise IOError if the library needed for path's compression is missing."""
+    if path.endswith('.zst') and zstandard is None:
+        raise IOError("zstandard must be installed for zstd compressed files")
+    if path.endswith('.lz4') and lz4 is None:
+        raise IOError("lz4 must be installed for lz4 compressed files")
+
+
+def _decompressed(path, fileobj):
+    """Return a file-like object of decompressed data from fileobj."""
+    _require_codec(path)
+    if path.endswith('.gz'):
+        return io.BufferedReader(GzipStreamReader(fileobj))
+    if path.endswith('.zst'):
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True, closefd=False
+        )
+        return io.BufferedReader(DecompressionReader(reader, zstandard.ZstdError))
+    if path.endswith('.lz4'):
+        reader = lz4.frame.LZ4FrameFile(fileobj, mode='rb')
+        return io.BufferedReader(DecompressionReader(reader, RuntimeError))
+    return fileobj
+
 
 @contextmanager
 def file_open_r(path, fileobj=None):
@@ -17,8 +396,10 @@ def file_open_r(path, fileobj=None):
     Open path or fileobj for reading as a context manager.
 
     Data read from the return value of this function will come from path or
-    preferentially fileobj if provided. If path is provided and ends with '.gz'
-    data will be considered gzip compressed even if read from fileobj. All
+    preferentially fileobj if provided. If path is provided and ends with '.gz',
+    '.zst', or '.lz4' data will be considered gzip, zstd, or lz4 compressed
+    even if read from fileobj. Compressed data is decompressed incrementally
+    as it's read. All
     resources opened by this function (input file handles) or open resources
     passed to this function (fileobj) will be cleaned up by context managers.
     The return value of this function should always be used within a 'with'
@@ -35,35 +416,25 @@ def file_open_r(path, fileobj=None):
     -------
     Context manager for file-like object of Bytes.
     """
-    # zlib is faster than gzip for decompression of EVT data on MacOS, and
-    # comparable on Linux.
     if fileobj:
-        if path.endswith('.gz'):
-            gzdata = fileobj.read()
-            zobj = zlib.decompressobj(wbits=zlib.MAX_WBITS|32)
-            data = zobj.decompress(gzdata)
-            yield io.BytesIO(data)
-        else:
-            yield fileobj
+        yield _decompressed(path, fileobj)
     else:
-        if path.endswith('.gz'):
-            with io.open(path, 'rb') as fileobj:
-                gzdata = fileobj.read()
-                zobj = zlib.decompressobj(wbits=zlib.MAX_WBITS|32)
-                data = zobj.decompress(gzdata)
-                yield io.BytesIO(data)
-        else:
-            with io.open(path, 'rb') as fh:
-                yield fh
+        with io.open(path, 'rb') as fh:
+            yield _decompressed(path, fh)
 
 
 @contextmanager
-def file_open_w(path):
+def file_open_w(path, size=None):
     """
     Open path for writing as a context manager.
 
-    If path ends with '.gz' data will gzip compressed. Only the write method of
-    the returned object should be used. All resources opened in this function
+    If path ends with '.gz' data will gzip compressed with the current gzip
+    codec backend at the level set by set_gz_level(), or GZ_LEVEL lowered to
+    the codec's maximum level if no level was set. If more than one thread
+    was set with set_gz_threads() data is compressed on multiple threads as
+    multi-member gzip. If path ends with '.zst' or '.lz4' data will be zstd or lz4 compressed at
+    ZSTD_LEVEL or LZ4_LEVEL. Only the write method of the returned object
+    should be used. All resources opened in this function
     (output file handles, gzipping child processes) will be cleaned up by
     context managers. The return value of this function should always be used
     within a 'with' block.
@@ -72,26 +443,44 @@ def file_open_w(path):
     -----------
     path: str
         File path.
+    size: int, optional
+        Total number of bytes that will be written. If provided it's recorded
+        in the frame header of zstd and lz4 files.
 
     Returns
     -------
     Context manager for writable file-like object.
     """
+    _require_codec(path)
     if path.endswith('.gz'):
-        with gzip.open(path, mode='wb', compresslevel=9) as fh:
+        if _gz_threads > 1:
+            with io.open(path, 'wb') as raw:
+                with ParallelGzipWriter(raw) as fh:
+                    yield fh
+        else:
+            level = _gz_compresslevel(_gz_codec)
+            with GZ_CODECS[_gz_codec]["open"](path, mode='wb', compresslevel=level) as fh:
+                yield fh
+    elif path.endswith('.zst'):
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        with io.open(path, 'wb') as raw:
+            with cctx.stream_writer(raw, size=size if size is not None else -1, closefd=False) as fh:
+                yield fh
+    elif path.endswith('.lz4'):
+        with lz4.frame.open(path, mode='wb', compression_level=LZ4_LEVEL, source_size=size or 0) as fh:
             yield fh
     else:
         with io.open(path, 'wb') as fh:
             yield fh
 
 
-def read_labview(path, columns, fileobj=None):
+def read_labview(path, columns, fileobj=None, mmap=False, usecols=None):
     """
     Read a labview binary SeaFlow data file.
 
     Data will be read from the file at the provided path or preferentially from
-    fileobj if provided. If path is provided and ends with '.gz' data will be
-    considered gzip compressed even if read from fileobj.
+    fileobj if provided. If path is provided and ends with '.gz', '.zst', or
+    '.lz4' data will be considered compressed even if read from fileobj.
 
     Parameters
     -----------
@@ -101,14 +490,33 @@ def read_labview(path, columns, fileobj=None):
         Names of columns. Also represents how many columns there are.
     fileobj: io.BytesIO, optional
         Open file object.
+    mmap: bool, default False
+        Memory-map uncompressed files rather than reading them into memory.
+        See read_labview_mmap(). Ignored if fileobj is provided or if path is
+        compressed.
+    usecols: list of str, optional
+        Subset of columns to return. Other columns will not be materialized.
+        Default is all columns.
 
     Returns
     -------
     pandas.DataFrame
-        SeaFlow event DataFrame as numpy.float64 values.
+        SeaFlow event DataFrame as numpy.uint16 values.
     """
-    colcnt = len(columns) + 2  # 2 leading column per row
+    if mmap and not fileobj and not is_compressed(path):
+        return read_labview_mmap(path, columns, usecols=usecols)
+    usecols = _check_usecols(columns, usecols)
+    events = _read_labview_events(path, len(columns) + 2, fileobj)
+    return _labview_df(events, columns, usecols)
+
 
+def _read_labview_events(path, colcnt, fileobj=None):
+    """
+    Read a labview binary SeaFlow data file as a 2d numpy.uint16 array.
+
+    The returned array has one row per particle and colcnt columns, including
+    the two leading labview columns. See read_labview() for other parameters.
+    """
     try:
         with file_open_r(path, fileobj) as fh:
             # Particle count (rows of data) is stored in an initial 32-bit
@@ -152,7 +560,35 @@ def read_labview(path, columns, fileobj=None):
 
     events = np.frombuffer(buff, dtype="uint16", count=rowcnt*colcnt)
     # Reshape into a matrix of colcnt columns and one row per particle
-    events = np.reshape(events, [rowcnt, colcnt])
+    return np.reshape(events, [rowcnt, colcnt])
+
+
+def _check_usecols(columns, usecols):
+    """Validate a column subset for a labview file, defaulting to all columns."""
+    if usecols is None:
+        return list(columns)
+    unknown = [c for c in usecols if c not in columns]
+    if unknown:
+        raise ValueError("Unknown columns {}".format(", ".join(unknown)))
+    return list(usecols)
+
+
+def _check_dtype(dtype):
+    """Validate a particle data dtype, returning it as a numpy.dtype."""
+    dtype = np.dtype(dtype)
+    if dtype not in particleops.DTYPES:
+        raise ValueError("dtype must be one of {}".format(", ".join([str(d) for d in particleops.DTYPES])))
+    return dtype
+
+
+def _labview_df(events, columns, usecols):
+    """
+    Create a DataFrame from a 2d array of labview particle data.
+
+    events should have one row per particle and two leading labview columns
+    before the data columns listed in columns. Only usecols will be copied
+    into the returned DataFrame.
+    """
     # Create a Pandas DataFrame with descriptive column names.
     #
     # The first two uint16s [0,10] from start of each row are left out.
@@ -161,8 +597,163 @@ def read_labview(path, columns, fileobj=None):
     # linefeed in ASCII), but because the last line doesn't have them
     # it's easier to treat them as leading ints on each line after the
     # header.
-    df = pd.DataFrame(np.delete(events, [0, 1], 1), columns=columns)
-    return df
+    if usecols == list(columns):
+        # Strided view, no copy
+        data = events[:, 2:]
+    else:
+        data = events[:, [columns.index(c) + 2 for c in usecols]]
+    return pd.DataFrame(data, columns=usecols)
+
+
+def read_labview_blocks(path, columns, fileobj=None, block_rows=BLOCK_ROWS, usecols=None):
+    """
+    Read a labview binary SeaFlow data file as a sequence of particle blocks.
+
+    This is a generator. Data is read and decompressed incrementally, and each
+    block of whole particle rows is yielded as soon as it's available, so
+    memory use is bounded by block size rather than file size. Data will be
+    read from the file at the provided path or preferentially from fileobj if
+    provided. If path is provided and ends with '.gz', '.zst', or '.lz4' data
+    will be considered compressed even if read from fileobj.
+
+    Because data is validated as it's read, errors.FileError may be raised
+    after some blocks have already been yielded, e.g. if the file has fewer or
+    more rows than reported in its header.
+
+    Parameters
+    -----------
+    path: str
+        File path.
+    columns: list of str
+        Names of columns. Also represents how many columns there are.
+    fileobj: io.BytesIO, optional
+        Open file object.
+    block_rows: int, default BLOCK_ROWS
+        Maximum number of particle rows per block.
+    usecols: list of str, optional
+        Subset of columns to return. Default is all columns.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Block of SeaFlow event data as numpy.uint16 values.
+    """
+    if block_rows < 1:
+        raise ValueError("block_rows must be > 0")
+    usecols = _check_usecols(columns, usecols)
+    colcnt = len(columns) + 2  # 2 leading column per row
+    row_bytes = colcnt * 2
+
+    try:
+        with file_open_r(path, fileobj) as fh:
+            # Particle count (rows of data) is stored in an initial 32-bit
+            # unsigned int
+            buff = fh.read(4)
+            if len(buff) == 0:
+                raise errors.FileError("File is empty")
+            if len(buff) != 4:
+                raise errors.FileError("File has invalid particle count header")
+            rowcnt = int(np.frombuffer(buff, dtype="uint32", count=1)[0])
+            if rowcnt == 0:
+                raise errors.FileError("File has no particle data")
+            expected_bytes = rowcnt * row_bytes
+
+            rows_left = rowcnt
+            while rows_left > 0:
+                want_rows = min(block_rows, rows_left)
+                buff = fh.read(want_rows * row_bytes)
+                if len(buff) != want_rows * row_bytes:
+                    found_bytes = (rowcnt - rows_left) * row_bytes + len(buff)
+                    raise errors.FileError(
+                        "File has incorrect number of data bytes. Expected %i, saw %i" %
+                        (expected_bytes, found_bytes)
+                    )
+                rows_left -= want_rows
+                events = np.frombuffer(buff, dtype="uint16").reshape(want_rows, colcnt)
+                yield _labview_df(events, columns, usecols)
+
+            extra_bytes = 0
+            while True:
+                new_bytes = len(fh.read(8192))
+                extra_bytes += new_bytes
+                if new_bytes == 0:  # end of file
+                    break
+            if extra_bytes:
+                raise errors.FileError(
+                    "File has incorrect number of data bytes. Expected %i, saw %i" %
+                    (expected_bytes, expected_bytes + extra_bytes)
+                )
+    except (IOError, EOFError, zlib.error) as e:
+        raise errors.FileError("File could not be read: {}".format(str(e)))
+
+
+def read_labview_mmap(path, columns, usecols=None):
+    """
+    Read an uncompressed labview binary SeaFlow data file by memory-mapping.
+
+    The file header and file size are validated before mapping, but particle
+    data is not read or copied. The returned DataFrame is backed by a read-only
+    strided view of the mapped file which skips the two leading LabVIEW
+    columns in each row. Data will be paged in from disk as it's accessed.
+
+    Parameters
+    -----------
+    path: str
+        File path of an uncompressed labview file.
+    columns: list of str
+        Names of columns. Also represents how many columns there are.
+    usecols: list of str, optional
+        Subset of columns to return. If provided, only these columns will be
+        read and copied out of the mapped file. Default is all columns.
+
+    Returns
+    -------
+    pandas.DataFrame
+        SeaFlow event DataFrame as read-only numpy.uint16 values.
+    """
+    usecols = _check_usecols(columns, usecols)
+    events = _mmap_labview_events(path, len(columns) + 2)
+    return _labview_df(events, columns, usecols)
+
+
+def _mmap_labview_events(path, colcnt):
+    """
+    Memory-map an uncompressed labview binary SeaFlow data file as a 2d
+    read-only numpy.uint16 array.
+
+    The returned array has one row per particle and colcnt columns, including
+    the two leading labview columns.
+    """
+    try:
+        with io.open(path, 'rb') as fh:
+            # Particle count (rows of data) is stored in an initial 32-bit
+            # unsigned int
+            buff = fh.read(4)
+            file_bytes = os.fstat(fh.fileno()).st_size
+    except IOError as e:
+        raise errors.FileError("File could not be read: {}".format(str(e)))
+    if len(buff) == 0:
+        raise errors.FileError("File is empty")
+    if len(buff) != 4:
+        raise errors.FileError("File has invalid particle count header")
+    rowcnt = int(np.frombuffer(buff, dtype="uint32", count=1)[0])
+    if rowcnt == 0:
+        raise errors.FileError("File has no particle data")
+
+    # Check that file has the expected number of data bytes.
+    expected_bytes = rowcnt * colcnt * 2  # rowcnt * colcnt columns * 2 bytes
+    found_bytes = file_bytes - 4
+    if found_bytes != expected_bytes:
+        raise errors.FileError(
+            "File has incorrect number of data bytes. Expected %i, saw %i" %
+            (expected_bytes, found_bytes)
+        )
+
+    try:
+        events = np.memmap(path, dtype="uint16", mode="r", offset=4, shape=(rowcnt, colcnt))
+    except (IOError, ValueError) as e:
+        raise errors.FileError("File could not be read: {}".format(str(e)))
+    return events
 
 
 def read_labview_row_count(path, fileobj=None):
@@ -173,8 +764,8 @@ def read_labview_row_count(path, fileobj=None):
     get the reported row count from the file header. This should be a much
     faster method of getting row count than reading the whole file. Data will
     be read from the file at the provided path or preferentially from fileobj
-    if provided. If path is provided and ends with '.gz' data will be
-    considered gzip compressed even if read from fileobj.
+    if provided. If path is provided and ends with '.gz', '.zst', or
+    '.lz4' data will be considered compressed even if read from fileobj.
 
     Parameters
     -----------
@@ -188,15 +779,17 @@ def read_labview_row_count(path, fileobj=None):
     int
         Number of rows reported in the labview file header (first uint32).
     """
-    if path.endswith('.gz'):
-        with io.open(path, 'rb') as fh:
-            fileobj = io.BytesIO(fh.read(512))  # read enough to get first 4 uncompressed bytes
+    if not fileobj and is_evt_archive_path(path):
+        pf, i = _evt_archive_row_group(path)
+        return np.uint32(pf.row_groups[i].num_rows)
+    # Compressed data is decompressed incrementally by file_open_r, so only
+    # enough to get the first 4 uncompressed bytes is read here.
     with file_open_r(path, fileobj) as fh:
         # Particle count (rows of data) is stored in an initial 32-bit
         # unsigned int
         try:
             buff = fh.read(4)
-        except (IOError, EOFError) as e:
+        except (IOError, EOFError, zlib.error) as e:
             raise errors.FileError("File could not be read: {}".format(str(e)))
         if len(buff) == 0:
             raise errors.FileError("File is empty")
@@ -206,13 +799,92 @@ def read_labview_row_count(path, fileobj=None):
     return rowcnt
 
 
-def read_evt_labview(path, fileobj=None):
+def validate_labview_size(path, columns):
+    """
+    Quickly validate a labview binary SeaFlow data file by size.
+
+    Only the row count header and the file size are examined, particle data
+    is not read. For uncompressed files the file size must match the header
+    row count exactly. For gzip compressed files the uncompressed size stored
+    in the gzip trailer (ISIZE, size modulo 2**32 of the last gzip member) is
+    compared instead. This does not check gzip CRCs or the data itself, and
+    multi-member gzip files will usually fail this check even if valid. zstd
+    and lz4 files always fail this check, since a frame header records its
+    content size up front and a truncated file would still pass. Callers should
+    fall back to a full read when this check fails.
+
+    Parameters
+    -----------
+    path: str
+        File path.
+    columns: list of str
+        Names of columns. Also represents how many columns there are.
+
+    Raises
+    ------
+    errors.FileError if the file header or size is invalid.
+
+    Returns
+    -------
+    int
+        Number of rows reported in the labview file header.
+    """
+    colcnt = len(columns) + 2  # 2 leading column per row
+    rowcnt = int(read_labview_row_count(path))
+    if rowcnt == 0:
+        raise errors.FileError("File has no particle data")
+    expected_bytes = rowcnt * colcnt * 2  # rowcnt * colcnt columns * 2 bytes
+    try:
+        if path.endswith('.gz'):
+            with io.open(path, 'rb') as fh:
+                if os.fstat(fh.fileno()).st_size < 18:  # smallest gzip member
+                    raise errors.FileError("File has invalid gzip trailer")
+                fh.seek(-4, io.SEEK_END)
+                isize = int(np.frombuffer(fh.read(4), dtype="<u4", count=1)[0])
+            found_bytes = isize - 4
+            expected_bytes = expected_bytes % 2**32
+            found_bytes = found_bytes % 2**32
+        elif is_compressed(path):
+            raise errors.FileError("Fast size validation is not supported for zstd or lz4 files")
+        else:
+            found_bytes = os.stat(path).st_size - 4
+    except (IOError, OSError) as e:
+        raise errors.FileError("File could not be read: {}".format(str(e)))
+    if found_bytes != expected_bytes:
+        raise errors.FileError(
+            "File has incorrect number of data bytes. Expected %i, saw %i" %
+            (expected_bytes, found_bytes)
+        )
+    return rowcnt
+
+
+def _particle_batch(path, df, columns, dtype):
+    """
+    Create a ParticleBatch from a uint16 particle DataFrame without copying.
+
+    columns are converted to dtype. file_id and date are set from path if it
+    is a SeaFlow file name.
+    """
+    try:
+        sfile = SeaFlowFile(path)
+        file_id = sfile.file_id
+        date = pd.Timestamp(sfile.date) if sfile.date is not None else None
+    except (errors.FileError, ValueError):
+        file_id, date = None, None
+    batch = particleops.ParticleBatch.from_pandas(df, file_id=file_id, date=date)
+    return batch.astype(dtype, columns=columns)
+
+
+def read_evt_labview(path, fileobj=None, mmap=False, columns=None, dtype=np.float64, batch=False):
     """
     Read a raw labview binary SeaFlow data file.
 
     Data will be read from the file at the provided path or preferentially from
-    fileobj if provided. If path is provided and ends with '.gz' data will be
-    considered gzip compressed even if read from fileobj.
+    fileobj if provided. If path is provided and ends with '.gz', '.zst', or
+    '.lz4' data will be considered compressed even if read from fileobj. If
+    path is a file in an EVT archive (see write_evt_archive()) data will be
+    read from the archive. If the EVT cache is enabled (see evtcache) decoded
+    data for path is read from or saved to the cache.
 
     Parameters
     -----------
@@ -220,22 +892,315 @@ def read_evt_labview(path, fileobj=None):
         File path.
     fileobj: io.BytesIO, optional
         Open file object.
+    mmap: bool, default False
+        Memory-map uncompressed files rather than reading them into memory.
+    columns: list of str, optional
+        Subset of particleops.COLUMNS to read. Other columns are never
+        converted or stored. Default is all columns.
+    dtype: numpy.dtype, default numpy.float64
+        Value type for particle data, one of particleops.DTYPES. numpy.uint16
+        keeps raw instrument values without a conversion pass. Note that
+        numpy.uint16 data read with mmap will be read-only.
+    batch: bool, default False
+        Return a particleops.ParticleBatch with file_id and date set from
+        path, rather than a DataFrame.
+
+    Returns
+    -------
+    pandas.DataFrame or particleops.ParticleBatch
+        SeaFlow event data as dtype values.
+    """
+    dtype = _check_dtype(dtype)
+    if not fileobj and is_evt_archive_path(path):
+        usecols = _check_usecols(particleops.COLUMNS, columns)
+        df = _read_evt_archive_entry(path, usecols)
+    elif not fileobj and evtcache.enabled():
+        usecols = _check_usecols(particleops.COLUMNS, columns)
+        events = _cached_evt_events(path, mmap)
+        if usecols != particleops.COLUMNS:
+            events = events[[particleops.COLUMNS.index(c) for c in usecols]]
+        if not mmap:
+            # Cache entries are read-only memory maps
+            events = np.require(events, requirements="W")
+        df = pd.DataFrame(events.T, columns=usecols)
+    else:
+        df = read_labview(path, particleops.COLUMNS, fileobj, mmap=mmap, usecols=columns)
+    if batch:
+        return _particle_batch(path, df, list(df.columns), dtype)
+    return df.astype(dtype, copy=False)
+
+
+def _cached_evt_events(path, mmap=False):
+    """
+    Get decoded EVT particle data from the EVT cache, decoding on a miss.
+
+    Returns
+    -------
+    numpy.ndarray
+        2d numpy.uint16 array with one row per particleops.COLUMNS column.
+    """
+    events = evtcache.get(path)
+    if events is None:
+        colcnt = len(particleops.COLUMNS) + 2  # 2 leading column per row
+        if mmap and not is_compressed(path):
+            events = _mmap_labview_events(path, colcnt)[:, 2:].T
+        else:
+            events = _read_labview_events(path, colcnt)[:, 2:].T
+        evtcache.put(path, events)
+    return events
+
+
+def read_evt_many(paths, mmap=False, columns=None, dtype=np.float64, file_ids=None):
+    """
+    Read many raw labview binary SeaFlow data files into one DataFrame.
+
+    Particle counts from all file headers are summed up front to preallocate
+    one array for all files, then each file is decoded directly into its
+    slice. This avoids building and concatenating a DataFrame per file. Files
+    which can't be read contribute no rows, and their errors are reported in
+    the returned "errors" list. Paths may be files in an EVT archive. If the
+    EVT cache is enabled (see evtcache) it's used as in read_evt_labview().
+
+    Parameters
+    -----------
+    paths: list of str
+        File paths.
+    mmap: bool, default False
+        Memory-map uncompressed files rather than reading them into memory.
+    columns: list of str, optional
+        Subset of particleops.COLUMNS to read. Default is all columns.
+    dtype: numpy.dtype, default numpy.float64
+        Value type for particle data, one of particleops.DTYPES.
+    file_ids: list, optional
+        File ID for each path, used to label rows in "file_id". Default is
+        the path.
+
+    Returns
+    -------
+    dict
+        {
+            "df": pandas.DataFrame of particle data for all files in path order,
+            "offsets": numpy.ndarray of len(paths) + 1 row offsets, where rows
+                offsets[i]:offsets[i+1] of "df" came from paths[i],
+            "file_id": pandas.Categorical of the file ID of each row in "df",
+                with categories for files which contributed rows,
+            "errors": list of error messages for each path, empty string if
+                the file was read successfully
+        }
+    """
+    if file_ids is None:
+        file_ids = paths
+    elif len(file_ids) != len(paths):
+        raise ValueError("file_ids must have the same length as paths")
+    dtype = _check_dtype(dtype)
+    usecols = _check_usecols(particleops.COLUMNS, columns)
+    colcnt = len(particleops.COLUMNS) + 2  # 2 leading column per row
+    # Position of each requested column in raw labview rows
+    col_idx = [particleops.COLUMNS.index(c) + 2 for c in usecols]
+
+    # Preallocate for the sum of header row counts. Each column is stored
+    # contiguously so the final DataFrame can use this array without a copy.
+    rowcnts = []
+    for path in paths:
+        try:
+            rowcnts.append(int(read_labview_row_count(path)))
+        except errors.FileError:
+            rowcnts.append(0)
+    data = np.empty((len(usecols), sum(rowcnts)), dtype=dtype)
+
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    errs = []
+    cursor = 0  # next unfilled row
+    for i, path in enumerate(paths):
+        err = ""
+        try:
+            if is_evt_archive_path(path):
+                archive_df = _read_evt_archive_entry(path, usecols)
+                values = [archive_df[c].values for c in usecols]
+                rowcnt = len(archive_df.index)
+            elif evtcache.enabled():
+                events = _cached_evt_events(path, mmap)
+                values = [events[c - 2] for c in col_idx]
+                rowcnt = events.shape[1]
+            else:
+                if mmap and not is_compressed(path):
+                    events = _mmap_labview_events(path, colcnt)
+                else:
+                    events = _read_labview_events(path, colcnt)
+                values = [events[:, c] for c in col_idx]
+                rowcnt = len(events)
+            if cursor + rowcnt > data.shape[1]:
+                # Header count changed since first read, e.g. file was
+                # modified.
+                raise errors.FileError("File particle count changed during read")
+        except errors.FileError as e:
+            err = str(e)
+        else:
+            for j, v in enumerate(values):
+                data[j, cursor:cursor + rowcnt] = v
+            cursor += rowcnt
+        errs.append(err)
+        offsets[i + 1] = cursor
+
+    # Trim unused rows from unreadable files with a view, not a copy
+    df = pd.DataFrame(data[:, :cursor].T, columns=usecols)
+    # Label rows by file with codes repeated from one categorical value per
+    # file, rather than building a per-row array of file ID objects
+    counts = np.diff(offsets)
+    read_ok = counts > 0
+    file_id_cat = pd.Categorical([fid for fid, ok in zip(file_ids, read_ok) if ok])
+    file_id = pd.Categorical.from_codes(
+        np.repeat(file_id_cat.codes, counts[read_ok]),
+        categories=file_id_cat.categories
+    )
+    return {
+        "df": df,
+        "offsets": offsets,
+        "file_id": file_id,
+        "errors": errs
+    }
+
+
+def is_evt_archive_path(path):
+    """
+    Is path a file in an EVT archive?
+
+    Files in an EVT archive created by write_evt_archive() are addressed by
+    the archive directory joined with their file ID, e.g.
+    archive/2014_185/2014-07-04T00-00-02+00-00. These paths don't exist on
+    disk, but their day of year directory holds an EVT_ARCHIVE_FILE.
+    """
+    return (
+        not os.path.exists(path) and
+        os.path.isfile(os.path.join(os.path.dirname(path), EVT_ARCHIVE_FILE))
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _open_evt_archive_day(daypath, mtime):
+    """
+    Open one day of an EVT archive.
+
+    Cached by path and modification time to avoid parsing Parquet metadata
+    for every file read from the same day.
+
+    Returns
+    -------
+    tuple of (fastparquet.ParquetFile, dict of {file_id: row group index})
+    """
+    pf = fastparquet.ParquetFile(daypath)
+    # Each row group holds one file, so min file_id is the row group's file_id
+    file_ids = pf.statistics["min"]["file_id"]
+    for i, f in enumerate(file_ids):
+        if f is None:
+            # No statistics, read the first file_id of the row group instead
+            df = pf.read_row_group_file(pf.row_groups[i], ["file_id"], None)
+            file_ids[i] = df["file_id"].iloc[0]
+    return pf, {f: i for i, f in enumerate(file_ids)}
+
+
+def _evt_archive_day(daypath):
+    """Open one day of an EVT archive, raising FileError on failure."""
+    try:
+        return _open_evt_archive_day(daypath, os.stat(daypath).st_mtime_ns)
+    except (IOError, OSError, ValueError, KeyError) as e:
+        raise errors.FileError("EVT archive could not be read: {}".format(str(e)))
+
+
+def _evt_archive_row_group(path):
+    """Return (fastparquet.ParquetFile, row group index) for an archive path."""
+    pf, row_groups = _evt_archive_day(os.path.join(os.path.dirname(path), EVT_ARCHIVE_FILE))
+    file_id = SeaFlowFile(path).file_id
+    if file_id not in row_groups:
+        raise errors.FileError("File not found in EVT archive")
+    return pf, row_groups[file_id]
+
+
+def _read_evt_archive_entry(path, usecols):
+    """Read usecols particle columns of one file in an EVT archive as uint16."""
+    pf, i = _evt_archive_row_group(path)
+    try:
+        df = pf.read_row_group_file(pf.row_groups[i], usecols, None)
+    except (IOError, OSError, ValueError) as e:
+        raise errors.FileError("File could not be read from EVT archive: {}".format(str(e)))
+    return df.reset_index(drop=True)
+
+
+def find_evt_archive_files(archive_dir):
+    """
+    Return a chronologically sorted list of EVT archive file paths.
+
+    Parameters
+    -----------
+    archive_dir: str
+        EVT archive directory or one day of year directory in an EVT archive.
+
+    Returns
+    -------
+    list of str
+        Paths of files in the archive, which can be read with
+        read_evt_labview() or read_evt_many().
+    """
+    daypaths = glob.glob(os.path.join(archive_dir, "*", EVT_ARCHIVE_FILE))
+    if os.path.isfile(os.path.join(archive_dir, EVT_ARCHIVE_FILE)):
+        daypaths.append(os.path.join(archive_dir, EVT_ARCHIVE_FILE))
+    files = []
+    for daypath in daypaths:
+        _, row_groups = _evt_archive_day(daypath)
+        daydir = os.path.dirname(daypath)
+        files.extend([os.path.join(daydir, f.split("/")[-1]) for f in row_groups])
+    return sorted_files(files)
+
+
+def read_evt_archive(archive_dir, columns=None, dtype=np.float64):
+    """
+    Read all files in an EVT archive into one DataFrame.
+
+    Parameters
+    -----------
+    archive_dir: str
+        EVT archive directory or one day of year directory in an EVT archive.
+    columns: list of str, optional
+        Subset of particleops.COLUMNS to read. Default is all columns.
+    dtype: numpy.dtype, default numpy.float64
+        Value type for particle data, one of particleops.DTYPES.
 
     Returns
     -------
     pandas.DataFrame
-        SeaFlow event DataFrame as numpy.float64 values.
+        SeaFlow event DataFrame in chronological order with "date" and
+        categorical "file_id" columns followed by particle columns.
     """
-    return read_labview(path, particleops.COLUMNS, fileobj).astype(np.float64)
+    dtype = _check_dtype(dtype)
+    usecols = _check_usecols(particleops.COLUMNS, columns)
+    daypaths = sorted(glob.glob(os.path.join(archive_dir, "*", EVT_ARCHIVE_FILE)))
+    if os.path.isfile(os.path.join(archive_dir, EVT_ARCHIVE_FILE)):
+        daypaths.append(os.path.join(archive_dir, EVT_ARCHIVE_FILE))
+    dfs = []
+    for daypath in daypaths:
+        pf, _ = _evt_archive_day(daypath)
+        try:
+            dfs.append(pf.to_pandas(columns=["date", "file_id"] + usecols))
+        except (IOError, OSError, ValueError) as e:
+            raise errors.FileError("EVT archive could not be read: {}".format(str(e)))
+    if not dfs:
+        df = pd.DataFrame({"date": pd.Series([], dtype="datetime64[ns, UTC]"), "file_id": []})
+        for c in usecols:
+            df[c] = np.array([], dtype=np.uint16)
+    else:
+        df = pd.concat(dfs, ignore_index=True)
+    df["file_id"] = df["file_id"].astype("category")
+    df[usecols] = df[usecols].astype(dtype, copy=False)
+    return df
 
 
-def read_opp_labview(path, fileobj=None):
+def read_opp_labview(path, fileobj=None, mmap=False, columns=None, dtype=np.float64, batch=False):
     """
     Read an OPP labview binary SeaFlow data file.
 
     Data will be read from the file at the provided path or preferentially from
-    fileobj if provided. If path is provided and ends with '.gz' data will be
-    considered gzip compressed even if read from fileobj.
+    fileobj if provided. If path is provided and ends with '.gz', '.zst', or
+    '.lz4' data will be considered compressed even if read from fileobj.
 
     Parameters
     -----------
@@ -243,28 +1208,203 @@ def read_opp_labview(path, fileobj=None):
         File path.
     fileobj: io.BytesIO, optional
         Open file object.
+    mmap: bool, default False
+        Memory-map uncompressed files rather than reading them into memory.
+    columns: list of str, optional
+        Subset of particleops.COLUMNS to read. Other columns are never
+        converted or stored. Quantile flag columns are always included.
+        Default is all columns.
+    dtype: numpy.dtype, default numpy.float64
+        Value type for particle data, one of particleops.DTYPES.
+    batch: bool, default False
+        Return a particleops.ParticleBatch with file_id and date set from
+        path, rather than a DataFrame. Quantile flags are kept as a numpy.uint8
+        "bitflags" column rather than decoded into boolean columns.
 
     Returns
     -------
-    pandas.DataFrame
-        SeaFlow OPP DataFrame as numpy.float64 values with quantile flag
-        columns.
+    pandas.DataFrame or particleops.ParticleBatch
+        SeaFlow OPP data as dtype values with quantile flag columns.
     """
-    df = read_labview(path, particleops.COLUMNS + ["bitflags"], fileobj)
-    df[particleops.COLUMNS] = df[particleops.COLUMNS].astype(np.float64)
+    dtype = _check_dtype(dtype)
+    columns = list(particleops.COLUMNS if columns is None else columns)
+    df = read_labview(
+        path, particleops.COLUMNS + ["bitflags"], fileobj, mmap=mmap,
+        usecols=columns + ["bitflags"]
+    )
+    if batch:
+        opp = _particle_batch(path, df, columns, dtype)
+        return opp.astype(np.uint8, columns=["bitflags"])
+    df[columns] = df[columns].astype(dtype)
     df["noise"] = False  # we know there are no noise events in OPP data
     df["saturated"] = False  # we know there are no saturated events in OPP data
     df = particleops.decode_bit_flags(df)
     return df
 
 
-def read_vct_csv(path, fileobj=None):
+def _utc_timestamp(date):
+    """Convert a date or RFC3339 string to a UTC pandas.Timestamp, or None."""
+    if date is None:
+        return None
+    if isinstance(date, str):
+        date = time.parse_date(date)
+    date = pd.Timestamp(date)
+    if date.tzinfo is None:
+        return date.tz_localize("UTC")
+    return date.tz_convert("UTC")
+
+
+def read_opp_parquet(opp_dir, start=None, end=None, file_ids=None, quantile=None, columns=None):
+    """
+    Read OPP Parquet files created by write_opp_parquet().
+
+    Files are selected by the time window in their file names, then row groups
+    are selected by date and file_id column statistics, before any particle
+    data is read. Only columns needed to return columns and apply selections
+    are read.
+
+    Parameters
+    -----------
+    opp_dir: str
+        Directory of OPP Parquet files.
+    start: datetime.datetime or str, optional
+        Only return particles with date >= start. Strings are parsed as
+        RFC3339 timestamps.
+    end: datetime.datetime or str, optional
+        Only return particles with date <= end. Strings are parsed as RFC3339
+        timestamps.
+    file_ids: list of str, optional
+        Only return particles from these files.
+    quantile: float, optional
+        Only return particles focused for this quantile, e.g. 50.
+    columns: list of str, optional
+        Columns to return. Default is all columns, except other quantile flag
+        columns if quantile is provided.
+
+    Raises
+    ------
+    errors.FileError if a file can't be read.
+    ValueError if quantile isn't present in OPP files.
+
+    Returns
+    -------
+    pandas.DataFrame
+        OPP particle data in chronological order.
+    """
+    start = _utc_timestamp(start)
+    end = _utc_timestamp(end)
+    q_col = "q{}".format(util.quantile_str(quantile)) if quantile is not None else None
+
+    # Select files by time window in file name,
+    # e.g. 2014-07-04T00-00-00+00-00.1H.opp.parquet
+    paths = []
+    for path in glob.glob(os.path.join(opp_dir, "*.opp.parquet")):
+        parts = os.path.basename(path).split(".")
+        try:
+            window_start = pd.Timestamp(time.parse_date(timestamp_from_filename(parts[0])))
+            window_end = window_start + pd.tseries.frequencies.to_offset(parts[1])
+        except (ValueError, IndexError):
+            continue
+        if (start is None or window_end > start) and (end is None or window_start <= end):
+            paths.append((window_start, path))
+    paths = [p for _, p in sorted(paths)]
+
+    # Row group selection by column statistics. Statistics dates are UTC
+    # without a timezone.
+    filters = []
+    if start is not None:
+        filters.append(("date", ">=", start.tz_localize(None)))
+    if end is not None:
+        filters.append(("date", "<=", end.tz_localize(None)))
+    if file_ids is not None:
+        filters.append(("file_id", "in", list(file_ids)))
+
+    dfs = []
+    for path in paths:
+        try:
+            pf = fastparquet.ParquetFile(path)
+        except (IOError, OSError, ValueError) as e:
+            raise errors.FileError("OPP Parquet file {} could not be read: {}".format(path, str(e)))
+        if q_col is not None and q_col not in pf.columns:
+            raise ValueError("quantile {} not found in {}".format(quantile, path))
+        if columns is None:
+            outcols = [c for c in pf.columns if not (q_col and c.startswith("q"))]
+        else:
+            outcols = list(columns)
+        readcols = list(outcols)
+        for c in [f[0] for f in filters] + [q_col]:
+            if c is not None and c not in readcols:
+                readcols.append(c)
+        try:
+            df = pf.to_pandas(columns=readcols, filters=filters)
+        except (IOError, OSError, ValueError) as e:
+            raise errors.FileError("OPP Parquet file {} could not be read: {}".format(path, str(e)))
+        # Row group selection may leave rows outside selections
+        keep = np.full(len(df.index), True)
+        if start is not None:
+            keep &= (df["date"] >= start).values
+        if end is not None:
+            keep &= (df["date"] <= end).values
+        if file_ids is not None:
+            keep &= df["file_id"].isin(file_ids).values
+        if q_col is not None:
+            keep &= df[q_col].values
+        dfs.append(df.loc[keep, outcols])
+
+    if not dfs:
+        if columns is None:
+            columns = [c for c in OPP_PARQUET_COLUMNS if not (q_col and c.startswith("q"))]
+        return _empty_opp_parquet_df(columns)
+    df = pd.concat(dfs, ignore_index=True)
+    if "file_id" in df.columns:
+        df["file_id"] = df["file_id"].astype("category").cat.remove_unused_categories()
+    return df
+
+
+def _empty_opp_parquet_df(columns):
+    """Return an empty OPP DataFrame with the column types of OPP Parquet files."""
+    df = pd.DataFrame(index=pd.RangeIndex(0))
+    for c in columns:
+        if c == "date":
+            df[c] = pd.Series([], dtype="datetime64[ns, UTC]")
+        elif c == "file_id":
+            df[c] = pd.Series([], dtype="category")
+        elif c in particleops.flags:
+            df[c] = np.array([], dtype=bool)
+        else:
+            df[c] = np.array([], dtype=np.float64)
+    return df
+
+
+def get_vct_csv_engine():
+    """Return the name of the CSV parser used by read_vct_csv()."""
+    return _vct_csv_engine
+
+
+def set_vct_csv_engine(name):
+    """
+    Set the CSV parser used by read_vct_csv().
+
+    Parameters
+    ----------
+    name: str
+        Name of a parser in VCT_CSV_ENGINES.
+    """
+    global _vct_csv_engine
+    if name not in VCT_CSV_ENGINES:
+        raise ValueError("VCT CSV engine must be one of {}".format(", ".join(VCT_CSV_ENGINES)))
+    _vct_csv_engine = name
+
+
+def read_vct_csv(path, fileobj=None, engine=None):
     """
     Read a VCT space-separated CSV SeaFlow data file for one quantile.
 
     Data will be read from the file at the provided path or preferentially from
-    fileobj if provided. If path is provided and ends with '.gz' data will be
-    considered gzip compressed even if read from fileobj.
+    fileobj if provided. If path is provided and ends with '.gz', '.zst', or
+    '.lz4' data will be considered compressed even if read from fileobj.
+    Columns are parsed with a fixed schema, VCT_COLUMNS and VCT_DTYPES, rather
+    than inferring types.
 
     Parameters
     -----------
@@ -272,6 +1412,9 @@ def read_vct_csv(path, fileobj=None):
         File path.
     fileobj: io.BytesIO, optional
         Open file object.
+    engine: str, optional
+        CSV parser, one of VCT_CSV_ENGINES. Defaults to the parser set by
+        set_vct_csv_engine().
 
     Returns
     -------
@@ -279,9 +1422,174 @@ def read_vct_csv(path, fileobj=None):
         SeaFlow VCT DataFrame for one quantile as numpy.float64 values plus
         one text column for population labels.
     """
+    if engine is None:
+        engine = _vct_csv_engine
+    elif engine not in VCT_CSV_ENGINES:
+        raise ValueError("VCT CSV engine must be one of {}".format(", ".join(VCT_CSV_ENGINES)))
     with file_open_r(path, fileobj) as fh:
-        df = pd.read_csv(fh, sep=" ", names=["diam_lwr", "Qc_lwr", "diam_mid", "Qc_mid", "diam_upr", "Qc_upr", "pop"])
-        return df
+        if engine == "pyarrow":
+            table = pyarrow.csv.read_csv(
+                fh,
+                read_options=pyarrow.csv.ReadOptions(column_names=VCT_COLUMNS),
+                parse_options=pyarrow.csv.ParseOptions(delimiter=" "),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={
+                        c: (pyarrow.string() if c == "pop" else pyarrow.float64())
+                        for c in VCT_COLUMNS
+                    }
+                )
+            )
+            return table.to_pandas()
+        return pd.read_csv(
+            fh, sep=" ", header=None, names=VCT_COLUMNS, dtype=VCT_DTYPES,
+            engine="c", na_filter=False
+        )
+
+
+def find_vct_files(vct_dir, quantiles=None):
+    """
+    Find VCT files in a VCT directory.
+
+    A VCT directory has one subdirectory per quantile, each organized by day
+    of year, e.g. vct_dir/50/2014_185/2014-07-04T00-00-02+00-00.vct.gz.
+
+    Parameters
+    -----------
+    vct_dir: str
+        VCT directory.
+    quantiles: list of float, optional
+        Only find files for these quantiles. Default is all quantiles.
+
+    Returns
+    -------
+    dict of {str: list of str}
+        Chronologically sorted VCT file paths keyed by quantile string, e.g.
+        "2.5", "50", "97.5", in ascending quantile order.
+    """
+    exts = tuple(".vct" + ext for ext in ("",) + COMPRESSED_EXTS)
+    found = {}
+    for qdir in glob.glob(os.path.join(vct_dir, "*")):
+        try:
+            q = util.quantile_str(float(os.path.basename(qdir)))
+        except ValueError:
+            continue
+        if os.path.isdir(qdir):
+            paths = [p for p in util.find_files(qdir) if p.endswith(exts)]
+            found[q] = sorted_files(paths)
+    if quantiles is not None:
+        wanted = [util.quantile_str(q) for q in quantiles]
+        for q in wanted:
+            if q not in found:
+                raise ValueError("quantile {} not found in {}".format(q, vct_dir))
+        found = {q: found[q] for q in wanted}
+    return {q: found[q] for q in sorted(found, key=float)}
+
+
+def _read_vct_file(path):
+    """Read a VCT file, raising FileError on failure."""
+    try:
+        return read_vct_csv(path)
+    except (IOError, OSError, ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise errors.FileError("VCT file {} could not be read: {}".format(path, str(e)))
+
+
+def read_vct_dir(vct_dir, quantiles=None, jobs=1):
+    """
+    Read all VCT files in a VCT directory into one DataFrame.
+
+    Parameters
+    -----------
+    vct_dir: str
+        VCT directory, as described in find_vct_files().
+    quantiles: list of float, optional
+        Only read files for these quantiles. Default is all quantiles.
+    jobs: int, default 1
+        Number of files to read concurrently.
+
+    Raises
+    ------
+    errors.FileError if a file can't be read.
+    ValueError if a quantile isn't present in vct_dir.
+
+    Returns
+    -------
+    pandas.DataFrame
+        SeaFlow VCT DataFrame with "date", categorical "file_id", and
+        categorical "quantile" columns followed by VCT_COLUMNS, ordered by
+        quantile then time. "pop" is categorical.
+    """
+    dfs = []
+    for q, paths in find_vct_files(vct_dir, quantiles).items():
+        sfiles = [SeaFlowFile(p) for p in paths]
+        for sfile, df in zip(sfiles, util.imap_ordered(_read_vct_file, paths, jobs=jobs)):
+            df.insert(0, "quantile", q)
+            df.insert(0, "file_id", sfile.file_id)
+            df.insert(0, "date", sfile.date)
+            dfs.append(df)
+    if not dfs:
+        df = pd.DataFrame({c: pd.Series([], dtype=VCT_DTYPES[c]) for c in VCT_COLUMNS})
+        df.insert(0, "quantile", pd.Series([], dtype=object))
+        df.insert(0, "file_id", pd.Series([], dtype=object))
+        df.insert(0, "date", pd.Series([], dtype="datetime64[ns, UTC]"))
+    else:
+        df = pd.concat(dfs, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"], utc=True)
+    for c in ["file_id", "quantile", "pop"]:
+        df[c] = df[c].astype("category")
+    return df
+
+
+def read_vct_parquet(vct_path, quantile=None, file_ids=None, columns=None):
+    """
+    Read a VCT Parquet dataset created by write_vct_parquet().
+
+    Quantile partitions and row groups are selected by file_id column
+    statistics before any particle data is read.
+
+    Parameters
+    -----------
+    vct_path: str
+        VCT Parquet dataset directory.
+    quantile: float, optional
+        Only return particles for this quantile, e.g. 50.
+    file_ids: list of str, optional
+        Only return particles from these files.
+    columns: list of str, optional
+        Columns to return. Default is all columns.
+
+    Raises
+    ------
+    errors.FileError if the dataset can't be read.
+
+    Returns
+    -------
+    pandas.DataFrame
+        SeaFlow VCT DataFrame ordered by quantile then time.
+    """
+    filters = []
+    if quantile is not None:
+        filters.append(("quantile", "==", util.quantile_str(quantile)))
+    if file_ids is not None:
+        filters.append(("file_id", "in", list(file_ids)))
+    try:
+        pf = fastparquet.ParquetFile(vct_path)
+        if columns is None:
+            outcols = ["date", "file_id", "quantile"] + VCT_COLUMNS
+        else:
+            outcols = list(columns)
+        readcols = outcols + [f[0] for f in filters if f[0] not in outcols]
+        df = pf.to_pandas(columns=readcols, filters=filters)
+    except (IOError, OSError, ValueError) as e:
+        raise errors.FileError("VCT Parquet dataset {} could not be read: {}".format(vct_path, str(e)))
+    # Row group selection may leave rows outside selections
+    keep = np.full(len(df.index), True)
+    if file_ids is not None:
+        keep &= df["file_id"].isin(file_ids).values
+    df = df.loc[keep, outcols].reset_index(drop=True)
+    for c in ["file_id", "quantile", "pop"]:
+        if c in df.columns:
+            df[c] = df[c].astype("category").cat.remove_unused_categories()
+    return df
 
 
 def read_filter_params_csv(path):
@@ -314,38 +1622,52 @@ def read_filter_params_csv(path):
     return df
 
 
-def write_labview(df, path):
+def write_labview(df, path, block_rows=BLOCK_ROWS):
     """
     Write SeaFlow event DataFrame as LabView binary file.
 
+    Data is converted to numpy.uint16 and written block_rows rows at a time,
+    so memory use beyond df is bounded by the block size.
+
     Parameters
     -----------
     df: pandas.DataFrame
         SeaFlow event DataFrame.
     path: str
-        Output file path. If this ends with '.gz' data will be gzip compressed.
+        Output file path. If this ends with '.gz', '.zst', or '.lz4' data will
+        be compressed.
+    block_rows: int, default BLOCK_ROWS
+        Number of rows to convert and write at a time.
     """
+    if block_rows < 1:
+        raise ValueError("block_rows must be >= 1")
     # Make sure directory necessary directory tree exists
     util.mkdir_p(os.path.dirname(path))
 
-    # Open output file
-    with file_open_w(path) as fh:
+    rowcnt = len(df.index)
+    colcnt = len(df.columns) + 2
+    # Open output file. 4 byte header + 2 bytes per value including the two
+    # leading columns.
+    size = 4 + rowcnt * colcnt * 2
+    with file_open_w(path, size=size) as fh:
         # Write 32-bit uint particle count header
-        header = np.array([len(df.index)], np.uint32)
+        header = np.array([rowcnt], np.uint32)
         fh.write(header.tobytes())
-        if len(df.index) > 0:
-            # Convert to uint16 before saving
-            df = df.astype(np.uint16)
-
-            # Add leading 4 bytes to match LabViews binary format
-            zeros = np.zeros([len(df.index), 1], dtype=np.uint16)
-            tens = np.copy(zeros)
-            tens.fill(10)
-            df.insert(0, "tens", tens)
-            df.insert(1, "zeros", zeros)
-
-            # Write particle data
-            fh.write(df.values.tobytes())
+        if rowcnt > 0:
+            # Interleave columns as uint16 into one reused buffer of at most
+            # block_rows rows, rather than converting and copying the whole
+            # DataFrame. Leading 4 bytes of each row match LabViews binary
+            # format.
+            values = [df[c].values for c in df.columns]
+            buf = np.empty((min(rowcnt, block_rows), colcnt), dtype=np.uint16)
+            buf[:, 0] = 10
+            buf[:, 1] = 0
+            for start in range(0, rowcnt, block_rows):
+                block = buf[:min(block_rows, rowcnt - start)]
+                for j, v in enumerate(values):
+                    # Same unsafe cast as astype(np.uint16)
+                    block[:, j + 2] = v[start:start + len(block)]
+                fh.write(memoryview(block).cast("B"))
 
 
 def write_evt_labview(df, path, outdir, gz=True):
@@ -381,13 +1703,14 @@ def write_opp_labview(df, path, outdir, gz=True, require_all=True):
     """
     Write an OPP SeaFlow event DataFrame as LabView binary file.
 
-    Quantile flags will be encoded as a final bit flag column. The noise column
+    Quantile flags will be written as a final bit flag column. Other columns
     will be dropped.
 
     Parameters
     -----------
     df: pandas.DataFrame
-        SeaFlow focused particle DataFrame.
+        SeaFlow focused particle DataFrame with a "bitflags" column from
+        particleops.mark_focused(), or with boolean quantile columns.
     path: str
         File name. This will be converted into a standard SeaFlow file ID and
         will be used to construct the final output file path within outdir. The
@@ -406,15 +1729,11 @@ def write_opp_labview(df, path, outdir, gz=True, require_all=True):
         return
 
     # Return early if any quantiles got completely filtered out
-    write_flag = True
-    if require_all:
-        for q_col, _q, _q_str, q_df in particleops.quantiles_in_df(df):
-            write_flag = write_flag & q_df[q_col].any()
-
-    if write_flag:
-        # Attach a bit flag column to encode all the per-quantile focused
-        # particle flags.
-        df = particleops.encode_bit_flags(df.copy())
+    if not require_all or particleops.all_quantiles(df):
+        if "bitflags" not in df.columns:
+            # Attach a bit flag column to encode all the per-quantile focused
+            # particle flags.
+            df = particleops.encode_bit_flags(df.copy())
 
         sfile = SeaFlowFile(path)
         outpath = os.path.join(outdir, sfile.file_id + ".opp")
@@ -424,12 +1743,251 @@ def write_opp_labview(df, path, outdir, gz=True, require_all=True):
         write_labview(df[particleops.COLUMNS + ["bitflags"]], outpath)
 
 
-def write_opp_parquet(opp_dfs, date, window_size, outdir):
+def _write_fastparquet(filename, data, **kwargs):
+    """fastparquet.write() with statistics for all columns in any version."""
+    if _FASTPARQUET_STATS:
+        kwargs["stats"] = True
+    fastparquet.write(filename, data, **kwargs)
+
+
+def write_evt_archive(paths, outdir, dates=None):
     """
-    Write an OPP Parquet file.
+    Convert raw labview binary SeaFlow data files to an EVT archive.
+
+    An EVT archive is a directory with one Parquet file (EVT_ARCHIVE_FILE) in
+    each day of year subdirectory, e.g. outdir/2014_185/evt.parquet. Each
+    input file with particle data is stored as one row group of uint16
+    particle columns, a dictionary encoded "file_id" column, and a "date"
+    column with the file's timestamp. Row group statistics are written for all
+    columns. Converted files can be read by their archive path,
+    outdir/<file_id>, with read_evt_labview() and read_evt_many(), and are
+    listed by find_evt_archive_files(). Existing day of year files in outdir
+    for the same days are replaced.
 
+    Parameters
+    -----------
+    paths: list of str
+        EVT file paths.
+    outdir: str
+        EVT archive directory.
+    dates: dict of {file_id: datetime.datetime}, optional
+        File dates, e.g. from SFL data. Files not in dates use the timestamp
+        in their file name if present.
+
+    Returns
+    -------
+    list of dicts
+        [{
+            "path": input EVT file path,
+            "file_id": file ID,
+            "events": events stored in the archive,
+            "error": error message if the file could not be converted
+        }, ...]
+    """
+    if dates is None:
+        dates = {}
+    results = []
+    # Group files by day of year, keeping the first file for each file ID
+    days = {}
+    seen = set()
+    for path in sorted_files(paths):
+        sfile = SeaFlowFile(path)
+        result = {"path": path, "file_id": sfile.file_id, "events": 0, "error": ""}
+        results.append(result)
+        if sfile.file_id in seen:
+            result["error"] = "Duplicate file ID"
+        elif "/" not in sfile.file_id:
+            result["error"] = "No day of year directory for file"
+        else:
+            seen.add(sfile.file_id)
+            day = sfile.file_id.split("/")[0]
+            days.setdefault(day, []).append((result, dates.get(sfile.file_id, sfile.date)))
+
+    for day, day_files in days.items():
+        read = read_evt_many([r["path"] for r, _ in day_files], mmap=True, dtype=np.uint16)
+        counts = np.diff(read["offsets"])
+        file_ids, file_dates = [], []
+        for (result, date), count, err in zip(day_files, counts, read["errors"]):
+            if err:
+                result["error"] = err
+            elif count == 0:
+                result["error"] = "File has no particle data"
+            else:
+                result["events"] = int(count)
+                file_ids.append(result["file_id"])
+                file_dates.append(date)
+        if not file_ids:
+            continue
+        kept = counts[counts > 0]
+        df = read["df"]
+        df.insert(0, "file_id", pd.Categorical.from_codes(np.repeat(np.arange(len(file_ids)), kept), file_ids))
+        df.insert(0, "date", pd.to_datetime(pd.Series(file_dates), utc=True).repeat(kept).reset_index(drop=True))
+        daypath = os.path.join(outdir, day, EVT_ARCHIVE_FILE)
+        util.mkdir_p(os.path.dirname(daypath))
+        # Write then rename so readers never see a partial file
+        tmppath = daypath + ".tmp"
+        _write_fastparquet(
+            tmppath, df, row_group_offsets=list(np.cumsum(kept) - kept),
+            compression="snappy"
+        )
+        os.replace(tmppath, daypath)
+    return results
+
+
+class OppParquetWriter:
+    """
+    Incrementally write an OPP Parquet file for one time window.
+
+    OPP DataFrames, normally one per EVT file, are passed to write() as they
+    become available and written as row groups of whole files, so a window is
+    never held in memory at once. All file IDs which may be written must be
+    known in advance, as they form the categories of the file_id column. A
+    row group is written as soon as at least row_group_rows particles are
+    buffered, or for every DataFrame if row_group_rows is None. file_id is
+    dictionary encoded and column statistics are written, so readers such as
+    read_opp_parquet() can skip row groups by date, file_id, or quantile flag.
     Use snappy compression.
 
+    Data is written to a temporary file which is renamed to path by close().
+    Use as a context manager to close automatically. If an exception is raised
+    in the context the temporary file is removed and nothing is written to
+    path.
+    """
+    def __init__(self, date, window_size, outdir, file_ids, row_group_rows=None, engine="fastparquet"):
+        """
+        Parameters
+        -----------
+        date: pandas.Timestamp or datetime.datetime object
+            Start timestamp for data in the file.
+        window_size: pandas offset alias for time window covered by this file.
+            Time covered by this file is date + time_window.
+        outdir: str
+            Output directory.
+        file_ids: list of str
+            File IDs which may be written.
+        row_group_rows: int, optional
+            Minimum number of particles per row group. Default is one row
+            group per DataFrame passed to write().
+        engine: str, default "fastparquet"
+            Parquet library, one of OPP_PARQUET_ENGINES.
+        """
+        if engine not in OPP_PARQUET_ENGINES:
+            raise ValueError("engine must be one of {}".format(", ".join(OPP_PARQUET_ENGINES)))
+        if engine == "pyarrow" and pyarrow is None:
+            raise ValueError("pyarrow is not installed")
+        if row_group_rows is not None and row_group_rows < 1:
+            raise ValueError("row_group_rows must be >= 1")
+        self.path = os.path.join(outdir, date.isoformat().replace(":", "-")) + f".{window_size}.opp.parquet"
+        self.file_ids = sorted(set(file_ids))
+        self.row_group_rows = row_group_rows
+        self.engine = engine
+        self.rows = 0  # particles written so far
+        self.row_groups = 0  # row groups written so far
+        self._tmppath = self.path + ".tmp"
+        self._buffer = []
+        self._buffer_rows = 0
+        self._pqwriter = None  # pyarrow.parquet.ParquetWriter
+        self._schema = None  # pyarrow.Schema of the first row group
+        util.mkdir_p(outdir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, opp_df):
+        """
+        Add particles from one OPP DataFrame.
+
+        Parameters
+        -----------
+        opp_df: pandas.DataFrame
+            SeaFlow focused particle DataFrame with file_id and date columns,
+            and a "bitflags" column from particleops.mark_focused() or boolean
+            quantile columns.
+        """
+        if len(opp_df.index) == 0:
+            return
+        if "bitflags" in opp_df.columns:
+            q_cols = {q_col: mask for q_col, _q, _q_str, mask in particleops.quantile_masks(opp_df)}
+            opp_df = opp_df[[c for c in OPP_PARQUET_COLUMNS if c not in particleops.flags]].assign(**q_cols)
+        # Quantiles which weren't marked have no column
+        df = opp_df[[c for c in OPP_PARQUET_COLUMNS if c in opp_df.columns]]
+        # Every row group must have the same file_id categories for the file
+        # to be read back correctly.
+        file_id = pd.Categorical(df["file_id"], categories=self.file_ids)
+        if file_id.isna().any():
+            raise ValueError("file_id not in writer file_ids")
+        df = df.assign(file_id=file_id)
+        self._buffer.append(df)
+        self._buffer_rows += len(df.index)
+        if self.row_group_rows is None or self._buffer_rows >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if len(self._buffer) == 1:
+            df = self._buffer[0]
+        else:
+            df = pd.concat(self._buffer, ignore_index=True)
+        if self.engine == "pyarrow":
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if self._pqwriter is None:
+                self._schema = table.schema
+                self._pqwriter = pyarrow.parquet.ParquetWriter(
+                    self._tmppath, self._schema, compression="snappy",
+                    use_dictionary=["file_id"], write_statistics=True
+                )
+            self._pqwriter.write_table(table.cast(self._schema), row_group_size=len(df.index))
+        else:
+            _write_fastparquet(
+                self._tmppath, df, row_group_offsets=[0], write_index=False,
+                compression="snappy", append=self.row_groups > 0
+            )
+        self.rows += len(df.index)
+        self.row_groups += 1
+        self._buffer = []
+        self._buffer_rows = 0
+
+    def close(self):
+        """
+        Write buffered particles and move the finished file to path.
+
+        Nothing is written if no particles were written.
+        """
+        self._flush()
+        if self._pqwriter is not None:
+            self._pqwriter.close()
+            self._pqwriter = None
+        if self.row_groups > 0:
+            os.replace(self._tmppath, self.path)
+
+    def abort(self):
+        """Discard buffered particles and remove the temporary file."""
+        self._buffer = []
+        self._buffer_rows = 0
+        if self._pqwriter is not None:
+            self._pqwriter.close()
+            self._pqwriter = None
+        if os.path.exists(self._tmppath):
+            os.remove(self._tmppath)
+
+
+def write_opp_parquet(opp_dfs, date, window_size, outdir, row_group_rows=None, engine="fastparquet"):
+    """
+    Write an OPP Parquet file.
+
+    Use snappy compression. Each DataFrame in opp_dfs is written as one row
+    group with column statistics, unless row_group_rows is given, so readers
+    such as read_opp_parquet() can skip row groups by date, file_id, or
+    quantile flag. See OppParquetWriter to write DataFrames as they become
+    available.
+
     Parameters
     -----------
     opp_dfs: pandas.DataFrame
@@ -441,28 +1999,77 @@ def write_opp_parquet(opp_dfs, date, window_size, outdir):
         covered by this file is date + time_window.
     outdir: str
         Output directory.
+    row_group_rows: int, optional
+        Minimum number of particles per row group.
+    engine: str, default "fastparquet"
+        Parquet library, one of OPP_PARQUET_ENGINES.
     """
     if not opp_dfs:
         return
+    file_ids = set()
+    for df in opp_dfs:
+        file_ids.update(df["file_id"].unique())
+    with OppParquetWriter(date, window_size, outdir, file_ids, row_group_rows=row_group_rows, engine=engine) as writer:
+        for df in opp_dfs:
+            writer.write(df)
 
-    # Make sure directory necessary directory tree exists
-    util.mkdir_p(outdir)
-    outpath = os.path.join(outdir, date.isoformat().replace(":", "-")) + f".{window_size}.opp.parquet"
-    df = pd.concat(opp_dfs, ignore_index=True)
-    # Make sure file_id is a categorical column
-    if df["file_id"].dtype.name != "category":
-        df["file_id"] = df["file_id"].astype("category")
-    # Only keep columns we intend to write to file, reorder
-    columns = [
-        "date",
-        "file_id",
-        "D1",
-        "D2",
-        "fsc_small",
-        "pe",
-        "chl_small",
-        "q2.5",
-        "q50",
-        "q97.5",
-    ]
-    df[columns].to_parquet(outpath, compression="snappy", index=False, engine="fastparquet")
+
+def write_vct_parquet(vct_dir, outdir, quantiles=None, jobs=1):
+    """
+    Convert a VCT directory to a VCT Parquet dataset.
+
+    The dataset is a directory partitioned by quantile, e.g.
+    outdir/quantile=50/part.0.parquet, with a _metadata file describing all
+    partitions. Each day of year of VCT files is written as one row group with
+    column statistics, so readers such as read_vct_parquet() can skip row
+    groups by date or file_id. The dataset is written to a temporary directory
+    and then renamed to outdir.
+
+    Parameters
+    -----------
+    vct_dir: str
+        VCT directory, as described in find_vct_files().
+    outdir: str
+        Output dataset directory. Must not exist.
+    quantiles: list of float, optional
+        Only convert files for these quantiles. Default is all quantiles.
+    jobs: int, default 1
+        Number of files to read concurrently.
+
+    Raises
+    ------
+    errors.FileError if outdir exists or a VCT file can't be read.
+    ValueError if a quantile isn't present in vct_dir.
+
+    Returns
+    -------
+    int
+        Number of particles written.
+    """
+    if os.path.exists(outdir):
+        raise errors.FileError("Output directory {} already exists".format(outdir))
+    tmpdir = outdir.rstrip(os.sep) + ".tmp"
+    # Remove data left by a failed run, which would otherwise be appended to
+    if os.path.exists(tmpdir):
+        shutil.rmtree(tmpdir)
+    written = 0
+    try:
+        for q in find_vct_files(vct_dir, quantiles):
+            # One quantile at a time to limit memory use
+            df = read_vct_dir(vct_dir, quantiles=[float(q)], jobs=jobs)
+            if len(df.index) == 0:
+                continue
+            day_sizes = df.groupby(df["file_id"].str.split("/").str[0], sort=False).size()
+            _write_fastparquet(
+                tmpdir, df, partition_on=["quantile"], file_scheme="hive",
+                row_group_offsets=list(np.cumsum(day_sizes.values) - day_sizes.values),
+                compression="snappy", append=written > 0
+            )
+            written += len(df.index)
+    except BaseException:
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        raise
+    if written:
+        os.replace(tmpdir, outdir)
+    return written
@@ -6,6 +6,7 @@ import time
 import multiprocessing as mp
 import queue
 
+import numpy as np
 from . import clouds
 from .conf import get_aws_config
 from . import db
@@ -19,11 +20,14 @@ from . import util
 stop = 'STOP'
 # Quantile list
 quantiles = [2.5, 50, 97.5]
+# Maximum time windows waiting to be written to OPP files per writer process
+WRITE_BACKLOG = 2
 
 
 @util.quiet_keyboardinterrupt
 def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
-                     every=10.0, window_size="1H"):
+                     every=10.0, window_size="1H", prefetch=2,
+                     parquet_engine="fastparquet", row_group_rows=None, writer_count=1):
     """Filter a list of EVT files.
 
     Positional arguments:
@@ -38,6 +42,16 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
         every - Percent progress output resolution
         window_size - Time window for grouping filtering EVT file sets,
             expressed as pandas time offsets.
+        prefetch - Number of EVT files each worker reads into memory ahead in
+            a background thread while filtering the current file, continuing
+            into the worker's next time window. 0 to disable, which
+            memory-maps uncompressed files instead.
+        parquet_engine - Library used to write OPP Parquet files, one of
+            fileio.OPP_PARQUET_ENGINES.
+        row_group_rows - Minimum particles per OPP Parquet row group. Default
+            is one row group per EVT file.
+        writer_count - number of writer processes used to save OPP Parquet
+            files. These run concurrently with saving to the database.
     """
     work = {
         "files_df": None,  # fill in later
@@ -48,6 +62,10 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
         "filter_params": None,  # fill in later from db,
         "window_size": window_size,
         "window_start_date": None,
+        "prefetch": prefetch,
+        "parquet_engine": parquet_engine,
+        "row_group_rows": row_group_rows,
+        "input_wait": 0.0,  # seconds spent waiting for EVT data to be read
         "errors": [],  # global errors outside of processing single files
         "results": []
     }
@@ -56,8 +74,18 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
         raise ValueError("Must provide db path to filter_evt_files()")
     if worker_count < 1:
         raise ValueError("worker_count must be > 0")
+    if writer_count < 1:
+        raise ValueError("writer_count must be > 0")
     if every <= 0 or every > 100:
         raise ValueError("resolution must be > 0 and <= 100")
+    if prefetch < 0:
+        raise ValueError("prefetch must be >= 0")
+    if parquet_engine not in fileio.OPP_PARQUET_ENGINES:
+        raise ValueError("parquet_engine must be one of {}".format(", ".join(fileio.OPP_PARQUET_ENGINES)))
+    if parquet_engine == "pyarrow" and fileio.pyarrow is None:
+        raise ValueError("pyarrow is not installed")
+    if row_group_rows is not None and row_group_rows < 1:
+        raise ValueError("row_group_rows must be >= 1")
 
     # Group by window_size
     grouped = files_df.set_index("date").resample(window_size)
@@ -75,6 +103,9 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
     # Create output queues
     stats_q = mp.Queue()  # result stats
     opps_q = mp.Queue()   # OPP data
+    # OPP data to write to Parquet files. Bounded to limit memory use when
+    # writers fall behind.
+    write_q = mp.Queue(WRITE_BACKLOG * writer_count)
     done_q = mp.Queue()   # signal we're done to main thread
 
     # Create worker processes
@@ -87,14 +118,22 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
     # Create db output process
     saver = mp.Process(
         target=do_save,
-        args=(opps_q, stats_q, len(files_df))
+        args=(opps_q, write_q, stats_q, len(files_df), writer_count)
     )
     saver.start()
 
+    # Create OPP file output processes
+    writers = []
+    for _ in range(writer_count):
+        p = mp.Process(target=do_write, args=(write_q, stats_q))
+        p.start()
+        writers.append(p)
+
     # Create reporting process
+    queues = {"work": work_q, "opp": opps_q, "write": write_q}
     reporter = mp.Process(
         target=do_reporting,
-        args=(stats_q, done_q, len(files_df), every)
+        args=(stats_q, done_q, len(files_df), every, queues)
     )
     reporter.start()
 
@@ -109,9 +148,10 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
     for _ in range(worker_count):
         work_q.put(stop)
 
+    done = None
     try:
         # Wait for reporter to tell us we're done
-        done = done_q.get()
+        done = wait_done(done_q, workers + [saver] + writers + [reporter])
         if done is not None:
             # Something went wrong, shut child processes down
             print(done, file=sys.stderr)
@@ -121,66 +161,160 @@ def filter_evt_files(files_df, dbpath, opp_dir, s3=False, worker_count=1,
             w.join()
         saver.terminate()
         saver.join()
+        for w in writers:
+            w.terminate()
+            w.join()
+        if done is not None:
+            # Reporter may be waiting for results which will never arrive
+            reporter.terminate()
         reporter.join()
 
 
+def wait_done(done_q, procs, interval=1):
+    """
+    Wait for the done message from the reporting process.
+
+    Child processes in procs are checked every interval seconds. If one has
+    exited with an error the reporter will never finish, so an error message
+    is returned instead.
+
+    Returns
+    -------
+    None if filtering finished successfully, otherwise an error message.
+    """
+    while True:
+        try:
+            return done_q.get(True, interval)
+        except queue.Empty:
+            pass
+        failed = [p for p in procs if p.exitcode not in (None, 0)]
+        if failed:
+            try:
+                # Reporter may have sent a more specific message before exiting
+                return done_q.get_nowait()
+            except queue.Empty:
+                pass
+            return "A fatal error occurred, {} exited with code {}".format(failed[0].name, failed[0].exitcode)
+
+
+def read_evt_row(work, row):
+    """
+    Read EVT data for one row of a filtering work files_df.
+
+    Returns
+    -------
+    tuple of (particleops.ParticleBatch, str)
+        EVT data as numpy.uint16 values, or an empty batch if the file could
+        not be read, and an error message or empty string.
+    """
+    try:
+        fileobj = None
+        if work["s3"]:
+            cloud = clouds.AWS(work["cloud_config_items"])
+            fileobj = cloud.download_file_memory(row["path"])
+        # Filter raw uint16 data to avoid a float conversion pass over
+        # all events. Only focused particles are converted in do_filter.
+        # When prefetching, read files into memory so disk I/O happens in the
+        # prefetch thread. A memory map would only be paged in later, while
+        # the file is filtered.
+        evt = fileio.read_evt_labview(
+            path=row["path"], fileobj=fileobj, mmap=work["prefetch"] == 0,
+            dtype=np.uint16, batch=True
+        )
+    except errors.FileError as e:
+        return (particleops.ParticleBatch.empty(), f"Could not parse file {row['path']}: {e}")
+    except Exception as e:
+        return (particleops.ParticleBatch.empty(), f"Unexpected error when parsing file {row['path']}: {e}")
+    return (evt, "")
+
+
 @util.quiet_keyboardinterrupt
+def _work_files(work, work_q):
+    """
+    Yield (work, last, date_row) for each EVT file of each work item on work_q.
+
+    work is the first work item, already taken from work_q. last is True for
+    the final file of a work item. Work items with no files yield one
+    (work, True, None). Stops at the stop sentinel.
+    """
+    while work != stop:
+        n = len(work["files_df"])
+        for i, date_row in enumerate(work["files_df"].iterrows()):
+            yield (work, i == n - 1, date_row)
+        if n == 0:
+            yield (work, True, None)
+        work = work_q.get()
+
+
 def do_filter(work_q, opps_q):
     """Filter one EVT file, save to sqlite3, return filter stats"""
     work = work_q.get()
-    while work != stop:
-        #print("{} {} starting {} at {}".format(work["window_start_date"], os.getpid(), len(work["files_df"]), datetime.datetime.now().isoformat()), file=sys.stderr)
-        for date, row in work["files_df"].iterrows():
-            result = {
-                "error": "",
-                "all_count": 0,
-                "evt_count": 0,
-                "saturated_count": 0,
-                "opp": None,
-                "file_id": row["file_id"],
-                "path": row["path"]
-            }
-
-            try:
-                fileobj = None
-                if work["s3"]:
-                    cloud = clouds.AWS(work["cloud_config_items"])
-                    fileobj = cloud.download_file_memory(row["path"])
-                evt_df = fileio.read_evt_labview(path=row["path"], fileobj=fileobj)
-            except errors.FileError as e:
-                result["error"] = f"Could not parse file {row['path']}: {e}"
-                evt_df = particleops.empty_df()
-            except Exception as e:
-                result["error"] = f"Unexpected error when parsing file {row['path']}: {e}"
-                evt_df = particleops.empty_df()
+    if work == stop:
+        return
+
+    # Read the next work["prefetch"] files in a background thread while the
+    # current file is filtered. Files are read ahead across time windows, so
+    # the first files of the next window are read while the last files of the
+    # current window are filtered.
+    def read(item):
+        work, _last, date_row = item
+        if date_row is None:
+            return (item, (None, ""))
+        return (item, read_evt_row(work, date_row[1]))
+
+    reads = util.prefetch(read, _work_files(work, work_q), work["prefetch"])
+    t_wait = time.time()
+    for (work, last, date_row), (evt, read_error) in reads:
+        work["input_wait"] += time.time() - t_wait
+        if date_row is not None:
+            work["results"].append(_filter_evt(work, date_row, evt, read_error))
+        if last:
+            opps_q.put(work)
+        t_wait = time.time()
+
+
+def _filter_evt(work, date_row, evt, read_error):
+    """Filter one EVT file's particle data and return a result dict."""
+    date, row = date_row
+    result = {
+        "error": read_error,
+        "all_count": 0,
+        "evt_count": 0,
+        "noise_count": 0,
+        "saturated_count": 0,
+        "opp_count": 0,
+        "opp": None,
+        "file_id": row["file_id"],
+        "path": row["path"]
+    }
 
-            try:
-                evt_df = particleops.mark_focused(evt_df, work["filter_params"], inplace=True)
-                opp_df = particleops.select_focused(evt_df)
-                result["opp"] = opp_df
-                result["opp"]["date"] = date
-                result["opp"]["file_id"] = row["file_id"]
-                result["all_count"] = len(evt_df.index)
-                result["noise_count"] = len(evt_df[evt_df["noise"]].index)
-                result["saturated_count"] = len(evt_df[evt_df["saturated"]].index)
-                result["opp_count"] = len(opp_df[opp_df["q50"]])
-            except Exception as e:
-                result["error"] = f"Unexpected error when selecting focused partiles in file {row['path']}: {e}"
-
-            work["results"].append(result)
-
-        #print("{} {} sending {}/{} results at {}".format(work["window_start_date"], os.getpid(), len(work["results"]), len(work["files_df"]), datetime.datetime.now().isoformat()), file=sys.stderr)
-        opps_q.put(work)
-        #print("{} {} sent {}/{} results at {}".format(work["window_start_date"], os.getpid(), len(work["results"]), len(work["files_df"]), datetime.datetime.now().isoformat()), file=sys.stderr)
-        work = work_q.get()
-        # if work != stop:
-        #     print("{} {} got more work {} at {}".format(work["window_start_date"], os.getpid(), len(work["files_df"]), datetime.datetime.now().isoformat()), file=sys.stderr)
-        # else:
-        #     print("{} got stop {}".format(os.getpid(), datetime.datetime.now().isoformat()), file=sys.stderr)
+    try:
+        # Filter as a ParticleBatch. Focused particles stay a batch
+        # to be sent to the saver and writers, and only become a
+        # DataFrame when written to an OPP file.
+        evt = particleops.mark_focused(evt, work["filter_params"], inplace=True)
+        opp = particleops.select_focused(evt).astype(np.float64, columns=particleops.COLUMNS)
+        opp.date = date
+        opp.file_id = row["file_id"]
+        result["opp"] = opp
+        bitflags = evt["bitflags"]
+        result["all_count"] = len(evt)
+        result["noise_count"] = np.count_nonzero(bitflags & particleops.NOISE_FLAG)
+        result["saturated_count"] = np.count_nonzero(bitflags & particleops.SATURATED_FLAG)
+        result["opp_count"] = np.count_nonzero(opp["bitflags"] & particleops.flags["q50"])
+    except Exception as e:
+        result["error"] = f"Unexpected error when selecting focused partiles in file {row['path']}: {e}"
+    return result
 
 
 @util.quiet_keyboardinterrupt
-def do_save(opps_q, stats_q, files_left):
+def do_save(opps_q, write_q, stats_q, files_left, writer_count):
+    """
+    Save filtering results to the database.
+
+    Results are then sent to OPP file writers on write_q and, without particle
+    data, to the reporting process on stats_q.
+    """
     while files_left > 0:
         try:
             work = opps_q.get(True, 600)  # We should get one hour of data every ten minutes at least
@@ -200,55 +334,113 @@ def do_save(opps_q, stats_q, files_left):
                 filter_id = work["filter_params"]["id"].unique().tolist()[0]
                 opp_vals, outlier_vals = [], []
                 for r in work["results"]:
-                    opp_vals.extend(
-                        db.prep_opp(
-                            r["file_id"],
-                            r["opp"],
-                            r["all_count"],
-                            r["all_count"] - r["noise_count"],
-                            filter_id
+                    if r["opp"] is not None:
+                        opp_vals.extend(
+                            db.prep_opp(
+                                r["file_id"],
+                                r["opp"],
+                                r["all_count"],
+                                r["all_count"] - r["noise_count"],
+                                filter_id
+                            )
                         )
-                    )
                     outlier_vals.extend(db.prep_outlier(r["file_id"], 0))
                 db.save_opp_to_db(opp_vals, work["dbpath"])
                 db.save_outlier(outlier_vals, work["dbpath"])
                 #print("{} {} db saved at {}".format(work["window_start_date"], os.getpid(), datetime.datetime.now().isoformat()), file=sys.stderr)
         except Exception as e:
-            work["errors"].append("Unexpected error when saving file {} to db: {}".format(work["file"], e))
+            work["errors"].append("Unexpected error when saving window {} to db: {}".format(work["window_start_date"], e))
+
+        # Particle data isn't needed for reporting, don't send it on
+        stats = dict(work)
+        stats["stage"] = "saved"
+        stats["results"] = [dict(r, opp=None) for r in work["results"]]
+        #print("{} {} sent stats at {}".format(work["window_start_date"], os.getpid(), datetime.datetime.now().isoformat()), file=sys.stderr)
+        stats_q.put(stats)
+        # Writers only need OPP data and output settings. Blocks if writers
+        # are WRITE_BACKLOG windows behind.
+        write_q.put({
+            "window_start_date": work["window_start_date"],
+            "window_size": work["window_size"],
+            "opp_dir": work["opp_dir"],
+            "row_group_rows": work["row_group_rows"],
+            "parquet_engine": work["parquet_engine"],
+            "opps": [(r["file_id"], r["opp"]) for r in work["results"] if r["opp"] is not None]
+        })
+
+    for _ in range(writer_count):
+        write_q.put(stop)
+
 
+@util.quiet_keyboardinterrupt
+def do_write(write_q, stats_q):
+    """Write OPP Parquet files, then report completion on stats_q."""
+    work = write_q.get()
+    while work != stop:
+        written = {
+            "stage": "written",
+            "window_start_date": work["window_start_date"],
+            "errors": []
+        }
         # Save OPP file
-        # Only include OPP files with data in all quantiles
-        good_opps = []
-        for r in work["results"]:
-            if particleops.all_quantiles(r["opp"]):
-                good_opps.append(r["opp"])
-        if (len(good_opps)):
-            try:
+        try:
+            # Only include OPP files with data in all quantiles
+            good = [(file_id, opp) for file_id, opp in work["opps"] if particleops.all_quantiles(opp)]
+            if (len(good)):
                 if work["opp_dir"]:
-                    fileio.write_opp_parquet(
-                        good_opps,
+                    # Write each file's particles as they're reached rather
+                    # than concatenating the whole window first
+                    with fileio.OppParquetWriter(
                         work["window_start_date"],
                         work["window_size"],
-                        work["opp_dir"]
-                    )
-            except Exception as e:
-                work["errors"].append(f"Unexpected error when saving OPP for {work['window_start_date']}: {e}")
-                pass
-        else:
-            work["errors"].append(f"No OPPs had data in all quantiles for {work['window_start_date']}")
+                        work["opp_dir"],
+                        [file_id for file_id, _ in good],
+                        row_group_rows=work["row_group_rows"],
+                        engine=work["parquet_engine"]
+                    ) as writer:
+                        for _, opp in good:
+                            writer.write(opp.to_pandas(metadata=True))
+            else:
+                written["errors"].append(f"No OPPs had data in all quantiles for {work['window_start_date']}")
+        except Exception as e:
+            written["errors"].append(f"Unexpected error when saving OPP for {work['window_start_date']}: {e}")
 
-        #print("{} {} sent stats at {}".format(work["window_start_date"], os.getpid(), datetime.datetime.now().isoformat()), file=sys.stderr)
-        stats_q.put(work)
+        stats_q.put(written)
+        work = write_q.get()
+
+
+def queue_depths(queues):
+    """
+    Return the approximate number of items in each queue.
+
+    Returns
+    -------
+    dict of {name: int}, or None if queue sizes aren't available on this
+    platform.
+    """
+    try:
+        return {name: q.qsize() for name, q in queues.items()}
+    except NotImplementedError:
+        return None
 
 
 @util.quiet_keyboardinterrupt
-def do_reporting(stats_q, done_q, file_count, every):
+def do_reporting(stats_q, done_q, file_count, every, queues=None):
+    """
+    Print filtering progress.
+
+    Progress is reported for results saved to the database. Finishes once
+    every time window has also been written to OPP files. If queues, a dict of
+    {name: multiprocessing.Queue}, is provided their depths are reported with
+    progress, as well as maximum depths at the end.
+    """
     event_count = 0
     noise_count = 0
     signal_count = 0
     saturated_count = 0
     opp_count = 0
     files_ok = 0
+    input_wait = 0.0  # total seconds workers spent waiting for EVT data
 
     print("")
     print(f"Filtering {file_count} EVT files. Progress for 50th quantile every ~ {every}%")
@@ -263,9 +455,12 @@ def do_reporting(stats_q, done_q, file_count, every):
     opp_count_block = 0  # OPP particles in this block
     files_seen = 0
     files_left = file_count
+    windows_saved = 0
+    windows_written = 0
+    max_depths = {}
 
     # Filter particles in parallel with process pool
-    while files_left > 0:
+    while files_left > 0 or windows_written < windows_saved:
         work = stats_q.get()  # get next result group
 
         if work in ("EMPTY QUEUE", "QUEUE ERROR"):
@@ -275,7 +470,20 @@ def do_reporting(stats_q, done_q, file_count, every):
 
         #print("{} {} received stats at {}".format(work["window_start_date"], os.getpid(), time.time()), file=sys.stderr)
 
+        depths = queue_depths(queues) if queues else None
+        if depths:
+            for name, depth in depths.items():
+                max_depths[name] = max(depth, max_depths.get(name, 0))
+
+        if work["stage"] == "written":
+            windows_written += 1
+            for e in work["errors"]:
+                print(e, file=sys.stderr)
+            continue
+
+        windows_saved += 1
         files_left -= len(work["files_df"])
+        input_wait += work["input_wait"]
 
         if work["errors"]:
             for e in work["errors"]:
@@ -317,6 +525,8 @@ def do_reporting(stats_q, done_q, file_count, every):
                         opp_count_block, ratio_evtopp_block,
                         time.time() - t0
                     )
+                if depths:
+                    msg += " queued: " + " ".join(f"{name}: {depth}" for name, depth in depths.items())
                 print(msg)
                 sys.stdout.flush()
                 last = milestone
@@ -347,4 +557,7 @@ def do_reporting(stats_q, done_q, file_count, every):
         )
     print(summary_text)
     print(f"{files_ok} / {file_count} EVT files parsed successfully")
+    print(f"Time filter workers spent waiting for EVT input: {input_wait:.2f}s")
+    if max_depths:
+        print("Maximum queue depths: " + " ".join(f"{name}: {depth}" for name, depth in max_depths.items()))
     done_q.put(None)
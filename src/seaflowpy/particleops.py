@@ -1,8 +1,17 @@
-import math
+import functools
 import numpy as np
 import pandas as pd
 from . import util
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 # Data columns in raw SeaFlow particle DataFrame
 COLUMNS = [
@@ -11,14 +20,214 @@ COLUMNS = [
 ]
 CHANNEL_COLUMNS = COLUMNS[2:]  # flow cytometer channel data columns
 
-# Focused particle masks by quantile column. These get combined into bit flags
-# when storing OPP data in a binary file. e.g. 0b110 (6) means a particle is
-# focused in quantiles 50.0 and 97.5 but not 2.5.
+# Supported value types for particle data columns. Raw instrument data is
+# uint16, which can be stored as is or converted to a floating point type.
+DTYPES = [np.dtype(np.uint16), np.dtype(np.float32), np.dtype(np.float64)]
+
+# Focused particle bit flags by quantile column. mark_focused() marks particles
+# with a uint8 "bitflags" column combining these flags, which is also stored as
+# is in OPP binary files. e.g. 0b110 (6) means a particle is focused in
+# quantiles 50.0 and 97.5 but not 2.5. mark_focused() records the quantile
+# columns it marked in DataFrame.attrs["quantiles"] or
+# ParticleBatch.quantiles, since quantiles missing from filter parameters
+# aren't distinguishable from quantiles with no focused particles.
 flags = {
     "q2.5": 1,
     "q50": 2,
     "q97.5": 4
 }
+QUANTILE_FLAGS_MASK = 7
+# High bits of "bitflags" mark noise and saturated particles. These are never
+# set for focused particles.
+NOISE_FLAG = 64
+SATURATED_FLAG = 128
+
+# Compute backends for focus_flags() in order of preference, if installed.
+# numexpr is slower than numpy for these simple expressions on small blocks
+# but may help on machines with many cores.
+FOCUS_BACKENDS = (["numba"] if numba is not None else []) + \
+                 ["numpy"] + \
+                 (["numexpr"] if numexpr is not None else [])
+_focus_backend = FOCUS_BACKENDS[0]
+# Particles processed at a time by the numpy and numexpr focus backends, sized
+# so working buffers stay in cache
+FOCUS_BLOCK_ROWS = 2**14
+
+
+class ParticleBatch:
+    """
+    Particle data for one file as a dict of numpy columns.
+
+    A lightweight alternative to pandas.DataFrame for the filtering hot path,
+    with no index, no block consolidation, and no copies when columns are
+    added. Batches are also cheaper to pickle, e.g. to send between
+    processes. Columns are 1d numpy arrays of the same length, stored in column
+    order. Rows are selected with a boolean or integer array, e.g.
+    batch[mask], and columns by name, e.g. batch["D1"] or batch[["D1", "D2"]].
+    particleops functions which accept a DataFrame also accept a
+    ParticleBatch and return a ParticleBatch in its place.
+
+    Attributes
+    ----------
+    data: dict of str: numpy.ndarray
+        Particle data columns.
+    file_id: str or None
+        SeaFlow file ID of the source file.
+    date: pandas.Timestamp or None
+        Timestamp of the source file.
+    quantiles: list of str or None
+        Quantile columns marked in "bitflags" by mark_focused(), e.g.
+        ["q2.5", "q50"]. None if unknown, in which case every quantile in
+        particleops.flags is assumed.
+    """
+    __slots__ = ("data", "file_id", "date", "quantiles")
+
+    def __init__(self, data, file_id=None, date=None, quantiles=None):
+        """
+        Parameters
+        ----------
+        data: dict of str: array-like
+            Particle data columns. Arrays are not copied.
+        file_id: str, optional
+            SeaFlow file ID of the source file.
+        date: pandas.Timestamp, optional
+            Timestamp of the source file.
+        quantiles: list of str, optional
+            Quantile columns marked in "bitflags".
+        """
+        self.data = {}
+        self.file_id = file_id
+        self.date = date
+        self.quantiles = quantiles
+        for name, values in data.items():
+            self[name] = values
+
+    @classmethod
+    def from_pandas(cls, df, file_id=None, date=None):
+        """Create a ParticleBatch from DataFrame columns without copying."""
+        return cls(
+            {c: df[c].values for c in df.columns}, file_id=file_id, date=date,
+            quantiles=df.attrs.get("quantiles")
+        )
+
+    @classmethod
+    def empty(cls, dtype=np.float64, file_id=None, date=None):
+        """Create an empty ParticleBatch with COLUMNS."""
+        return cls({c: np.empty(0, dtype=dtype) for c in COLUMNS}, file_id=file_id, date=date)
+
+    def to_pandas(self, metadata=False):
+        """
+        Create a DataFrame from columns.
+
+        pandas consolidates columns of the same type into one block, so
+        column data is copied.
+
+        Parameters
+        ----------
+        metadata: bool, default False
+            Add "date" and "file_id" columns with this batch's metadata.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        df = pd.DataFrame(self.data, columns=self.columns)
+        if self.quantiles is not None:
+            df.attrs["quantiles"] = list(self.quantiles)
+        if metadata:
+            df["date"] = self.date
+            df["file_id"] = self.file_id
+        return df
+
+    @property
+    def columns(self):
+        """List of column names."""
+        return list(self.data)
+
+    def __len__(self):
+        for values in self.data.values():
+            return len(values)
+        return 0
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __contains__(self, name):
+        return name in self.data
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, list) and all(isinstance(k, str) for k in key):
+            return ParticleBatch(
+                {k: self.data[k] for k in key}, file_id=self.file_id, date=self.date, quantiles=self.quantiles
+            )
+        return self.select(key)
+
+    def __setitem__(self, name, values):
+        values = np.asarray(values)
+        if values.ndim == 0:
+            values = np.full(len(self), values)
+        if values.ndim != 1:
+            raise ValueError("ParticleBatch columns must be 1d")
+        if self.data and len(values) != len(self):
+            raise ValueError("ParticleBatch columns must have the same length")
+        self.data[name] = values
+
+    def __repr__(self):
+        return "ParticleBatch(file_id={!r}, rows={}, columns={})".format(self.file_id, len(self), self.columns)
+
+    def select(self, rows):
+        """
+        Return a new ParticleBatch with a subset of rows.
+
+        Parameters
+        ----------
+        rows: numpy.ndarray
+            Boolean mask or integer indexes of rows to keep.
+        """
+        return ParticleBatch(
+            {k: v[rows] for k, v in self.data.items()}, file_id=self.file_id, date=self.date,
+            quantiles=self.quantiles
+        )
+
+    def copy(self, deep=True):
+        """Return a copy, with copies of column data if deep is True."""
+        if deep:
+            data = {k: v.copy() for k, v in self.data.items()}
+        else:
+            data = dict(self.data)
+        return ParticleBatch(data, file_id=self.file_id, date=self.date, quantiles=self.quantiles)
+
+    def astype(self, dtype, columns=None):
+        """
+        Return a new ParticleBatch with columns converted to dtype.
+
+        Parameters
+        ----------
+        dtype: numpy.dtype
+            New value type.
+        columns: list of str, optional
+            Columns to convert, default is all columns. Columns which already
+            have dtype are not copied.
+        """
+        if columns is None:
+            columns = self.columns
+        data = dict(self.data)
+        for c in columns:
+            data[c] = data[c].astype(dtype, copy=False)
+        return ParticleBatch(data, file_id=self.file_id, date=self.date, quantiles=self.quantiles)
+
+
+def _as_signed(a):
+    """
+    Return unsigned integer particle data as int32 to allow safe arithmetic.
+
+    Other types are returned unchanged.
+    """
+    if a.dtype.kind == "u":
+        return a.astype(np.int32)
+    return a
 
 
 def all_quantiles(df):
@@ -27,18 +236,17 @@ def all_quantiles(df):
 
     Parameters
     ----------
-    df: pandas.DataFrame
-        SeaFlow particle data with focused particles marked by mark_focused().
-        Focused particles should be marked with a boolean column for each
-        quantile, where column names are q<quantile>, e.g. q2.5 for 2.5%
-        quantile.
+    df: pandas.DataFrame or ParticleBatch
+        SeaFlow particle data with focused particles marked by mark_focused()
+        in a "bitflags" column, or with a boolean column for each quantile,
+        where column names are q<quantile>, e.g. q2.5 for 2.5% quantile.
 
     Returns
     ------
     bool
     """
-    for q_col in [c for c in df.columns if c.startswith("q")]:
-        if not df[q_col].any():
+    for _q_col, _q, _q_str, mask in quantile_masks(df):
+        if not mask.any():
             return False
     return True
 
@@ -48,7 +256,7 @@ def decode_bit_flags(df):
     Convert "bitflags" column to per-quantile focused particles booleans.
 
     This removes the "bitflags" column and adds a new boolean column for each
-    quantile encoded by the bit flags.
+    quantile encoded by the bit flags, see marked_quantiles().
 
     df: pandas.DataFrame
         SeaFlow focused particle DataFrame with "bitflags" column.
@@ -61,10 +269,12 @@ def decode_bit_flags(df):
     # This sort is ASCII-alphabetical! But that works for the set of quantile
     # column names we have so far. If this changes then do a numeric sort by
     # quantile value.
+    q_cols = marked_quantiles(df)
     bitflags = df["bitflags"]
     df = df.drop(["bitflags"], axis="columns")
     for col, f in sorted(flags.items()):
-        df[col] = (bitflags & f) > 0
+        if col in q_cols:
+            df[col] = (bitflags & f) > 0
     return df
 
 
@@ -83,9 +293,9 @@ def encode_bit_flags(df):
     """
     Encode a "bitflags" column for per-quantile focused particles booleans.
 
-    This removes the the noise and the per-quantile focused particles boolean
-    columns and adds a new column "bitflags" with bit flags values for each
-    quantile. See particleops.flags for the flag definitions.
+    This adds a new column "bitflags" with bit flags values for each quantile.
+    See particleops.flags for the flag definitions. DataFrames marked by
+    mark_focused() already have this column.
 
     Parameters
     ----------
@@ -99,81 +309,388 @@ def encode_bit_flags(df):
         Reference to original modified DataFrame.
     """
     # Construct bit flags to efficiently capture all quantile flag columns
-    bitflags = None
+    bitflags = np.zeros(len(df.index), dtype=np.uint8)
     for col, f in flags.items():
-        if bitflags is None:
-            bitflags = np.left_shift(df[col], int(math.log(f, 2)))
-        else:
-            bitflags = bitflags | np.left_shift(df[col], int(math.log(f, 2)))
+        if col in df.columns:
+            bitflags[df[col].values] |= f
     df["bitflags"] = bitflags  # new column
     return df
 
 
+def get_focus_backend():
+    """Return the name of the compute backend used by focus_flags()."""
+    return _focus_backend
+
+
+def set_focus_backend(name):
+    """
+    Set the compute backend used by focus_flags().
+
+    Parameters
+    ----------
+    name: str
+        Name of a backend in FOCUS_BACKENDS.
+    """
+    global _focus_backend
+    if name not in FOCUS_BACKENDS:
+        raise ValueError("focus backend must be one of {}".format(", ".join(FOCUS_BACKENDS)))
+    _focus_backend = name
+
+
+def _focus_params(params):
+    """
+    Check and unpack filtering parameters for focus_flags().
+
+    Returns
+    -------
+    tuple of (width, quantiles, bits, notches)
+        Alignment width as float, list of quantiles in ascending order, a
+        numpy.uint8 array of each quantile's flag from particleops.flags, and a
+        2d numpy.float64 array with one row per quantile of notch_small_D1,
+        notch_small_D2, notch_large_D1, notch_large_D2, offset_small_D1,
+        offset_small_D2, offset_large_D1, offset_large_D2.
+    """
+    notch_keys = [
+        "notch_small_D1", "notch_small_D2", "notch_large_D1", "notch_large_D2",
+        "offset_small_D1", "offset_small_D2", "offset_large_D1", "offset_large_D2"
+    ]
+    if params is None:
+        raise ValueError("Must provide filtering parameters")
+    for k in ["width", "quantile"] + notch_keys:
+        if not k in params.columns:
+            raise ValueError(f"Missing filter parameter {k} in mark_focused")
+    # Assume width is same for all quantiles so just grab first width value
+    # and calculate aligned particles once
+    assert len(params["width"].unique()) == 1  # may as well check
+    params = params.drop_duplicates("quantile").sort_values("quantile")
+    quantiles = params["quantile"].tolist()
+    bits = []
+    for q in quantiles:
+        q_col = f"q{util.quantile_str(q)}"
+        if q_col not in flags:
+            raise ValueError(f"Unsupported filter parameter quantile {q}")
+        bits.append(flags[q_col])
+    width = float(params["width"].iloc[0])
+    notches = np.ascontiguousarray(params[notch_keys].values, dtype=np.float64)
+    return width, quantiles, np.array(bits, dtype=np.uint8), notches
+
+
+@functools.lru_cache(maxsize=8)
+def _focus_thresholds(notches_bytes, nq):
+    """
+    Return integer notch line thresholds for every 16-bit fsc_small value.
+
+    For integer D and fsc_small, D <= fsc_small * notch + offset evaluated in
+    float64 is exactly D <= floor(fsc_small * notch + offset), so computing
+    the float64 line once per possible fsc_small value gives an integer test
+    which always matches the float64 test.
+
+    Returns
+    -------
+    numpy.ndarray
+        Read-only numpy.int32 array of shape (2**16, nq, 4), for small D1,
+        small D2, large D1, and large D2 notch lines of each quantile, clipped
+        to [-1, 2**16 - 1]. -1 is never matched, e.g. for a NaN line. All
+        thresholds for one fsc_small value are adjacent in memory.
+    """
+    notches = np.frombuffer(notches_bytes, dtype=np.float64).reshape(nq, 8)
+    fsc = np.arange(2**16, dtype=np.float64)
+    thresholds = np.empty((2**16, nq, 4), dtype=np.int32)
+    for i in range(nq):
+        for j in range(4):
+            # Same operations in the same order as the float64 focus test
+            line = np.floor(fsc * notches[i, j] + notches[i, j + 4])
+            line[np.isnan(line)] = -1
+            thresholds[:, i, j] = np.clip(line, -1, 2**16 - 1)
+    thresholds.flags.writeable = False
+    return thresholds
+
+
+def focus_flags(df, params, backend=None, integer=None):
+    """
+    Compute noise, saturation, and per-quantile focus flags for particles.
+
+    All flags are computed in one pass over D1, D2, and fsc_small, after
+    finding the maximum D1 and D2 values. Comparisons are made in float64
+    so results don't depend on the storage type of particle data or on the
+    backend.
+
+    Raw numpy.uint16 particle data can instead be tested without any float
+    conversion of particle data. Alignment is tested in integer arithmetic,
+    and notch lines are compared against integer thresholds precomputed in
+    float64 for each possible fsc_small value. Results are identical to
+    float64 tests.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame or ParticleBatch
+        SeaFlow raw event data. Particle data may be any type in DTYPES.
+    params: pandas.DataFrame
+        Filtering parameters as pandas DataFrame.
+    backend: str, optional
+        Compute backend, one of FOCUS_BACKENDS. Defaults to the backend set
+        by set_focus_backend(). The numexpr backend uses numpy for integer
+        tests.
+    integer: bool, optional
+        Use integer tests. Requires numpy.uint16 D1, D2, and fsc_small and an
+        integer alignment width. Default is to use integer tests when
+        possible, except with the numpy backend where gathering thresholds is
+        slower than float64 arithmetic.
+
+    Returns
+    -------
+    tuple of (numpy.ndarray, list of float)
+        numpy.uint8 bit flags for each particle, combining particleops.flags,
+        NOISE_FLAG, and SATURATED_FLAG, and quantiles present in params.
+    """
+    if backend is None:
+        backend = _focus_backend
+    elif backend not in FOCUS_BACKENDS:
+        raise ValueError("focus backend must be one of {}".format(", ".join(FOCUS_BACKENDS)))
+    width, quantiles, bits, notches = _focus_params(params)
+    if len(set(list(df)).intersection(set(["D1", "D2", "fsc_small"]))) < 3:
+        raise ValueError("Can't apply focus filter without D1, D2, and fsc_small")
+    D1 = np.asarray(df["D1"])
+    D2 = np.asarray(df["D2"])
+    fsc_small = np.asarray(df["fsc_small"])
+    integer_ok = (
+        all(a.dtype == np.uint16 for a in (D1, D2, fsc_small)) and
+        width.is_integer() and abs(width) < 2**31
+    )
+    if integer is None:
+        integer = integer_ok and backend != "numpy"
+    elif integer and not integer_ok:
+        raise ValueError("integer focus tests require numpy.uint16 particle data and an integer width")
+    out = np.zeros(len(D1), dtype=np.uint8)
+    if len(D1) == 0:
+        return out, quantiles
+    if integer:
+        thresholds = _focus_thresholds(notches.tobytes(), len(notches))
+        D1max = int(D1.max())
+        D2max = int(D2.max())
+        if backend == "numba":
+            _focus_numba_int(D1, D2, fsc_small, int(width), bits, thresholds, D1max, D2max, out)
+        else:
+            _focus_blocks_int(D1, D2, fsc_small, int(width), bits, thresholds, D1max, D2max, out)
+        return out, quantiles
+    D1max = float(D1.max())
+    D2max = float(D2.max())
+    if backend == "numba":
+        _focus_numba(D1, D2, fsc_small, width, bits, notches, D1max, D2max, out)
+    else:
+        _focus_blocks(D1, D2, fsc_small, width, bits, notches, D1max, D2max, out, backend == "numexpr")
+    return out, quantiles
+
+
+def _focus_blocks_int(D1, D2, fsc_small, width, bits, thresholds, D1max, D2max, out):
+    """
+    numpy integer focus_flags() backend.
+
+    Particles are processed FOCUS_BLOCK_ROWS at a time through preallocated
+    int32 and bool buffers. fsc_small values index notch line thresholds.
+    """
+    n = min(len(D1), FOCUS_BLOCK_ROWS)
+    d1, d2, diff = (np.empty(n, dtype=np.int32) for _ in range(3))
+    lines = np.empty((n,) + thresholds.shape[1:], dtype=np.int32)
+    fsc = np.empty(n, dtype=np.intp)
+    aligned, focused, b1, b2 = (np.empty(n, dtype=bool) for _ in range(4))
+    for start in range(0, len(D1), FOCUS_BLOCK_ROWS):
+        stop = min(start + FOCUS_BLOCK_ROWS, len(D1))
+        k = stop - start
+        d1k, d2k, diffk, linesk, fsck = d1[:k], d2[:k], diff[:k], lines[:k], fsc[:k]
+        alignedk, focusedk, b1k, b2k = aligned[:k], focused[:k], b1[:k], b2[:k]
+        flagsk = out[start:stop]
+        np.copyto(d1k, D1[start:stop])
+        np.copyto(d2k, D2[start:stop])
+        np.copyto(fsck, fsc_small[start:stop])
+
+        # Noise, none of D1, D2, fsc_small > 1
+        np.greater(fsck, 1, out=b1k)
+        b1k |= np.greater(d1k, 1, out=b2k)
+        b1k |= np.greater(d2k, 1, out=b2k)
+        np.logical_not(b1k, out=b1k)
+        flagsk[b1k] |= NOISE_FLAG
+        # Saturated, D1 or D2 at maximum value
+        np.equal(d1k, D1max, out=b2k)
+        b2k |= np.equal(d2k, D2max, out=alignedk)
+        flagsk[b2k] |= SATURATED_FLAG
+        # Aligned, D1 = D2 within width
+        b1k |= b2k
+        np.logical_not(b1k, out=alignedk)
+        np.subtract(d1k, d2k, out=diffk)
+        alignedk &= np.less(diffk, width, out=b1k)
+        np.negative(diffk, out=diffk)
+        alignedk &= np.less(diffk, width, out=b1k)
+
+        # All notch line thresholds for each particle's fsc_small value
+        np.take(thresholds, fsck, axis=0, out=linesk, mode="clip")
+        for i, bit in enumerate(bits):
+            # Small particle notch lines
+            np.less_equal(d1k, linesk[:, i, 0], out=focusedk)
+            focusedk &= np.less_equal(d2k, linesk[:, i, 1], out=b1k)
+            # Large particle notch lines
+            np.less_equal(d1k, linesk[:, i, 2], out=b2k)
+            b2k &= np.less_equal(d2k, linesk[:, i, 3], out=b1k)
+            focusedk |= b2k
+            focusedk &= alignedk
+            flagsk[focusedk] |= bit
+
+
+def _focus_blocks(D1, D2, fsc_small, width, bits, notches, D1max, D2max, out, use_numexpr):
+    """
+    numpy and numexpr focus_flags() backends.
+
+    Particles are processed FOCUS_BLOCK_ROWS at a time through preallocated
+    float64 and bool buffers, so no full-length temporaries are created.
+    """
+    n = min(len(D1), FOCUS_BLOCK_ROWS)
+    d1, d2, fsc, line = (np.empty(n, dtype=np.float64) for _ in range(4))
+    aligned, focused, b1, b2 = (np.empty(n, dtype=bool) for _ in range(4))
+    for start in range(0, len(D1), FOCUS_BLOCK_ROWS):
+        stop = min(start + FOCUS_BLOCK_ROWS, len(D1))
+        k = stop - start
+        d1k, d2k, fsck, linek = d1[:k], d2[:k], fsc[:k], line[:k]
+        alignedk, focusedk, b1k, b2k = aligned[:k], focused[:k], b1[:k], b2[:k]
+        flagsk = out[start:stop]
+        np.copyto(d1k, D1[start:stop], casting="unsafe")
+        np.copyto(d2k, D2[start:stop], casting="unsafe")
+        np.copyto(fsck, fsc_small[start:stop], casting="unsafe")
+
+        # Noise, none of D1, D2, fsc_small > 1
+        np.greater(fsck, 1, out=b1k)
+        b1k |= np.greater(d1k, 1, out=b2k)
+        b1k |= np.greater(d2k, 1, out=b2k)
+        np.logical_not(b1k, out=b1k)
+        flagsk[b1k] |= NOISE_FLAG
+        # Saturated, D1 or D2 at maximum value
+        np.equal(d1k, D1max, out=b2k)
+        b2k |= np.equal(d2k, D2max, out=alignedk)
+        flagsk[b2k] |= SATURATED_FLAG
+        # Aligned, D1 = D2 within width
+        b1k |= b2k
+        np.logical_not(b1k, out=alignedk)
+        np.add(d2k, width, out=linek)
+        alignedk &= np.less(d1k, linek, out=b1k)
+        np.add(d1k, width, out=linek)
+        alignedk &= np.less(d2k, linek, out=b1k)
+
+        for bit, nq in zip(bits, notches):
+            if use_numexpr:
+                numexpr.evaluate(
+                    "aligned & "
+                    "(((d1 <= fsc * ns1 + os1) & (d2 <= fsc * ns2 + os2)) | "
+                    "((d1 <= fsc * nl1 + ol1) & (d2 <= fsc * nl2 + ol2)))",
+                    local_dict={
+                        "aligned": alignedk, "d1": d1k, "d2": d2k, "fsc": fsck,
+                        "ns1": nq[0], "ns2": nq[1], "nl1": nq[2], "nl2": nq[3],
+                        "os1": nq[4], "os2": nq[5], "ol1": nq[6], "ol2": nq[7]
+                    },
+                    out=focusedk,
+                    casting="unsafe"
+                )
+            else:
+                # Small particle notch lines
+                np.multiply(fsck, nq[0], out=linek)
+                linek += nq[4]
+                np.less_equal(d1k, linek, out=focusedk)
+                np.multiply(fsck, nq[1], out=linek)
+                linek += nq[5]
+                focusedk &= np.less_equal(d2k, linek, out=b1k)
+                # Large particle notch lines
+                np.multiply(fsck, nq[2], out=linek)
+                linek += nq[6]
+                np.less_equal(d1k, linek, out=b2k)
+                np.multiply(fsck, nq[3], out=linek)
+                linek += nq[7]
+                b2k &= np.less_equal(d2k, linek, out=b1k)
+                focusedk |= b2k
+                focusedk &= alignedk
+            flagsk[focusedk] |= bit
+
+
+if numba is not None:
+    @numba.njit(cache=True, nogil=True)
+    def _focus_numba(D1, D2, fsc_small, width, bits, notches, D1max, D2max, out):
+        """numba focus_flags() backend, one loop over particles."""
+        for j in range(D1.shape[0]):
+            d1 = np.float64(D1[j])
+            d2 = np.float64(D2[j])
+            fsc = np.float64(fsc_small[j])
+            f = 0
+            if not (fsc > 1 or d1 > 1 or d2 > 1):
+                f |= NOISE_FLAG
+            if d1 == D1max or d2 == D2max:
+                f |= SATURATED_FLAG
+            if f == 0 and d1 < d2 + width and d2 < d1 + width:
+                for i in range(notches.shape[0]):
+                    if ((d1 <= fsc * notches[i, 0] + notches[i, 4] and
+                         d2 <= fsc * notches[i, 1] + notches[i, 5]) or
+                        (d1 <= fsc * notches[i, 2] + notches[i, 6] and
+                         d2 <= fsc * notches[i, 3] + notches[i, 7])):
+                        f |= bits[i]
+            out[j] = f
+
+    @numba.njit(cache=True, nogil=True)
+    def _focus_numba_int(D1, D2, fsc_small, width, bits, thresholds, D1max, D2max, out):
+        """numba integer focus_flags() backend, one loop over particles."""
+        for j in range(D1.shape[0]):
+            d1 = np.int32(D1[j])
+            d2 = np.int32(D2[j])
+            fsc = np.int32(fsc_small[j])
+            f = 0
+            if not (fsc > 1 or d1 > 1 or d2 > 1):
+                f |= NOISE_FLAG
+            if d1 == D1max or d2 == D2max:
+                f |= SATURATED_FLAG
+            if f == 0 and d1 - d2 < width and d2 - d1 < width:
+                for i in range(thresholds.shape[1]):
+                    if ((d1 <= thresholds[fsc, i, 0] and d2 <= thresholds[fsc, i, 1]) or
+                        (d1 <= thresholds[fsc, i, 2] and d2 <= thresholds[fsc, i, 3])):
+                        f |= bits[i]
+            out[j] = f
+
+
 def mark_focused(df, params, inplace=False):
     """
     Mark focused particle data.
 
-    Adds boolean cols for noise, saturation, and focused particles by quantile.
+    Adds a numpy.uint8 "bitflags" column marking noise, saturated, and focused
+    particles by quantile, see particleops.flags, NOISE_FLAG, and
+    SATURATED_FLAG. Filter parameter quantiles must be in particleops.flags.
+    Marked quantile columns are recorded in DataFrame.attrs["quantiles"] or
+    ParticleBatch.quantiles.
 
     Parameters
     ----------
-    df: pandas.DataFrame
-        SeaFlow raw event DataFrame.
+    df: pandas.DataFrame or ParticleBatch
+        SeaFlow raw event data. Particle data may be any type in DTYPES.
     params: pandas.DataFrame
         Filtering parameters as pandas DataFrame.
     inplace: bool, default False
-        Add new booleans columns to and return input DataFrame. If False,
-        add new columns to and return a copy of the input DataFrame, leaving the
-        original unmodified.
+        Add new column to and return input DataFrame. If False, add new column
+        to and return a copy of the input DataFrame, leaving the original
+        unmodified.
 
     Returns
     -------
-    pandas.DataFrame
-        Reference to or copy of input DataFrame with new boolean columns.
+    pandas.DataFrame or ParticleBatch
+        Reference to or copy of input data with new "bitflags" column.
     """
-    # Check parameters
-    param_keys = [
-        "width", "notch_small_D1", "notch_small_D2", "notch_large_D1",
-        "notch_large_D2", "offset_small_D1", "offset_small_D2",
-        "offset_large_D1", "offset_large_D2", "quantile"
-    ]
-    if params is None:
-        raise ValueError("Must provide filtering parameters")
-    for k in param_keys:
-        if not k in params.columns:
-            raise ValueError(f"Missing filter parameter {k} in mark_focused")
+    bitflags, quantiles = focus_flags(df, params)
+    q_cols = [f"q{util.quantile_str(q)}" for q in quantiles]
 
     if not inplace:
-        df = df.copy()
-
-    # Apply noise filter and saturation filter for D1 and D2
-    df["noise"] = mark_noise(df)
-    df["saturated"] = mark_saturated(df)
+        if isinstance(df, ParticleBatch):
+            # Adding a column never modifies the original batch's columns
+            df = df.copy(deep=False)
+        else:
+            df = df.copy()
 
-    # Filter for aligned/focused particles
-    #
-    # Filter aligned particles (D1 = D2), with correction for D1 D2
-    # sensitivity difference. Assume width is same for all quantiles so just
-    # grab first width value and calculate aligned particles once
-    assert len(params["width"].unique()) == 1  # may as well check
-    width = params.loc[0, "width"]
-    alignedD1 = df["D1"].values < (df["D2"].values + width)
-    alignedD2 = df["D2"].values < (df["D1"].values + width)
-    aligned = ~df["noise"] & ~df["saturated"] & alignedD1 & alignedD2
-
-    for q in params["quantile"].sort_values():
-        p = params[params["quantile"] == q].iloc[0]  # get first row of dataframe as series
-        # Filter focused particles
-        # Using underlying numpy arrays (values) to construct boolean
-        # selector is about 10% faster than using pandas Series
-        small_D1 = df["D1"].values <= ((df["fsc_small"].values * p["notch_small_D1"]) + p["offset_small_D1"])
-        small_D2 = df["D2"].values <= ((df["fsc_small"].values * p["notch_small_D2"]) + p["offset_small_D2"])
-        large_D1 = df["D1"].values <= ((df["fsc_small"].values * p["notch_large_D1"]) + p["offset_large_D1"])
-        large_D2 = df["D2"].values <= ((df["fsc_small"].values * p["notch_large_D2"]) + p["offset_large_D2"])
-        opp_selector = aligned & ((small_D1 & small_D2) | (large_D1 & large_D2))
-        # Mark focused particles
-        colname = f"q{util.quantile_str(q)}"
-        df[colname] = opp_selector
+    df["bitflags"] = bitflags
+    if isinstance(df, ParticleBatch):
+        df.quantiles = q_cols
+    else:
+        df.attrs["quantiles"] = q_cols
 
     return df
 
@@ -217,6 +734,32 @@ def mark_saturated(df):
         return pd.Series((df["D1"].values == df["D1"].values.max()) | (df["D2"].values == df["D2"].values.max()))
 
 
+def marked_quantiles(df):
+    """
+    Return quantile columns marked in a "bitflags" column.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame or ParticleBatch
+        SeaFlow particle data with focused particles marked by mark_focused()
+        in a "bitflags" column.
+
+    Returns
+    -------
+    list of str
+        Quantile columns recorded by mark_focused(), or every quantile column
+        in particleops.flags if none were recorded, e.g. for data read from
+        OPP files.
+    """
+    if isinstance(df, ParticleBatch):
+        q_cols = df.quantiles
+    else:
+        q_cols = df.attrs.get("quantiles")
+    if q_cols is None:
+        q_cols = list(flags)
+    return q_cols
+
+
 def merge_opp_vct(oppdf, vctdf):
     """
     Return a new DataFrame that combines an OPP DataFrame with a VCT DataFrame
@@ -243,6 +786,47 @@ def merge_opp_vct(oppdf, vctdf):
     return pd.concat([oppdf, vctdf], axis=1)
 
 
+def quantile_masks(df):
+    """
+    Generator to iterate through focused particle masks by quantile.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame or ParticleBatch
+        SeaFlow particle data with focused particles marked by mark_focused()
+        in a "bitflags" column, or with a boolean column for each quantile,
+        where column names are q<quantile>, e.g. q2.5 for 2.5% quantile. Only
+        quantiles marked by mark_focused() are yielded, see
+        marked_quantiles().
+
+    Yields
+    ------
+    q_col: str
+        Name of a single quantile focused boolean column.
+    q: float
+        Quantile number.
+    q_str: str
+        String representation of quantile suitable for constructing a filesystem
+        path.
+    mask: numpy.ndarray
+        Boolean array of particles focused for the quantile.
+    """
+    if "bitflags" in df.columns:
+        bitflags = np.asarray(df["bitflags"])
+        q_cols = [(c, f) for c, f in flags.items() if c in marked_quantiles(df)]
+    else:
+        bitflags = None
+        q_cols = [(c, None) for c in df.columns if c.startswith("q")]
+    for q_col, f in q_cols:
+        q_str = util.quantile_str(float(q_col[1:]))  # after "q"
+        q = float(q_str)
+        if bitflags is None:
+            mask = np.asarray(df[q_col])
+        else:
+            mask = (bitflags & f) > 0
+        yield q_col, q, q_str, mask
+
+
 def quantiles_in_df(df):
     """
     Generator to iterate through focused particles by quantile.
@@ -250,10 +834,9 @@ def quantiles_in_df(df):
     Parameters
     ----------
     df: pandas.DataFrame
-        SeaFlow particle data with focused particles marked by mark_focused().
-        Focused particles should be marked with a boolean column for each
-        quantile, where column names are q<quantile>, e.g. q2.5 for 2.5%
-        quantile.
+        SeaFlow particle data with focused particles marked by mark_focused()
+        in a "bitflags" column, or with a boolean column for each quantile,
+        where column names are q<quantile>, e.g. q2.5 for 2.5% quantile.
 
     Yields
     ------
@@ -268,10 +851,8 @@ def quantiles_in_df(df):
         Subset of input DataFrame with only particles marked for the quantile
         defined by q_str.
     """
-    for q_col in [c for c in df.columns if c.startswith("q")]:
-        q_str = util.quantile_str(float(q_col[1:]))  # after "q"
-        q = float(q_str)
-        q_df = df[df[q_col]]  # select only focused particles for one quantile
+    for q_col, q, q_str, mask in quantile_masks(df):
+        q_df = df[mask]  # select only focused particles for one quantile
         yield q_col, q, q_str, q_df
 
 
@@ -307,13 +888,13 @@ def roughfilter(df, width=5000):
         return empty_df()
 
     # Correction for the difference in sensitivity between D1 and D2
-    origin = (df["D2"] - df["D1"]).median()
+    origin = np.median(_as_signed(df["D2"].values) - _as_signed(df["D1"].values))
 
     # Filter aligned particles (D1 = D2), with correction for D1 D2
     # sensitivity difference.
     alignedD1 = (df["D1"] + origin) < (df["D2"] + width)
     alignedD2 = df["D2"] < (df["D1"] + origin + width)
-    aligned = df[~df["noise"] & ~df["saturated"] & alignedD1 & alignedD2]
+    aligned = df[~noise.values & ~sat.values & alignedD1.values & alignedD2.values]
 
     # Find fsc/d ratio (slope) for best large fsc particle
     fsc_small_max = aligned["fsc_small"].max()
@@ -339,21 +920,68 @@ def select_focused(df):
 
     Parameters
     ----------
-    df: pandas.DataFrame
+    df: pandas.DataFrame or ParticleBatch
         SeaFlow event data that has been marked with mark_focused().
 
     Returns
     -------
-    pandas.DataFrame
+    pandas.DataFrame or ParticleBatch
         Copy of subset of df where each row is focused in at least on quantile.
     """
-    selector = False
-    for qcolumn in [c for c in df.columns if c.startswith("q")]:
-        selector = selector | df[qcolumn].values
+    if "bitflags" in df.columns:
+        selector = (np.asarray(df["bitflags"]) & QUANTILE_FLAGS_MASK) > 0
+    else:
+        selector = np.zeros(len(df), dtype=bool)
+        for _q_col, _q, _q_str, mask in quantile_masks(df):
+            selector |= mask
+    if isinstance(df, ParticleBatch):
+        return df.select(selector)
     return df[selector].copy()
 
 
-def transform_particles(df, columns=None):
+@functools.lru_cache(maxsize=None)
+def _transform_table(dtype):
+    """Return a read-only table of exponentiated values for every uint16 value."""
+    table = _transform_values(np.arange(2**16, dtype=np.float64)).astype(dtype)
+    table.flags.writeable = False
+    return table
+
+
+def _transform_values(values):
+    """Exponentiate logged SeaFlow values as float64."""
+    return 10**((values / 2**16) * 3.5)
+
+
+def _transform_column(values, dtype=None):
+    """
+    Exponentiate one column of logged SeaFlow values.
+
+    Integer values in the uint16 range are looked up in a precomputed table,
+    other values are exponentiated directly. Both give identical results. If
+    dtype is None float32 and float64 values keep their type and other values
+    become float64.
+    """
+    values = np.asarray(values)
+    if dtype is None:
+        if values.dtype in (np.dtype(np.float32), np.dtype(np.float64)):
+            dtype = values.dtype
+        else:
+            dtype = np.dtype(np.float64)
+    table = _transform_table(dtype)
+    if values.dtype == np.uint16:
+        return table[values]
+    if values.dtype.kind in "iuf" and len(values) > 0:
+        # Check all values are uint16 integers, e.g. raw data stored as float.
+        # NaN fails both comparisons and inf fails the range check, so the
+        # cast below is always exact for integer values.
+        if values.min() >= 0 and values.max() < 2**16:
+            idx = values.astype(np.uint16)
+            if values.dtype.kind != "f" or np.array_equal(idx, values):
+                return table[idx]
+    return _transform_values(values.astype(np.float64)).astype(dtype, copy=False)
+
+
+def transform_particles(df, columns=None, dtype=None):
     """
     Exponentiate logged SeaFlow data.
 
@@ -361,23 +989,36 @@ def transform_particles(df, columns=None):
     scale. This functions exponentiates those values onto a linear scale from 1
     to 10**3.5
 
-    Note: This will convert to float64 if necessary.
+    Raw 16-bit values, as numpy.uint16 or as integer floats, are transformed
+    by lookup in a table of all 65536 possible results. Other values are
+    exponentiated directly.
 
     Parameters
     ----------
-    df: pandas.DataFrame
+    df: pandas.DataFrame or ParticleBatch
         SeaFlow event data.
     columns: list of str, default seaflowpy.particleops.channel_columns
         Names of columns to transform.
+    dtype: numpy.dtype, optional
+        Value type of transformed columns, numpy.float32 or numpy.float64.
+        Default is to keep the type of float32 and float64 columns and to
+        convert other columns to float64.
 
     Returns
     -------
-    pandas.DataFrame
+    pandas.DataFrame or ParticleBatch
         Copy of df with transformed values.
     """
     if not columns:
         columns = CHANNEL_COLUMNS
-    events = df.copy()
-    if len(events.index) > 0:
-        events[columns] = 10**((events[columns] / 2**16) * 3.5)
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+        if dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+            raise ValueError("dtype must be float32 or float64")
+    if isinstance(df, ParticleBatch):
+        events = df.copy(deep=False)
+    else:
+        events = df.copy()
+    for c in columns:
+        events[c] = _transform_column(events[c], dtype)
     return events
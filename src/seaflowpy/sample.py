@@ -216,7 +216,7 @@ def sample_many_to_one(
     for f in evtpaths:
         msg = ""
         try:
-            df = fileio.read_evt_labview(f)
+            df = fileio.read_evt_labview(f, mmap=True, columns=columns)
         except Exception as e:
             msg = "{}: {}".format(type(e).__name__, str(e))
             df = particleops.empty_df()
@@ -12,8 +12,8 @@ new_path_re = r'^\d{1,4}_\d{1,3}/\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}[+-]\d{2}-\d
 new_file_re = r'^(?P<date>\d{4}-\d{2}-\d{2})T(?P<hours>\d{2})-(?P<minutes>\d{2})-(?P<seconds>\d{2})(?P<tzhours>[+-]\d{2})-(?P<tzminutes>\d{2})$'
 old_path_re = r'^\d{1,4}_\d{1,3}/\d+\.evt$'
 old_file_re = r'^\d+\.evt$'
-evt_file_re = r'^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}[+-]\d{2}-\d{2}(?:\.gz)?$|^\d+\.evt(?:\.gz)?$'
-opp_file_re = r'^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}[+-]\d{2}-\d{2}\.opp(?:\.gz)?$|^\d+\.evt\.opp(?:\.gz)?$'
+evt_file_re = r'^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}[+-]\d{2}-\d{2}(?:\.gz|\.zst|\.lz4)?$|^\d+\.evt(?:\.gz|\.zst|\.lz4)?$'
+opp_file_re = r'^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}[+-]\d{2}-\d{2}\.opp(?:\.gz|\.zst|\.lz4)?$|^\d+\.evt\.opp(?:\.gz|\.zst|\.lz4)?$'
 
 
 class SeaFlowFile:
@@ -60,9 +60,9 @@ class SeaFlowFile:
 
         # Identifer to match across file types (EVT/OPP/VCT)
         # Should be something like 2014_142/42.evt for old files. Note always
-        # .evt even for opp and vct. No .gz.
+        # .evt even for opp and vct. No .gz, .zst, or .lz4.
         # Should be something like 2014_342/2014-12-08T22-53-34+00-00 for new
-        # files. Note no extension including .gz.
+        # files. Note no extension including .gz, .zst, or .lz4.
         # The day of year directory will be based on parsed datestamp in
         # filename when possible, not the given path. The file ID based on
         # the given path is stored in path_file_id.
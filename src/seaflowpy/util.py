@@ -1,3 +1,5 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from signal import getsignal, signal, SIGPIPE, SIG_DFL
 import errno
@@ -43,6 +45,88 @@ def gzip_file(path, print_timing=False):
         print("Compression completed in %.2f seconds" % (t1 - t0))
 
 
+def imap_ordered(func, things, jobs=1, backlog=4):
+    """
+    Apply func to each item in things concurrently, yielding results in order.
+
+    This is a generator. Work is run in a pool of jobs threads, which is
+    suited to I/O bound tasks or tasks that release the GIL such as zlib
+    decompression. At most jobs * backlog items are in flight at once, so
+    memory use is bounded regardless of the length of things. Results are
+    yielded in the same order as things as soon as each one and all results
+    before it are complete. If jobs is 1 no threads are created.
+
+    Parameters
+    ----------
+    func: function
+        Function of one argument.
+    things: iterable
+        Inputs to func.
+    jobs: int, default 1
+        Number of worker threads.
+    backlog: int, default 4
+        Maximum number of in flight items per worker thread.
+
+    Yields
+    ------
+    Return values of func for each item in things.
+    """
+    if jobs < 1:
+        raise ValueError("jobs must be > 0")
+    if jobs == 1:
+        for thing in things:
+            yield func(thing)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = deque()
+        for thing in things:
+            futures.append(executor.submit(func, thing))
+            if len(futures) >= jobs * backlog:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def prefetch(func, things, depth=1):
+    """
+    Apply func to items in things ahead of time, yielding results in order.
+
+    This is a generator. func is run in one background thread for up to depth
+    items beyond the item most recently yielded, so slow input such as file
+    reads overlaps with processing of earlier results by the caller. If depth
+    is 0 func is run in the calling thread when each result is requested.
+
+    Parameters
+    ----------
+    func: function
+        Function of one argument.
+    things: iterable
+        Inputs to func.
+    depth: int, default 1
+        Maximum number of items to process ahead of the caller.
+
+    Yields
+    ------
+    Return values of func for each item in things.
+    """
+    if depth < 0:
+        raise ValueError("depth must be >= 0")
+    if depth == 0:
+        for thing in things:
+            yield func(thing)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        futures = deque()
+        for thing in things:
+            futures.append(executor.submit(func, thing))
+            if len(futures) > depth:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
 def jobs_parts(things, n):
     """Split a list of things into n sublists."""
     if n < 1:
@@ -3,9 +3,13 @@ from builtins import object
 import gzip
 import io
 import os
+import pickle
+import queue
 import shutil
 import sqlite3
 import subprocess
+import types
+import fastparquet
 import numpy as np
 import numpy.testing as npt
 import pandas as pd
@@ -89,6 +93,387 @@ class TestOpen:
         assert len(df.index) == 40000
         assert list(df) == sfp.particleops.COLUMNS
 
+    @pytest.mark.benchmark(group="evt-read")
+    def test_read_evt_valid_mmap(self, benchmark):
+        df = benchmark(sfp.fileio.read_evt_labview, "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00", mmap=True)
+        assert len(df.index) == 40000
+        assert list(df) == sfp.particleops.COLUMNS
+        npt.assert_array_equal(df, sfp.fileio.read_evt_labview("tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"))
+
+    def test_read_labview_mmap_no_copy(self):
+        df = sfp.fileio.read_labview_mmap("tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00", sfp.particleops.COLUMNS)
+        assert len(df.index) == 40000
+        assert list(df) == sfp.particleops.COLUMNS
+        assert df["D1"].dtype == np.uint16
+        # Backed by read-only mapped file, not an in-memory copy
+        assert not df["D1"].values.flags.writeable
+
+    def test_read_evt_valid_gz_mmap(self):
+        # mmap is ignored for compressed files
+        df = sfp.fileio.read_evt_labview("tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz", mmap=True)
+        assert len(df.index) == 40000
+        assert list(df) == sfp.particleops.COLUMNS
+
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-09-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-12-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-21-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-27-02+00-00"
+    ])
+    def test_read_evt_invalid_mmap(self, path):
+        with pytest.raises(sfp.errors.FileError):
+            _df = sfp.fileio.read_evt_labview(path, mmap=True)
+
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+    ])
+    def test_read_labview_blocks(self, path):
+        full_df = sfp.fileio.read_labview(path, sfp.particleops.COLUMNS)
+        blocks = list(sfp.fileio.read_labview_blocks(path, sfp.particleops.COLUMNS, block_rows=15000))
+        assert [len(b.index) for b in blocks] == [15000, 15000, 10000]
+        npt.assert_array_equal(pd.concat(blocks, ignore_index=True), full_df)
+
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-09-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-12-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-21-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-27-02+00-00"
+    ])
+    def test_read_labview_blocks_invalid(self, path):
+        with pytest.raises(sfp.errors.FileError):
+            _blocks = list(sfp.fileio.read_labview_blocks(path, sfp.particleops.COLUMNS))
+
+    def test_read_labview_blocks_truncated_gz(self, tmpout):
+        truncpath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00.gz")
+        with open("tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz", "rb") as infh:
+            with open(truncpath, "wb") as outfh:
+                outfh.write(infh.read(400000))
+        with pytest.raises(sfp.errors.FileError):
+            _blocks = list(sfp.fileio.read_labview_blocks(truncpath, sfp.particleops.COLUMNS))
+
+    def test_read_evt_multimember_gz(self, tmpout):
+        data = open("tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00", "rb").read()
+        multipath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-00-02+00-00.gz")
+        with open(multipath, "wb") as fh:
+            fh.write(gzip.compress(data[:100001]))
+            fh.write(gzip.compress(data[100001:]))
+        df = sfp.fileio.read_evt_labview(multipath)
+        npt.assert_array_equal(df, tmpout["evt_df"])
+
+    @pytest.mark.parametrize("codec", list(sfp.fileio.GZ_CODECS))
+    def test_read_evt_gz_codecs(self, tmpout, codec):
+        path = "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+        old_codec = sfp.fileio.get_gz_codec()
+        sfp.fileio.set_gz_codec(codec)
+        try:
+            df = sfp.fileio.read_evt_labview(path)
+            outpath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00.gz")
+            sfp.fileio.write_labview(df, outpath)
+        finally:
+            sfp.fileio.set_gz_codec(old_codec)
+        assert len(df.index) == 40000
+        with gzip.open(path, "rb") as fh:
+            npt.assert_array_equal(df, sfp.fileio.read_evt_labview(path[:-3], fileobj=io.BytesIO(fh.read())))
+        npt.assert_array_equal(df, sfp.fileio.read_evt_labview(outpath))
+
+    @pytest.mark.parametrize("ext", [".zst", ".lz4"])
+    def test_read_evt_zst_lz4(self, tmpout, ext):
+        pytest.importorskip("zstandard" if ext == ".zst" else "lz4")
+        path = os.path.join(tmpout["tmpdir"], "2014_185", "2014-07-04T00-00-02+00-00" + ext)
+        sfp.fileio.write_labview(tmpout["evt_df"], path)
+        assert sfp.seaflowfile.find_evt_files(tmpout["tmpdir"]) == [path]
+        df = sfp.fileio.read_evt_labview(path, mmap=True)
+        npt.assert_array_equal(df, tmpout["evt_df"])
+        # Frame headers can't catch truncation, so zstd/lz4 need a full parse
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.validate_labview_size(path, sfp.particleops.COLUMNS)
+
+    @pytest.mark.parametrize("ext", [".zst", ".lz4"])
+    def test_read_evt_truncated_zst_lz4(self, tmpout, ext):
+        pytest.importorskip("zstandard" if ext == ".zst" else "lz4")
+        path = os.path.join(tmpout["tmpdir"], "2014-07-04T00-00-02+00-00" + ext)
+        sfp.fileio.write_labview(tmpout["evt_df"], path)
+        with open(path, "rb") as fh:
+            data = fh.read()
+        with open(path, "wb") as fh:
+            fh.write(data[:len(data) // 2])
+        with pytest.raises(sfp.errors.FileError):
+            _df = sfp.fileio.read_evt_labview(path)
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.validate_labview_size(path, sfp.particleops.COLUMNS)
+
+    def test_evt_archive(self, tmpout):
+        archive = os.path.join(tmpout["tmpdir"], "archive")
+        evt_files = sfp.seaflowfile.find_evt_files("tests/testcruise_evt")
+        results = sfp.fileio.write_evt_archive(evt_files, archive)
+        assert [r["events"] for r in results] == [40000, 40000, 0, 0, 0, 40000, 40000, 0, 0]
+        assert [bool(r["error"]) for r in results] == [r["events"] == 0 for r in results]
+        assert os.listdir(archive) == ["2014_185"]
+
+        archive_files = sfp.fileio.find_evt_archive_files(archive)
+        good_files = [f for f, r in zip(evt_files, results) if not r["error"]]
+        assert [sfp.seaflowfile.SeaFlowFile(f).file_id for f in archive_files] == \
+            [sfp.seaflowfile.SeaFlowFile(f).file_id for f in good_files]
+        for archive_path, path in zip(archive_files, good_files):
+            assert sfp.fileio.is_evt_archive_path(archive_path)
+            assert sfp.fileio.read_labview_row_count(archive_path) == 40000
+            npt.assert_array_equal(
+                sfp.fileio.read_evt_labview(archive_path),
+                sfp.fileio.read_evt_labview(path)
+            )
+        with pytest.raises(sfp.errors.FileError):
+            _df = sfp.fileio.read_evt_labview(os.path.join(archive, "2014_185", "2014-07-04T00-06-02+00-00"))
+
+        columns = ["fsc_small", "pe"]
+        many = sfp.fileio.read_evt_many(archive_files, columns=columns)
+        npt.assert_array_equal(many["df"], sfp.fileio.read_evt_many(good_files, columns=columns)["df"])
+
+        df = sfp.fileio.read_evt_archive(archive, columns=columns)
+        assert list(df) == ["date", "file_id"] + columns
+        npt.assert_array_equal(df[columns], many["df"])
+        assert df["date"].unique().tolist() == [sfp.seaflowfile.SeaFlowFile(f).date for f in good_files]
+
+    def test_evt_cache(self, tmpout):
+        cache_dir = os.path.join(tmpout["tmpdir"], "cache")
+        path = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00.gz")
+        shutil.copyfile("tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz", path)
+        answer = sfp.fileio.read_evt_labview(path)
+        sfp.evtcache.enable(cache_dir)
+        try:
+            assert sfp.evtcache.get(path) is None
+            npt.assert_array_equal(sfp.fileio.read_evt_labview(path), answer)
+            assert sfp.evtcache.get(path) is not None
+            # Served from the cache
+            df = sfp.fileio.read_evt_labview(path, columns=["pe", "D1"], dtype=np.uint16)
+            npt.assert_array_equal(df, answer[["pe", "D1"]])
+            assert df.values.flags.writeable
+            many = sfp.fileio.read_evt_many([path, path])
+            npt.assert_array_equal(many["df"], pd.concat([answer, answer]))
+            # Modified files get a new cache entry
+            sfp.fileio.write_labview(answer.head(10), path)
+            assert sfp.evtcache.get(path) is None
+            npt.assert_array_equal(sfp.fileio.read_evt_labview(path), answer.head(10))
+            assert len(os.listdir(cache_dir)) == 2
+            # Least recently used entry is evicted first
+            sfp.evtcache.evict(max_bytes=os.path.getsize(sfp.evtcache.entry_path(path)))
+            assert os.listdir(cache_dir) == [os.path.basename(sfp.evtcache.entry_path(path))]
+            sfp.evtcache.clear()
+            assert os.listdir(cache_dir) == []
+        finally:
+            sfp.evtcache.disable()
+
+    def test_evt_cache_put_evicts(self, tmpout):
+        cache_dir = os.path.join(tmpout["tmpdir"], "cache")
+        paths = [os.path.join(tmpout["tmpdir"], "a"), os.path.join(tmpout["tmpdir"], "b")]
+        for p in paths:
+            shutil.copyfile("tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00", p)
+        answer = sfp.fileio.read_evt_labview(paths[0])
+        sfp.evtcache.enable(cache_dir)
+        try:
+            sfp.fileio.read_evt_labview(paths[0])
+            entry_bytes = os.path.getsize(sfp.evtcache.entry_path(paths[0]))
+            # Re-enabling seeds the running total from disk
+            sfp.evtcache.enable(cache_dir, max_bytes=entry_bytes)
+            assert len(os.listdir(cache_dir)) == 1
+            # Second put pushes the running total over the limit
+            npt.assert_array_equal(sfp.fileio.read_evt_labview(paths[1]), answer)
+            assert os.listdir(cache_dir) == [os.path.basename(sfp.evtcache.entry_path(paths[1]))]
+        finally:
+            sfp.evtcache.clear()
+            sfp.evtcache.disable()
+
+    def test_evt_memory_cache(self):
+        paths = [
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+        ]
+        answers = [sfp.fileio.read_evt_labview(p) for p in paths]
+        entry_bytes = 40000 * len(sfp.particleops.COLUMNS) * 2
+        sfp.evtcache.enable_memory(max_bytes=entry_bytes)
+        sfp.evtcache.reset_stats()
+        try:
+            for _ in range(3):
+                npt.assert_array_equal(sfp.fileio.read_evt_labview(paths[0]), answers[0])
+            stats = sfp.evtcache.stats()
+            assert (stats["misses"], stats["memory_hits"]) == (1, 2)
+            assert (stats["memory_entries"], stats["memory_bytes"]) == (1, entry_bytes)
+            # Byte budget only fits one file, first file is evicted
+            df = sfp.fileio.read_evt_labview(paths[1], columns=["pe"], dtype=np.uint16)
+            npt.assert_array_equal(df, answers[1][["pe"]])
+            df["pe"] = 0  # returned data is not the cached array
+            npt.assert_array_equal(sfp.fileio.read_evt_labview(paths[1]), answers[1])
+            npt.assert_array_equal(sfp.fileio.read_evt_labview(paths[0]), answers[0])
+            stats = sfp.evtcache.stats()
+            assert (stats["misses"], stats["memory_hits"]) == (3, 3)
+            assert (stats["memory_entries"], stats["memory_bytes"]) == (1, entry_bytes)
+        finally:
+            sfp.evtcache.disable_memory()
+
+    def test_set_gz_codec_unknown(self):
+        with pytest.raises(ValueError):
+            sfp.fileio.set_gz_codec("foo")
+
+    @pytest.mark.parametrize("codec", list(sfp.fileio.GZ_CODECS))
+    def test_write_evt_gz_parallel(self, tmpout, codec, monkeypatch):
+        # Small blocks to write many gzip members
+        monkeypatch.setattr(sfp.fileio, "GZ_BLOCK_SIZE", 100000)
+        monkeypatch.setattr(sfp.fileio, "_gz_codec", codec)
+        monkeypatch.setattr(sfp.fileio, "_gz_level", 1)
+        monkeypatch.setattr(sfp.fileio, "_gz_threads", 3)
+        outpath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-00-02+00-00.gz")
+        sfp.fileio.write_labview(tmpout["evt_df"], outpath)
+        with open(outpath, "rb") as fh:
+            data = gzip.decompress(fh.read())
+        assert len(data) == 4 + 40000 * 12 * 2
+        npt.assert_array_equal(tmpout["evt_df"], sfp.fileio.read_evt_labview(outpath))
+
+        emptypath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00.gz")
+        with sfp.fileio.file_open_w(emptypath) as fh:
+            pass
+        with open(emptypath, "rb") as fh:
+            assert gzip.decompress(fh.read()) == b""
+
+    def test_write_labview_blocks(self, tmpout):
+        df = tmpout["evt_df"]
+        path1 = os.path.join(tmpout["tmpdir"], "2014-07-04T00-00-02+00-00")
+        path2 = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00")
+        sfp.fileio.write_labview(df, path1)
+        sfp.fileio.write_labview(df, path2, block_rows=7)
+        with open(path1, "rb") as fh1, open(path2, "rb") as fh2:
+            data = fh1.read()
+            assert data == fh2.read()
+        expected = np.hstack([
+            np.full((len(df.index), 1), 10, dtype=np.uint16),
+            np.zeros((len(df.index), 1), dtype=np.uint16),
+            df.values.astype(np.uint16)
+        ])
+        assert data == np.array([len(df.index)], np.uint32).tobytes() + expected.tobytes()
+        with pytest.raises(ValueError):
+            sfp.fileio.write_labview(df, path1, block_rows=0)
+
+    def test_set_gz_level_threads_invalid(self):
+        with pytest.raises(ValueError):
+            sfp.fileio.set_gz_level(10)
+        with pytest.raises(ValueError):
+            sfp.fileio.set_gz_threads(0)
+
+    def test_gz_default_codec(self):
+        assert sfp.fileio.get_gz_codec() == "zlib"
+
+    def test_set_gz_level_above_codec_max(self, monkeypatch):
+        monkeypatch.setitem(sfp.fileio.GZ_CODECS, "low", dict(sfp.fileio.GZ_CODECS["zlib"], max_level=3))
+        monkeypatch.setattr(sfp.fileio, "_gz_codec", "low")
+        monkeypatch.setattr(sfp.fileio, "_gz_level", None)
+        # Default level is lowered to the codec maximum
+        assert sfp.fileio._gz_compresslevel("low") == 3
+        with pytest.raises(ValueError):
+            sfp.fileio.set_gz_level(9)
+        with pytest.raises(ValueError):
+            sfp.fileio.ParallelGzipWriter(io.BytesIO(), level=9)
+        monkeypatch.setattr(sfp.fileio, "_gz_codec", "zlib")
+        sfp.fileio.set_gz_level(9)
+        with pytest.raises(ValueError):
+            sfp.fileio.set_gz_codec("low")
+        assert sfp.fileio.get_gz_codec() == "zlib"
+
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+    ])
+    @pytest.mark.parametrize("mmap", [False, True])
+    def test_read_evt_columns(self, path, mmap):
+        columns = ["fsc_small", "pe", "D1"]
+        df = sfp.fileio.read_evt_labview(path, mmap=mmap, columns=columns)
+        assert list(df) == columns
+        assert len(df.index) == 40000
+        npt.assert_array_equal(df, sfp.fileio.read_evt_labview(path)[columns])
+
+    def test_read_evt_columns_unknown(self):
+        with pytest.raises(ValueError):
+            _df = sfp.fileio.read_evt_labview(
+                "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+                columns=["fsc_small", "foo"]
+            )
+
+    def test_read_opp_columns(self):
+        path = "tests/testcruise_opp/2014_185/2014-07-04T00-00-02+00-00.opp.gz"
+        columns = ["D1", "D2", "fsc_small"]
+        df = sfp.fileio.read_opp_labview(path, columns=columns)
+        assert list(df) == columns + ["noise", "saturated", "q2.5", "q50", "q97.5"]
+        npt.assert_array_equal(df, sfp.fileio.read_opp_labview(path)[list(df)])
+
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float32, np.float64])
+    @pytest.mark.parametrize("mmap", [False, True])
+    def test_read_evt_dtype(self, dtype, mmap):
+        path = "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"
+        df = sfp.fileio.read_evt_labview(path, mmap=mmap, dtype=dtype)
+        assert list(df) == sfp.particleops.COLUMNS
+        assert (df.dtypes == dtype).all()
+        npt.assert_array_equal(df, sfp.fileio.read_evt_labview(path))
+
+    def test_read_evt_dtype_invalid(self):
+        with pytest.raises(ValueError):
+            _df = sfp.fileio.read_evt_labview(
+                "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+                dtype=np.int8
+            )
+
+    def test_read_opp_dtype(self):
+        path = "tests/testcruise_opp/2014_185/2014-07-04T00-00-02+00-00.opp.gz"
+        df = sfp.fileio.read_opp_labview(path, dtype=np.uint16)
+        assert (df[sfp.particleops.COLUMNS].dtypes == np.uint16).all()
+        npt.assert_array_equal(df, sfp.fileio.read_opp_labview(path))
+
+    @pytest.mark.parametrize("mmap", [False, True])
+    def test_read_evt_many(self, mmap):
+        paths = [
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            "tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00",  # empty
+            "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz",
+            "tests/testcruise_evt/2014_185/2014-07-04T00-21-02+00-00",  # extra data
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"
+        ]
+        columns = ["D1", "D2", "fsc_small"]
+        results = sfp.fileio.read_evt_many(paths, mmap=mmap, columns=columns, dtype=np.uint16)
+        assert list(results["offsets"]) == [0, 40000, 40000, 80000, 80000, 120000]
+        assert [bool(e) for e in results["errors"]] == [False, True, False, True, False]
+        file_id = results["file_id"]
+        assert len(file_id) == 120000
+        assert list(file_id.categories) == sorted(set([paths[0], paths[2]]))
+        assert (file_id[:40000] == paths[0]).all()
+        assert (file_id[40000:80000] == paths[2]).all()
+        assert (file_id[80000:] == paths[4]).all()
+        df = results["df"]
+        assert list(df) == columns
+        assert (df.dtypes == np.uint16).all()
+        expected = pd.concat(
+            [sfp.fileio.read_evt_labview(paths[i], columns=columns) for i in [0, 2, 4]],
+            ignore_index=True
+        )
+        npt.assert_array_equal(df, expected)
+
+    def test_read_evt_many_none_valid(self):
+        results = sfp.fileio.read_evt_many(["tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00"])
+        assert list(results["offsets"]) == [0, 0]
+        assert len(results["file_id"]) == 0
+        assert len(results["df"].index) == 0
+        assert list(results["df"]) == sfp.particleops.COLUMNS
+
+    def test_read_evt_many_file_ids(self):
+        paths = [
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            "tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00",  # empty
+            "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+        ]
+        results = sfp.fileio.read_evt_many(paths, columns=["D1"], file_ids=["a", "b", "c"])
+        assert list(results["file_id"].categories) == ["a", "c"]
+        assert list(results["file_id"].value_counts()) == [40000, 40000]
+        with pytest.raises(ValueError):
+            sfp.fileio.read_evt_many(paths, file_ids=["a"])
+
     def test_read_evt_empty(self):
         with pytest.raises(sfp.errors.FileError):
             _df = sfp.fileio.read_evt_labview("tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00")
@@ -109,6 +494,47 @@ class TestOpen:
         with pytest.raises(sfp.errors.FileError):
             _df = sfp.fileio.read_evt_labview("tests/testcruise_evt/2014_185/2014-07-04T00-27-02+00-00")
 
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz"
+    ])
+    def test_validate_labview_size_valid(self, path):
+        n = sfp.fileio.validate_labview_size(path, sfp.particleops.COLUMNS)
+        assert n == 40000
+
+    def test_validate_labview_size_valid_opp(self):
+        n = sfp.fileio.validate_labview_size(
+            "tests/testcruise_opp/2014_185/2014-07-04T00-00-02+00-00.opp.gz",
+            sfp.particleops.COLUMNS + ["bitflags"]
+        )
+        assert n == 426
+
+    @pytest.mark.parametrize("path", [
+        "tests/testcruise_evt/2014_185/2014-07-04T00-06-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-09-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-12-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-21-02+00-00",
+        "tests/testcruise_evt/2014_185/2014-07-04T00-27-02+00-00"
+    ])
+    def test_validate_labview_size_invalid(self, path):
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.validate_labview_size(path, sfp.particleops.COLUMNS)
+
+    def test_validate_labview_size_wrong_columns(self):
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.validate_labview_size(
+                "tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz",
+                sfp.particleops.COLUMNS + ["bitflags"]
+            )
+
+    def test_validate_labview_size_truncated_gz(self, tmpout):
+        truncpath = os.path.join(tmpout["tmpdir"], "2014-07-04T00-03-02+00-00.gz")
+        with open("tests/testcruise_evt/2014_185/2014-07-04T00-03-02+00-00.gz", "rb") as infh:
+            with open(truncpath, "wb") as outfh:
+                outfh.write(infh.read(400000))
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.validate_labview_size(truncpath, sfp.particleops.COLUMNS)
+
     def test_read_labview_row_count_valid(self):
         n = sfp.fileio.read_labview_row_count("tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00")
         assert n == 40000
@@ -144,6 +570,72 @@ class TestVCT:
             [1.802998, 0.707794, 1.012014, 2.229999]
         )
 
+    def test_read_vct_csv_engines(self):
+        path = "tests/testcruise_vct/50/2014_185/2014-07-04T00-00-02+00-00.vct.gz"
+        expected = pd.read_csv(path, sep=" ", names=sfp.fileio.VCT_COLUMNS)
+        for engine in sfp.fileio.VCT_CSV_ENGINES:
+            df = sfp.fileio.read_vct_csv(path, engine=engine)
+            pd.testing.assert_frame_equal(df, expected)
+        with pytest.raises(ValueError):
+            sfp.fileio.read_vct_csv(path, engine="foo")
+        with pytest.raises(ValueError):
+            sfp.fileio.set_vct_csv_engine("foo")
+
+    def test_read_vct_dir_and_parquet(self, tmpout):
+        src = "tests/testcruise_vct/50/2014_185/2014-07-04T00-00-02+00-00.vct.gz"
+        vct_dir = os.path.join(tmpout["tmpdir"], "vct")
+        for q in ["2.5", "50", "97.5"]:
+            daydir = os.path.join(vct_dir, q, "2014_185")
+            os.makedirs(daydir)
+            for t in ["00-00-02", "00-03-02"]:
+                shutil.copy(src, os.path.join(daydir, "2014-07-04T{}+00-00.vct.gz".format(t)))
+        vct = sfp.fileio.read_vct_csv(src)
+
+        df = sfp.fileio.read_vct_dir(vct_dir, jobs=2)
+        assert len(df.index) == 6 * len(vct.index)
+        assert list(df.columns) == ["date", "file_id", "quantile"] + sfp.fileio.VCT_COLUMNS
+        assert list(df["quantile"].cat.categories) == ["2.5", "50", "97.5"]
+        assert df["pop"].dtype.name == "category"
+        assert list(df["pop"].cat.categories) == sorted(vct["pop"].unique())
+        assert list(df["file_id"].cat.categories) == [
+            "2014_185/2014-07-04T00-00-02+00-00",
+            "2014_185/2014-07-04T00-03-02+00-00"
+        ]
+        df50 = sfp.fileio.read_vct_dir(vct_dir, quantiles=[50])
+        assert list(df50["quantile"].unique()) == ["50"]
+        with pytest.raises(ValueError):
+            sfp.fileio.read_vct_dir(vct_dir, quantiles=[10])
+
+        out = os.path.join(tmpout["tmpdir"], "vct.parquet")
+        assert sfp.fileio.write_vct_parquet(vct_dir, out) == len(df.index)
+        assert os.path.isdir(os.path.join(out, "quantile=2.5"))
+        with pytest.raises(sfp.errors.FileError):
+            sfp.fileio.write_vct_parquet(vct_dir, out)
+        pq = sfp.fileio.read_vct_parquet(out)
+        pd.testing.assert_frame_equal(pq.astype(str), df.astype(str))
+
+        sel = sfp.fileio.read_vct_parquet(
+            out, quantile=97.5, file_ids=["2014_185/2014-07-04T00-03-02+00-00"],
+            columns=["file_id", "diam_mid", "pop"]
+        )
+        assert list(sel.columns) == ["file_id", "diam_mid", "pop"]
+        assert list(sel["file_id"].cat.categories) == ["2014_185/2014-07-04T00-03-02+00-00"]
+        npt.assert_array_equal(sel["diam_mid"].values, vct["diam_mid"].values)
+
+    def test_write_vct_parquet_stale_tmpdir(self, tmpout):
+        src = "tests/testcruise_vct/50/2014_185/2014-07-04T00-00-02+00-00.vct.gz"
+        vct_dir = os.path.join(tmpout["tmpdir"], "vct")
+        daydir = os.path.join(vct_dir, "50", "2014_185")
+        os.makedirs(daydir)
+        shutil.copy(src, os.path.join(daydir, "2014-07-04T00-00-02+00-00.vct.gz"))
+        out = os.path.join(tmpout["tmpdir"], "vct.parquet")
+        # Leftover partial dataset from a failed run
+        assert sfp.fileio.write_vct_parquet(vct_dir, out) > 0
+        os.rename(out, out + ".tmp")
+        n = sfp.fileio.write_vct_parquet(vct_dir, out)
+        assert not os.path.exists(out + ".tmp")
+        assert len(sfp.fileio.read_vct_parquet(out).index) == n
+
 class TestFilter:
     def test_mark_focused_no_params(self, evt_df):
         with pytest.raises(ValueError):
@@ -162,9 +654,10 @@ class TestFilter:
         assert not (new_evt_df is evt_df)  # returned a new dataframe
         assert orig_df.equals(evt_df)  # original dataframe is the unmodified
         assert len(new_evt_df.index) == 40000
-        assert len(new_evt_df[new_evt_df["q2.5"]].index) == 423
-        assert len(new_evt_df[new_evt_df["q50"]].index) == 107
-        assert len(new_evt_df[new_evt_df["q97.5"]].index) == 85
+        assert new_evt_df["bitflags"].dtype == np.uint8
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q2.5"]) > 0).sum() == 423
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q50"]) > 0).sum() == 107
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q97.5"]) > 0).sum() == 85
         assert len(sfp.particleops.select_focused(new_evt_df).index) == 426
 
     def test_mark_focused_with_set_params_inplace(self, evt_df, params, benchmark):
@@ -175,11 +668,111 @@ class TestFilter:
         assert new_evt_df is evt_df  # returned the same dataframe
         assert not orig_df.equals(evt_df)  # original dataframe is the modified
         assert len(new_evt_df.index) == 40000
-        assert len(new_evt_df[new_evt_df["q2.5"]].index) == 423
-        assert len(new_evt_df[new_evt_df["q50"]].index) == 107
-        assert len(new_evt_df[new_evt_df["q97.5"]].index) == 85
+        assert new_evt_df["bitflags"].dtype == np.uint8
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q2.5"]) > 0).sum() == 423
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q50"]) > 0).sum() == 107
+        assert ((new_evt_df["bitflags"] & sfp.particleops.flags["q97.5"]) > 0).sum() == 85
         assert len(sfp.particleops.select_focused(new_evt_df).index) == 426
 
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float32])
+    def test_mark_focused_dtype(self, evt_df, params, dtype):
+        expected = sfp.particleops.mark_focused(evt_df, params)
+        narrow_df = sfp.fileio.read_evt_labview(
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            mmap=True,
+            dtype=dtype
+        )
+        new_evt_df = sfp.particleops.mark_focused(narrow_df, params)
+        assert (new_evt_df[sfp.particleops.COLUMNS].dtypes == dtype).all()
+        npt.assert_array_equal(new_evt_df["bitflags"], expected["bitflags"])
+        opp_df = sfp.particleops.select_focused(new_evt_df)
+        assert len(opp_df.index) == 426
+        npt.assert_array_equal(opp_df, sfp.particleops.select_focused(expected))
+
+    @pytest.mark.parametrize("backend", sfp.particleops.FOCUS_BACKENDS)
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float32, np.float64])
+    def test_focus_flags_backends(self, params, backend, dtype, monkeypatch):
+        # Small blocks to cover partial final blocks in numpy and numexpr backends
+        monkeypatch.setattr(sfp.particleops, "FOCUS_BLOCK_ROWS", 7777)
+        df = sfp.fileio.read_evt_labview(
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            dtype=dtype
+        )
+        flags, quantiles = sfp.particleops.focus_flags(df, params, backend=backend)
+        assert flags.dtype == np.uint8
+        assert quantiles == [2.5, 50.0, 97.5]
+        npt.assert_array_equal((flags & sfp.particleops.NOISE_FLAG) > 0, sfp.particleops.mark_noise(df))
+        npt.assert_array_equal((flags & sfp.particleops.SATURATED_FLAG) > 0, sfp.particleops.mark_saturated(df))
+        assert ((flags & sfp.particleops.NOISE_FLAG) > 0).sum() == 72
+        assert ((flags & sfp.particleops.SATURATED_FLAG) > 0).sum() == 211
+        assert ((flags & sfp.particleops.flags["q2.5"]) > 0).sum() == 423
+        assert ((flags & sfp.particleops.flags["q50"]) > 0).sum() == 107
+        assert ((flags & sfp.particleops.flags["q97.5"]) > 0).sum() == 85
+        assert ((flags & sfp.particleops.QUANTILE_FLAGS_MASK) > 0).sum() == 426
+
+    @pytest.mark.parametrize("backend", sfp.particleops.FOCUS_BACKENDS)
+    def test_focus_flags_integer(self, params, backend, monkeypatch):
+        monkeypatch.setattr(sfp.particleops, "FOCUS_BLOCK_ROWS", 7777)
+        df = sfp.fileio.read_evt_labview(
+            "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",
+            dtype=np.uint16
+        )
+        expected, _ = sfp.particleops.focus_flags(df, params, backend=backend, integer=False)
+        flags, _ = sfp.particleops.focus_flags(df, params, backend=backend, integer=True)
+        npt.assert_array_equal(flags, expected)
+
+        # Random particles and parameters, with many notch lines landing
+        # exactly on integers where float64 rounding decides the result.
+        rng = np.random.default_rng(0)
+        n = 100000
+        df = pd.DataFrame({c: rng.integers(0, 2**16, n, dtype=np.uint16) for c in ["D1", "fsc_small"]})
+        df["D2"] = np.clip(df["D1"].astype(np.int32) + rng.integers(-3000, 3000, n), 0, 2**16 - 1).astype(np.uint16)
+        random_params = params.copy()
+        for col in [c for c in params.columns if c.startswith("notch")]:
+            random_params[col] = rng.uniform(0.2, 2.5, len(params.index)).round(3)
+        for col in [c for c in params.columns if c.startswith("offset")]:
+            random_params[col] = rng.uniform(-20000, 20000, len(params.index)).round(1)
+        expected, _ = sfp.particleops.focus_flags(df, random_params, backend=backend, integer=False)
+        flags, _ = sfp.particleops.focus_flags(df, random_params, backend=backend, integer=True)
+        assert ((expected & sfp.particleops.QUANTILE_FLAGS_MASK) > 0).sum() > 0
+        npt.assert_array_equal(flags, expected)
+
+    def test_focus_flags_integer_invalid(self, evt_df, params):
+        # float64 data
+        with pytest.raises(ValueError):
+            sfp.particleops.focus_flags(evt_df, params, integer=True)
+        # Non-integer width
+        uint_df = evt_df.astype(np.uint16)
+        frac_params = params.assign(width=2500.5)
+        with pytest.raises(ValueError):
+            sfp.particleops.focus_flags(uint_df, frac_params, integer=True)
+        npt.assert_array_equal(
+            sfp.particleops.focus_flags(uint_df, frac_params)[0],
+            sfp.particleops.focus_flags(evt_df, frac_params)[0]
+        )
+
+    @pytest.mark.parametrize("backend", sfp.particleops.FOCUS_BACKENDS)
+    def test_focus_flags_empty(self, evt_df, params, backend):
+        flags, _ = sfp.particleops.focus_flags(evt_df.head(0), params, backend=backend)
+        assert flags.dtype == np.uint8
+        assert len(flags) == 0
+
+    def test_focus_backend_invalid(self, evt_df, params):
+        with pytest.raises(ValueError):
+            sfp.particleops.set_focus_backend("fortran")
+        with pytest.raises(ValueError):
+            sfp.particleops.focus_flags(evt_df, params, backend="fortran")
+
+    @pytest.mark.benchmark(group="evt-focus")
+    @pytest.mark.parametrize("backend", sfp.particleops.FOCUS_BACKENDS)
+    @pytest.mark.parametrize("integer", [False, True])
+    def test_focus_flags_benchmark(self, evt_df, params, backend, integer, benchmark):
+        evt_df = evt_df.astype(np.uint16)
+        # Compile numba kernel before timing
+        sfp.particleops.focus_flags(evt_df, params, backend=backend, integer=integer)
+        flags, _ = benchmark(sfp.particleops.focus_flags, evt_df, params, backend=backend, integer=integer)
+        assert ((flags & sfp.particleops.QUANTILE_FLAGS_MASK) > 0).sum() == 426
+
     def test_noise_filter(self, evt_df):
         """Events with zeroes in all of D1, D2, and fsc_small are noise"""
         # There are events which could be considered noise (no signal in any of
@@ -226,6 +819,125 @@ class TestFilter:
         )
         assert sfp.particleops.all_quantiles(df) == False
 
+    def test_all_quantiles_bitflags(self):
+        df = pd.DataFrame({"x": [1, 2, 3], "bitflags": np.array([3, 6, 64], dtype=np.uint8)})
+        assert sfp.particleops.all_quantiles(df) == True
+        df = pd.DataFrame({"x": [1, 2, 3], "bitflags": np.array([3, 2, 128], dtype=np.uint8)})
+        assert sfp.particleops.all_quantiles(df) == False
+
+    def test_quantile_subset_params(self, evt_df, params, tmpout):
+        """Only quantiles in filter parameters are used"""
+        params50 = params[params["quantile"] == 50.0]
+        for df in [evt_df, sfp.particleops.ParticleBatch.from_pandas(evt_df)]:
+            df = sfp.particleops.mark_focused(df, params50)
+            assert sfp.particleops.marked_quantiles(df) == ["q50"]
+            assert [q_col for q_col, _, _, _ in sfp.particleops.quantile_masks(df)] == ["q50"]
+            assert sfp.particleops.all_quantiles(df)
+            opp = sfp.particleops.select_focused(df)
+            assert sfp.particleops.all_quantiles(opp)
+            if isinstance(opp, sfp.particleops.ParticleBatch):
+                opp = opp.to_pandas()
+            assert list(sfp.particleops.decode_bit_flags(opp).columns) == sfp.particleops.COLUMNS + ["q50"]
+        vals = sfp.db.prep_opp(tmpout["evt_path"], opp, len(evt_df.index), len(evt_df.index), "id")
+        assert [v["quantile"] for v in vals] == [50.0]
+        sfp.fileio.write_opp_labview(opp, tmpout["evt_path"], tmpout["oppdir"])
+        assert len(sfp.seaflowfile.find_evt_files(tmpout["oppdir"], opp=True)) == 1
+
+        # Data without recorded quantiles, e.g. read from OPP files, has all
+        # quantiles
+        opp.attrs.clear()
+        assert sfp.particleops.marked_quantiles(opp) == list(sfp.particleops.flags)
+        assert not sfp.particleops.all_quantiles(opp)
+
+    def test_bitflags_matches_bool_columns(self, evt_df, params):
+        df = sfp.particleops.mark_focused(evt_df, params)
+        bool_df = sfp.particleops.decode_bit_flags(df)
+        for (q_col, q, _, mask), (b_col, b_q, _, b_mask) in zip(
+            sfp.particleops.quantile_masks(df), sfp.particleops.quantile_masks(bool_df)
+        ):
+            assert (q_col, q) == (b_col, b_q)
+            npt.assert_array_equal(mask, b_mask)
+        npt.assert_array_equal(
+            sfp.particleops.select_focused(df)[sfp.particleops.COLUMNS],
+            sfp.particleops.select_focused(bool_df)[sfp.particleops.COLUMNS]
+        )
+
+
+class TestParticleBatch:
+    def test_pandas_round_trip(self, evt_df):
+        batch = sfp.particleops.ParticleBatch.from_pandas(evt_df, file_id="x")
+        assert batch.columns == list(evt_df.columns)
+        assert len(batch) == 40000
+        assert np.shares_memory(batch["D1"], evt_df["D1"].values)
+        df = batch.to_pandas()
+        pd.testing.assert_frame_equal(df, evt_df)
+        df = batch.to_pandas(metadata=True)
+        assert list(df.columns) == list(evt_df.columns) + ["date", "file_id"]
+        assert (df["file_id"] == "x").all()
+
+    def test_pickle(self, evt_df):
+        batch = sfp.particleops.ParticleBatch.from_pandas(evt_df, file_id="x", date=pd.Timestamp("2014-07-04"))
+        batch.quantiles = ["q50"]
+        new = pickle.loads(pickle.dumps(batch))
+        assert (new.file_id, new.date, new.quantiles) == (batch.file_id, batch.date, batch.quantiles)
+        pd.testing.assert_frame_equal(new.to_pandas(), batch.to_pandas())
+
+    def test_batch_columns_same_length(self):
+        batch = sfp.particleops.ParticleBatch({"a": np.arange(3)})
+        with pytest.raises(ValueError):
+            batch["b"] = np.arange(4)
+        with pytest.raises(ValueError):
+            batch["b"] = np.zeros((3, 2))
+        batch["b"] = 1
+        npt.assert_array_equal(batch["b"], [1, 1, 1])
+        assert len(sfp.particleops.ParticleBatch({})) == 0
+
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float64])
+    def test_read_evt_labview_batch(self, dtype):
+        path = "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"
+        df = sfp.fileio.read_evt_labview(path, dtype=dtype)
+        batch = sfp.fileio.read_evt_labview(path, dtype=dtype, batch=True)
+        assert batch.file_id == "2014_185/2014-07-04T00-00-02+00-00"
+        assert batch.date == pd.Timestamp("2014-07-04T00:00:02+00:00")
+        assert all(batch[c].dtype == dtype for c in batch)
+        pd.testing.assert_frame_equal(batch.to_pandas(), df)
+
+    def test_filter_batch(self, params):
+        path = "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"
+        df = sfp.fileio.read_evt_labview(path, dtype=np.uint16)
+        batch = sfp.fileio.read_evt_labview(path, dtype=np.uint16, batch=True)
+        batch = sfp.particleops.mark_focused(batch, params)
+        assert "bitflags" in batch
+        opp = sfp.particleops.select_focused(batch)
+        assert isinstance(opp, sfp.particleops.ParticleBatch)
+        assert len(opp) == 426
+        assert sfp.particleops.all_quantiles(opp)
+        expected = sfp.particleops.select_focused(sfp.particleops.mark_focused(df, params))
+        pd.testing.assert_frame_equal(opp.to_pandas(), expected.reset_index(drop=True))
+
+    def test_read_opp_labview_batch(self, tmpout, params):
+        sfile = sfp.seaflowfile.SeaFlowFile(tmpout["evt_path"])
+        df = sfp.particleops.mark_focused(tmpout["evt_df"], params)
+        df = sfp.particleops.select_focused(df)
+        sfp.fileio.write_opp_labview(df, sfile.file_id, tmpout["oppdir"])
+        opp_path = os.path.join(tmpout["oppdir"], sfile.file_id + ".opp.gz")
+        batch = sfp.fileio.read_opp_labview(opp_path, batch=True)
+        assert batch.file_id == sfile.file_id
+        assert batch["bitflags"].dtype == np.uint8
+        npt.assert_array_equal(batch.to_pandas(), df)
+
+    @pytest.mark.benchmark(group="evt-filter")
+    @pytest.mark.parametrize("batch", [False, True])
+    def test_filter_small_file(self, params, batch, benchmark):
+        path = "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00"
+        def filter_file():
+            evt = sfp.fileio.read_evt_labview(path, mmap=True, dtype=np.uint16, batch=batch)
+            evt = evt[:1000] if batch else evt.iloc[:1000]
+            evt = sfp.particleops.mark_focused(evt, params, inplace=True)
+            return sfp.particleops.select_focused(evt)
+        opp = benchmark(filter_file)
+        assert len(opp) > 0
+
 
 class TestTransform:
     def test_transform_four_values(self):
@@ -250,6 +962,56 @@ class TestTransform:
         with pytest.raises(AssertionError):
             npt.assert_array_equal(orig_df, t_df)
 
+    def test_transform_table(self):
+        # Table lookups must match direct exponentiation exactly
+        values = np.arange(2**16, dtype=np.uint16)
+        expected = 10**((values.astype(np.float64) / 2**16) * 3.5)
+        input_df = pd.DataFrame({"D1": values, "D2": values.astype(np.float64), "pe": values + 0.5})
+        t_df = sfp.particleops.transform_particles(input_df, columns=["D1", "D2", "pe"])
+        npt.assert_array_equal(t_df["D1"], expected)
+        npt.assert_array_equal(t_df["D2"], expected)
+        npt.assert_array_equal(t_df["pe"], 10**(((values + 0.5) / 2**16) * 3.5))
+        assert (t_df.dtypes == np.float64).all()
+
+    def test_transform_float32(self, evt_df):
+        t_df = sfp.particleops.transform_particles(evt_df, dtype=np.float32)
+        expected = sfp.particleops.transform_particles(evt_df)
+        cols = sfp.particleops.CHANNEL_COLUMNS
+        assert (t_df[cols].dtypes == np.float32).all()
+        npt.assert_array_equal(t_df[cols], expected[cols].astype(np.float32))
+        with pytest.raises(ValueError):
+            sfp.particleops.transform_particles(evt_df, dtype=np.int32)
+
+    def test_transform_keeps_float_dtype(self, evt_df):
+        cols = sfp.particleops.CHANNEL_COLUMNS
+        t_df = sfp.particleops.transform_particles(evt_df.astype(np.float32))
+        assert (t_df[cols].dtypes == np.float32).all()
+        expected = sfp.particleops.transform_particles(evt_df, dtype=np.float32)
+        npt.assert_array_equal(t_df[cols], expected[cols])
+        t_df = sfp.particleops.transform_particles(evt_df.astype(np.int32))
+        assert (t_df[cols].dtypes == np.float64).all()
+
+    def test_transform_nan_negative(self, recwarn):
+        values = np.array([-1.0, np.nan, 2**16, 100.0])
+        t_df = sfp.particleops.transform_particles(pd.DataFrame({"D1": values}), columns=["D1"])
+        npt.assert_array_equal(t_df["D1"], 10**((values / 2**16) * 3.5))
+        assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+
+    def test_transform_batch(self, evt_df):
+        batch = sfp.particleops.ParticleBatch.from_pandas(evt_df.astype(np.uint16))
+        t_batch = sfp.particleops.transform_particles(batch)
+        assert t_batch["D1"].dtype == np.float64
+        npt.assert_array_equal(batch["D1"], evt_df["D1"])  # unmodified
+        cols = sfp.particleops.CHANNEL_COLUMNS
+        pd.testing.assert_frame_equal(t_batch.to_pandas()[cols], sfp.particleops.transform_particles(evt_df)[cols])
+
+    @pytest.mark.benchmark(group="transform")
+    @pytest.mark.parametrize("dtype", [np.uint16, np.float64])
+    def test_transform_benchmark(self, evt_df, dtype, benchmark):
+        evt_df = evt_df.astype(dtype)
+        t_df = benchmark(sfp.particleops.transform_particles, evt_df)
+        assert t_df["fsc_small"].max() <= 10**3.5
+
 
 class TestOutput:
     def test_sqlite3_opp_counts_and_params(self, tmpout, params):
@@ -258,7 +1020,7 @@ class TestOutput:
         df = sfp.particleops.mark_focused(df, params, inplace=True)
 
         raw_count = len(df.index)
-        signal_count = len(df[df["noise"] == False].index)
+        signal_count = int(((df["bitflags"] & sfp.particleops.NOISE_FLAG) == 0).sum())
 
         vals = sfp.db.prep_opp(sf_file.file_id, df, raw_count, signal_count, "UUID")
         sfp.db.save_opp_to_db(vals, tmpout["db"])
@@ -266,7 +1028,7 @@ class TestOutput:
         sqlitedf = pd.read_sql_query("SELECT * FROM opp", con)
 
         try:
-            opp_evt_ratio = len(df[df["q50"]].index) / len(df[df["noise"] == False].index)
+            opp_evt_ratio = ((df["bitflags"] & sfp.particleops.flags["q50"]) > 0).sum() / signal_count
         except ZeroDivisionError:
             opp_evt_ratio = 0.0
 
@@ -285,7 +1047,7 @@ class TestOutput:
         df = sfp.particleops.mark_focused(df, params, inplace=True)
 
         raw_count = len(df.index)
-        signal_count = len(df[df["noise"] == False].index)
+        signal_count = int(((df["bitflags"] & sfp.particleops.NOISE_FLAG) == 0).sum())
 
         vals = sfp.db.prep_opp(sf_file.file_id, df, raw_count, signal_count, "UUID")
         sfp.db.save_opp_to_db(vals, tmpout["db"])
@@ -334,6 +1096,16 @@ class TestOutput:
         new_evt = gzip.open(out_evt_path).read()
         assert input_evt == new_evt
 
+    def test_binary_evt_output_uint16(self, tmpout):
+        sfile = sfp.seaflowfile.SeaFlowFile(tmpout["evt_path"])
+        evtdir = os.path.join(tmpout["tmpdir"], "evtdir")
+        evt_df = sfp.fileio.read_evt_labview(tmpout["evt_path"], dtype=np.uint16)
+        sfp.fileio.write_evt_labview(evt_df, sfile.file_id, evtdir, gz=False)
+        out_evt_path = os.path.join(evtdir, sfile.file_id)
+        input_evt = io.open(tmpout["evt_path"], "rb").read()
+        new_evt = io.open(out_evt_path, "rb").read()
+        assert input_evt == new_evt
+
     def test_binary_opp_output_None(self, tmpout):
         sfile = sfp.seaflowfile.SeaFlowFile(tmpout["evt_path"])
         oppdir = os.path.join(tmpout["tmpdir"], "oppdir")
@@ -347,7 +1119,7 @@ class TestOutput:
 
         df = tmpout["evt_df"]
         df = sfp.particleops.mark_focused(df, params, inplace=True)
-        # df should now have 5 new columns for noise, saturated, and 3 quantiles
+        # df should now have a new bitflags column
         # Write an opp file
         df = sfp.particleops.select_focused(df)
         sfp.fileio.write_opp_labview(df, sfile.file_id, tmpout["oppdir"], gz=False)
@@ -356,8 +1128,8 @@ class TestOutput:
         reread_opp_df = sfp.fileio.read_opp_labview(opp_path)
         # Should equal original df with only focused particles
         npt.assert_array_equal(
-            df,
-            reread_opp_df
+            sfp.particleops.decode_bit_flags(df),
+            reread_opp_df.drop(columns=["noise", "saturated"])
         )
 
     def test_binary_opp_output_gz(self, tmpout, params):
@@ -365,7 +1137,7 @@ class TestOutput:
 
         df = tmpout["evt_df"]
         df = sfp.particleops.mark_focused(df, params, inplace=True)
-        # df should now have 5 new columns for noise, saturated, and 3 quantiles
+        # df should now have a new bitflags column
         # Write an opp file
         df = sfp.particleops.select_focused(df)
         sfp.fileio.write_opp_labview(df, sfile.file_id, tmpout["oppdir"])
@@ -374,8 +1146,8 @@ class TestOutput:
         reread_opp_df = sfp.fileio.read_opp_labview(opp_path)
         # Should equal original df with only focused particles
         npt.assert_array_equal(
-            df,
-            reread_opp_df
+            sfp.particleops.decode_bit_flags(df),
+            reread_opp_df.drop(columns=["noise", "saturated"])
         )
 
 
@@ -392,6 +1164,178 @@ class TestMultiFileFilter(object):
         )
         multi_file_asserts(tmpout)
 
+    def test_multi_file_filter_prefetch(self, tmpout):
+        """Output should not depend on EVT read-ahead"""
+        outputs = []
+        for prefetch in [0, 3]:
+            outdir = os.path.join(tmpout["tmpdir"], f"prefetch{prefetch}")
+            os.mkdir(outdir)
+            db = os.path.join(outdir, "testcruise.db")
+            shutil.copyfile(tmpout["db"], db)
+            sfp.filterevt.filter_evt_files(
+                tmpout["file_dates"],
+                dbpath=db,
+                opp_dir=os.path.join(outdir, "opp"),
+                worker_count=1,
+                prefetch=prefetch
+            )
+            with sqlite3.connect(db) as con:
+                opp_table = pd.read_sql("SELECT * FROM opp ORDER BY file, quantile", con)
+            opp_df = pd.read_parquet(os.path.join(outdir, "opp", "2014-07-04T00-00-00+00-00.1H.opp.parquet"))
+            outputs.append((opp_table, opp_df))
+        pd.testing.assert_frame_equal(outputs[0][0], outputs[1][0])
+        pd.testing.assert_frame_equal(outputs[0][1], outputs[1][1])
+        assert len(outputs[0][0].index) == 21
+
+    def test_work_files_across_windows(self):
+        """Files are yielded across work items, with the last file of each marked"""
+        files_df = pd.DataFrame({"file_id": ["a", "b", "c"]})
+        works = [{"files_df": files_df.iloc[:2]}, {"files_df": files_df.iloc[:0]}, {"files_df": files_df.iloc[2:]}]
+        work_q = queue.Queue()
+        for w in works[1:]:
+            work_q.put(w)
+        work_q.put(sfp.filterevt.stop)
+        items = list(sfp.filterevt._work_files(works[0], work_q))
+        assert [(id(w), last) for w, last, _ in items] == \
+            [(id(works[0]), False), (id(works[0]), True), (id(works[1]), True), (id(works[2]), True)]
+        assert [r[1]["file_id"] if r else None for _, _, r in items] == ["a", "b", None, "c"]
+
+    def test_multi_file_filter_writers(self, tmpout):
+        """Output should not depend on the number of OPP file writers"""
+        outputs = []
+        for writer_count in [1, 3]:
+            outdir = os.path.join(tmpout["tmpdir"], f"writers{writer_count}")
+            os.mkdir(outdir)
+            db = os.path.join(outdir, "testcruise.db")
+            shutil.copyfile(tmpout["db"], db)
+            # Small windows to have more time windows than writers
+            sfp.filterevt.filter_evt_files(
+                tmpout["file_dates"],
+                dbpath=db,
+                opp_dir=os.path.join(outdir, "opp"),
+                worker_count=1,
+                window_size="3min",
+                writer_count=writer_count
+            )
+            with sqlite3.connect(db) as con:
+                opp_table = pd.read_sql("SELECT * FROM opp ORDER BY file, quantile", con)
+            opp_files = sorted(os.listdir(os.path.join(outdir, "opp")))
+            opp_df = sfp.fileio.read_opp_parquet(os.path.join(outdir, "opp"))
+            outputs.append((opp_table, opp_files, opp_df))
+        pd.testing.assert_frame_equal(outputs[0][0], outputs[1][0])
+        assert outputs[0][1] == outputs[1][1]
+        assert len(outputs[0][1]) == 2
+        pd.testing.assert_frame_equal(outputs[0][2], outputs[1][2])
+        with pytest.raises(ValueError):
+            sfp.filterevt.filter_evt_files(tmpout["file_dates"], dbpath=db, opp_dir=outdir, writer_count=0)
+
+    def test_do_write_bad_opp(self, tmpout):
+        """A bad OPP DataFrame is reported without stopping the writer"""
+        write_q, stats_q = queue.Queue(), queue.Queue()
+        write_q.put({
+            "window_start_date": pd.Timestamp("2014-07-04T00:00:00+00:00"),
+            "window_size": "1H",
+            "opp_dir": str(tmpout["oppdir"]),
+            "row_group_rows": None,
+            "parquet_engine": "fastparquet",
+            # Focused in all quantiles but missing particle columns
+            "opps": [(
+                "2014_185/2014-07-04T00-00-02+00-00",
+                sfp.particleops.ParticleBatch({"bitflags": np.array([7], dtype=np.uint8)})
+            )]
+        })
+        write_q.put(sfp.filterevt.stop)
+        sfp.filterevt.do_write(write_q, stats_q)
+        written = stats_q.get_nowait()
+        assert written["stage"] == "written"
+        assert len(written["errors"]) == 1
+
+    def test_wait_done_failed_process(self):
+        done_q = queue.Queue()
+        procs = [types.SimpleNamespace(name="ok", exitcode=None), types.SimpleNamespace(name="writer", exitcode=1)]
+        assert "writer" in sfp.filterevt.wait_done(done_q, procs, interval=0.01)
+        done_q.put(None)
+        assert sfp.filterevt.wait_done(done_q, procs, interval=0.01) is None
+
+    def test_read_opp_parquet(self, tmpout):
+        sfp.filterevt.filter_evt_files(
+            tmpout["file_dates"],
+            dbpath=tmpout["db"],
+            opp_dir=str(tmpout["oppdir"]),
+            worker_count=1
+        )
+        full = pd.read_parquet(os.path.join(tmpout["oppdir"], "2014-07-04T00-00-00+00-00.1H.opp.parquet"))
+        pd.testing.assert_frame_equal(sfp.fileio.read_opp_parquet(tmpout["oppdir"]), full)
+
+        df = sfp.fileio.read_opp_parquet(tmpout["oppdir"], quantile=50, columns=["fsc_small", "pe"])
+        pd.testing.assert_frame_equal(df, full.loc[full["q50"], ["fsc_small", "pe"]].reset_index(drop=True))
+
+        file_id = "2014_185/2014-07-04T00-03-02+00-00"
+        answer = full[(full["file_id"] == file_id) & full["q2.5"]].reset_index(drop=True)
+        answer = answer.drop(columns=["q2.5", "q50", "q97.5"])
+        answer["file_id"] = answer["file_id"].astype(str).astype("category")
+        df = sfp.fileio.read_opp_parquet(tmpout["oppdir"], start="2014-07-04T00:03:00+00:00", quantile=2.5)
+        pd.testing.assert_frame_equal(df, answer)
+        df = sfp.fileio.read_opp_parquet(tmpout["oppdir"], file_ids=[file_id], quantile=2.5)
+        pd.testing.assert_frame_equal(df, answer)
+
+        # Empty results keep OPP column types
+        empty = sfp.fileio.read_opp_parquet(tmpout["oppdir"], end="2014-07-03T00:00:00+00:00")
+        assert len(empty.index) == 0
+        assert empty.dtypes.astype(str).to_dict() == full.dtypes.astype(str).to_dict()
+        empty = sfp.fileio.read_opp_parquet(tmpout["oppdir"], end="2014-07-03T00:00:00+00:00", quantile=50)
+        assert empty.columns.tolist() == ["date", "file_id", "D1", "D2", "fsc_small", "pe", "chl_small"]
+        empty = sfp.fileio.read_opp_parquet(tmpout["tmpdir"], columns=["pe", "q50"])
+        assert empty.dtypes.astype(str).to_dict() == {"pe": "float64", "q50": "bool"}
+        with pytest.raises(ValueError):
+            sfp.fileio.read_opp_parquet(tmpout["oppdir"], quantile=10)
+
+    def test_opp_parquet_writer(self, tmpout):
+        sfp.filterevt.filter_evt_files(
+            tmpout["file_dates"],
+            dbpath=tmpout["db"],
+            opp_dir=str(tmpout["oppdir"]),
+            worker_count=1
+        )
+        name = "2014-07-04T00-00-00+00-00.1H.opp.parquet"
+        full = pd.read_parquet(os.path.join(tmpout["oppdir"], name))
+        assert fastparquet.ParquetFile(os.path.join(tmpout["oppdir"], name)).info["row_groups"] == 2
+        date = pd.Timestamp("2014-07-04T00:00:00+00:00")
+        opp_dfs = [g.reset_index(drop=True) for _, g in full.groupby("file_id")]
+        file_ids = list(full["file_id"].cat.categories) + ["2014_185/2014-07-04T00-06-02+00-00"]
+
+        # One row group per DataFrame, extra unused file_id category
+        outdir = os.path.join(tmpout["tmpdir"], "opp1")
+        with sfp.fileio.OppParquetWriter(date, "1H", outdir, file_ids) as writer:
+            for df in opp_dfs:
+                writer.write(df)
+                writer.write(df.head(0))
+            assert not os.path.exists(writer.path)
+        assert writer.row_groups == 2
+        pf = fastparquet.ParquetFile(writer.path)
+        assert pf.info["row_groups"] == 2
+        assert pf.statistics["min"]["file_id"] == file_ids[:2]
+        df = sfp.fileio.read_opp_parquet(outdir)
+        pd.testing.assert_frame_equal(df, full)
+
+        # Row groups of at least row_group_rows particles
+        outdir = os.path.join(tmpout["tmpdir"], "opp2")
+        sfp.fileio.write_opp_parquet(opp_dfs, date, "1H", outdir, row_group_rows=len(full.index))
+        pf = fastparquet.ParquetFile(os.path.join(outdir, name))
+        assert pf.info["row_groups"] == 1
+        pd.testing.assert_frame_equal(sfp.fileio.read_opp_parquet(outdir), full)
+
+        # Unknown file ID or other errors leave no output
+        outdir = os.path.join(tmpout["tmpdir"], "opp3")
+        with pytest.raises(ValueError):
+            with sfp.fileio.OppParquetWriter(date, "1H", outdir, file_ids[:1]) as writer:
+                for df in opp_dfs:
+                    writer.write(df)
+        assert os.listdir(outdir) == []
+
+        with pytest.raises(ValueError):
+            sfp.fileio.OppParquetWriter(date, "1H", outdir, file_ids, engine="foo")
+
     @pytest.mark.s3
     def test_multi_file_filter_S3(self, tmpout):
         """Test S3 multi-file filtering and ensure output can be read back OK"""
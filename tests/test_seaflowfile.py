@@ -1,4 +1,7 @@
 import datetime
+import importlib
+import os
+import shutil
 
 import pandas as pd
 import pytest
@@ -390,7 +393,10 @@ evt_files = [
     "2014_185/2014-07-04T00-00-02+00-00",
     "2014_185/2014-07-04T00-00-02+00-00.gz",
     "2014-07-04T00-00-02+00-00",
-    "2014-07-04T00-00-02+00-00.gz"
+    "2014-07-04T00-00-02+00-00.gz",
+    "2014-07-04T00-00-02+00-00.zst",
+    "2014-07-04T00-00-02+00-00.lz4",
+    "testcruise/2014_185/300.evt.zst"
 ]
 opp_files = [
     "testcruise/2014_185/2014-07-04T00-00-02+00-00.opp",
@@ -400,7 +406,9 @@ opp_files = [
     "2014_185/2014-07-04T00-00-02+00-00.opp",
     "2014_185/2014-07-04T00-00-02+00-00.opp.gz",
     "2014-07-04T00-00-02+00-00.opp",
-    "2014-07-04T00-00-02+00-00.opp.gz"
+    "2014-07-04T00-00-02+00-00.opp.gz",
+    "2014-07-04T00-00-02+00-00.opp.zst",
+    "2014-07-04T00-00-02+00-00.opp.lz4"
 ]
 
 def test_is_evt():
@@ -422,6 +430,8 @@ def test_keep_evt_files():
         "not_evt_file",
         "testcruise/2014_185/2014-07-04T00-00-02+00-00",
         "testcruise/2014_185/2014-07-04T00-03-02+00-00.gz",
+        "testcruise/2014_185/2014-07-04T00-06-02+00-00.zst",
+        "testcruise/2014_185/2014-07-04T00-09-02+00-00.lz4",
     ]
     parsed = sfp.seaflowfile.keep_evt_files(files)
     assert parsed == (files[:2] + files[3:])
@@ -441,6 +451,73 @@ def test_find_evt_files():
     ]
     assert files == answer
 
+def test_manifest_find_evt_files(tmpdir, monkeypatch):
+    monkeypatch.setattr(sfp.manifest, "_manifest_dir", str(tmpdir.join("manifests")))
+    root = str(tmpdir.join("evt"))
+    shutil.copytree("tests/testcruise_evt", root)
+    files = sfp.manifest.find_evt_files(root)
+    assert files == sfp.seaflowfile.find_evt_files(root)
+    assert os.path.isfile(sfp.manifest.manifest_path(root))
+    records = sfp.manifest.scan(root)
+    assert records[0]["file_id"] == "2014_185/2014-07-04T00-00-02+00-00"
+    assert records[0]["date"] == "2014-07-04T00:00:02+00:00"
+    # Events are only counted on request
+    assert records[0]["events"] is None
+    records = sfp.manifest.scan(root, events=True, jobs=2)
+    assert records[0]["events"] == 40000
+    assert records[1]["events"] == 40000
+    assert records[2]["events"] is None  # empty file
+    # Counts are saved
+    monkeypatch.setattr(sfp.fileio, "read_labview_row_count", None)
+    assert sfp.manifest.scan(root, events=True)[0]["events"] == 40000
+    monkeypatch.undo()
+    monkeypatch.setattr(sfp.manifest, "_manifest_dir", str(tmpdir.join("manifests")))
+
+    # Unchanged directories aren't listed again
+    monkeypatch.setattr(os, "scandir", None)
+    assert sfp.manifest.find_evt_files(root) == files
+    monkeypatch.undo()
+    monkeypatch.setattr(sfp.manifest, "_manifest_dir", str(tmpdir.join("manifests")))
+
+    # Files modified in place are recounted, even if their directory is
+    # unchanged
+    daydir = os.path.join(root, "2014_185")
+    path = os.path.join(daydir, "2014-07-04T00-06-02+00-00")
+    dir_mtime_ns = os.stat(daydir).st_mtime_ns
+    shutil.copyfile(os.path.join(daydir, "2014-07-04T00-00-02+00-00"), path)
+    os.utime(daydir, ns=(dir_mtime_ns, dir_mtime_ns))
+    assert sfp.manifest.scan(root, events=True)[2]["events"] == 40000
+
+    # New, removed, and new day of year directory files are found
+    os.remove(os.path.join(daydir, "2014-07-04T00-00-02+00-00"))
+    shutil.copy(
+        os.path.join(daydir, "2014-07-04T00-03-02+00-00.gz"),
+        os.path.join(daydir, "2014-07-04T00-30-02+00-00.gz")
+    )
+    os.mkdir(os.path.join(root, "2014_186"))
+    shutil.copy(
+        os.path.join(daydir, "2014-07-04T00-03-02+00-00.gz"),
+        os.path.join(root, "2014_186", "2014-07-05T00-00-02+00-00.gz")
+    )
+    files = sfp.manifest.find_evt_files(root)
+    assert files == sfp.seaflowfile.find_evt_files(root)
+    assert files[-2:] == [
+        os.path.join(daydir, "2014-07-04T00-30-02+00-00.gz"),
+        os.path.join(root, "2014_186", "2014-07-05T00-00-02+00-00.gz")
+    ]
+    assert sfp.manifest.scan(root, events=True)[-1]["events"] == 40000
+
+    # Disabled manifests still find files
+    sfp.manifest.disable()
+    assert sfp.manifest.manifest_path(root) is None
+    assert sfp.manifest.find_evt_files(root) == files
+
+def test_manifest_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(sfp.manifest.MANIFEST_DIR_ENV, raising=False)
+    importlib.reload(sfp.manifest)
+    assert not sfp.manifest.enabled()
+    assert sfp.manifest.manifest_path("tests/testcruise_evt") is None
+
 def test_timeselect_evt_files():
     raw_files = [
         "tests/testcruise_evt/2014_185/2014-07-04T00-00-02+00-00",